@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Appointment, Bed, BedTransfer, Doctor, DoctorLeave, DoctorSchedule, LabTest, Patient, User, Ward
+from .models import Appointment, Bed, BedTransfer, Doctor, DoctorLeave, DoctorSchedule, LabReportBlob, LabTest, NotificationOutbox, Patient, User, Ward
 
 admin.site.register(User)
 admin.site.register(Patient)
@@ -9,6 +9,8 @@ admin.site.register(DoctorSchedule)
 admin.site.register(DoctorLeave)
 admin.site.register(Appointment)
 admin.site.register(LabTest)
+admin.site.register(LabReportBlob)
 admin.site.register(Ward)
 admin.site.register(Bed)
 admin.site.register(BedTransfer)
+admin.site.register(NotificationOutbox)
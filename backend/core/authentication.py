@@ -0,0 +1,58 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+User = get_user_model()
+
+# Model.from_db expects values in concrete field order.
+CACHED_USER_FIELDS = [
+    field.attname for field in User._meta.concrete_fields
+    if field.attname in {'id', 'username', 'first_name', 'last_name', 'email', 'role', 'is_superuser', 'is_staff', 'is_active'}
+]
+
+
+def user_cache_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def invalidate_cached_user(user_id):
+    cache.delete(user_cache_key(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    # The user is rebuilt with Model.from_db so fields outside CACHED_USER_FIELDS
+    # stay deferred: reading one loads it lazily, and save() only writes the
+    # fields that were loaded.
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as exc:
+            raise InvalidToken(_('Token contained no recognizable user identification')) from exc
+
+        key = user_cache_key(user_id)
+        cached = cache.get(key)
+        if cached is None:
+            try:
+                values = User.objects.filter(**{api_settings.USER_ID_FIELD: user_id}).values_list(
+                    *CACHED_USER_FIELDS, 'password'
+                ).get()
+            except User.DoesNotExist as exc:
+                raise AuthenticationFailed(_('User not found'), code='user_not_found') from exc
+            cached = {
+                'values': values[:-1],
+                'password_hash': get_md5_hash_password(values[-1]) if api_settings.CHECK_REVOKE_TOKEN else None,
+            }
+            cache.set(key, cached, settings.AUTH_USER_CACHE_TTL)
+
+        user = User.from_db('default', CACHED_USER_FIELDS, cached['values'])
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != cached['password_hash']:
+            raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+        return user
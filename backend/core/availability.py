@@ -0,0 +1,195 @@
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .db_router import primary
+from .models import Appointment, DoctorLeave, DoctorSchedule
+
+WEEKDAYS = [
+    DoctorSchedule.WeekDay.MONDAY,
+    DoctorSchedule.WeekDay.TUESDAY,
+    DoctorSchedule.WeekDay.WEDNESDAY,
+    DoctorSchedule.WeekDay.THURSDAY,
+    DoctorSchedule.WeekDay.FRIDAY,
+    DoctorSchedule.WeekDay.SATURDAY,
+    DoctorSchedule.WeekDay.SUNDAY,
+]
+BUSY_STATUSES = [Appointment.AppointmentStatus.PENDING, Appointment.AppointmentStatus.APPROVED]
+CACHE_TIMEOUT = 60 * 60
+
+
+def _version_key(doctor_user_id):
+    return f'availability:version:{doctor_user_id}'
+
+
+def _slots_key(doctor_user_id, version, week_start):
+    return f'availability:slots:{doctor_user_id}:{version}:{week_start.isoformat()}'
+
+
+def _versions(doctor_user_ids):
+    # Versions start from a timestamp, so an evicted version key never
+    # resurrects slots cached under an older version.
+    keys = [_version_key(user_id) for user_id in doctor_user_ids]
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        for key in missing:
+            cache.add(key, time.time_ns(), None)
+        versions.update(cache.get_many(missing))
+    return versions
+
+
+def invalidate(doctor_user_id):
+    try:
+        cache.incr(_version_key(doctor_user_id))
+    except ValueError:
+        cache.set(_version_key(doctor_user_id), time.time_ns(), None)
+
+
+def merge_intervals(intervals):
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _weekly_intervals(doctor_ids):
+    weekly = defaultdict(lambda: defaultdict(list))
+    rows = DoctorSchedule.objects.filter(doctor_id__in=doctor_ids, is_available=True).values_list(
+        'doctor_id', 'day', 'start_time', 'end_time'
+    )
+    for doctor_id, day, start_time, end_time in rows:
+        if start_time < end_time:
+            weekly[doctor_id][WEEKDAYS.index(day)].append((start_time, end_time))
+    return {
+        doctor_id: {weekday: merge_intervals(intervals) for weekday, intervals in days.items()}
+        for doctor_id, days in weekly.items()
+    }
+
+
+def _leave_days(doctor_ids, start, end):
+    leave_days = defaultdict(set)
+    rows = DoctorLeave.objects.filter(
+        doctor_id__in=doctor_ids,
+        status=DoctorLeave.LeaveStatus.APPROVED,
+        start_date__lte=end,
+        end_date__gte=start,
+    ).values_list('doctor_id', 'start_date', 'end_date')
+    for doctor_id, leave_start, leave_end in rows:
+        day = max(leave_start, start)
+        while day <= min(leave_end, end):
+            leave_days[doctor_id].add(day)
+            day += timedelta(days=1)
+    return leave_days
+
+
+def _busy_intervals(doctor_user_ids, start, end, slot):
+    busy = defaultdict(list)
+    rows = Appointment.objects.filter(
+        doctor_id__in=doctor_user_ids,
+        status__in=BUSY_STATUSES,
+        appointment_date__gte=_aware(start, datetime.min.time()),
+        appointment_date__lt=_aware(end + timedelta(days=1), datetime.min.time()),
+    ).values_list('doctor_id', 'appointment_date')
+    for doctor_user_id, appointment_date in rows:
+        appointment_date = timezone.localtime(appointment_date)
+        busy[(doctor_user_id, appointment_date.date())].append((appointment_date, appointment_date + slot))
+    return busy
+
+
+def _aware(day, moment, tz=None):
+    return timezone.make_aware(datetime.combine(day, moment), tz or timezone.get_current_timezone())
+
+
+def _free_slots(intervals, busy, day, slot, tz):
+    # Walk the schedule grid and the sorted busy intervals together, dropping
+    # any grid slot that overlaps an appointment.
+    busy = merge_intervals(busy)
+    slots = []
+    index = 0
+    for start_time, end_time in intervals:
+        cursor = _aware(day, start_time, tz)
+        end = _aware(day, end_time, tz)
+        while cursor + slot <= end:
+            slot_end = cursor + slot
+            while index < len(busy) and busy[index][1] <= cursor:
+                index += 1
+            if index >= len(busy) or busy[index][0] >= slot_end:
+                slots.append(cursor.isoformat())
+            cursor = slot_end
+    return slots
+
+
+def compute_slots(doctors, start, end):
+    slot = timedelta(minutes=settings.APPOINTMENT_SLOT_MINUTES)
+    doctor_ids = [doctor_id for doctor_id, _ in doctors]
+    with primary():
+        weekly = _weekly_intervals(doctor_ids)
+        leave_days = _leave_days(doctor_ids, start, end)
+        busy = _busy_intervals([user_id for _, user_id in doctors], start, end, slot)
+    tz = timezone.get_current_timezone()
+
+    result = {}
+    for doctor_id, user_id in doctors:
+        day = start
+        while day <= end:
+            intervals = weekly.get(doctor_id, {}).get(day.weekday(), [])
+            if day in leave_days[doctor_id] or not intervals:
+                result[(user_id, day)] = []
+            else:
+                result[(user_id, day)] = _free_slots(intervals, busy.get((user_id, day), []), day, slot, tz)
+            day += timedelta(days=1)
+    return result
+
+
+def get_availability(doctors, start, end):
+    # ``doctors`` is a list of (doctor_id, doctor_user_id) pairs. Slots are
+    # cached per doctor per week; all misses are computed together in three
+    # queries.
+    first_week = start - timedelta(days=start.weekday())
+    weeks = [first_week + timedelta(weeks=offset) for offset in range((end - first_week).days // 7 + 1)]
+    user_ids = [user_id for _, user_id in doctors]
+    versions = _versions(user_ids)
+    keys = {
+        (user_id, week): _slots_key(user_id, versions.get(_version_key(user_id)), week)
+        for user_id in user_ids for week in weeks
+    }
+    cached = cache.get_many(keys.values())
+
+    missing_doctors = [
+        (doctor_id, user_id) for doctor_id, user_id in doctors
+        if any(keys[(user_id, week)] not in cached for week in weeks)
+    ]
+    if missing_doctors:
+        computed = compute_slots(missing_doctors, weeks[0], weeks[-1] + timedelta(days=6))
+        fresh = {}
+        for _, user_id in missing_doctors:
+            for week in weeks:
+                fresh[keys[(user_id, week)]] = {
+                    week + timedelta(days=offset): computed[(user_id, week + timedelta(days=offset))]
+                    for offset in range(7)
+                }
+        cache.set_many(fresh, CACHE_TIMEOUT)
+        cached.update(fresh)
+
+    now = timezone.localtime().replace(microsecond=0).isoformat()
+    today = timezone.localdate()
+    days = [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+    availability = {}
+    for user_id in user_ids:
+        availability[user_id] = {}
+        for day in days:
+            slots = cached[keys[(user_id, day - timedelta(days=day.weekday()))]][day]
+            if day < today:
+                slots = []
+            elif day == today:
+                slots = [item for item in slots if item >= now]
+            availability[user_id][day.isoformat()] = slots
+    return availability
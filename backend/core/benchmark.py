@@ -0,0 +1,292 @@
+import re
+import time
+from contextlib import ExitStack
+from urllib.parse import urlsplit
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .metrics import RequestRecord
+from .models import Appointment, Bed, BedTransfer, Doctor, DoctorLeave, DoctorSchedule, LabTest, Patient, User, Ward
+
+
+class Scenario:
+    def __init__(self, name, path, method='get', data=None, follow=0, revalidate=False, settings=None, role=None):
+        self.name = name
+        self.path = path
+        self.method = method
+        self.data = data
+        # Number of 'next' links to follow from ``path`` before measuring.
+        self.follow = follow
+        # Send the resource's ETag back as If-None-Match (the 304 path).
+        self.revalidate = revalidate
+        # Settings overridden for this scenario, on a client whose middleware
+        # is loaded under them (e.g. METRICS_ENABLED).
+        self.settings = settings or {}
+        # Role of the user issuing the requests; None uses the benchmark user.
+        self.role = role
+        self.headers = {}
+
+    @property
+    def writes(self):
+        return self.method != 'get'
+
+    def resolve(self, client):
+        """Walk ``follow`` pages of 'next' links; returns False if they run out."""
+        for _ in range(self.follow):
+            next_url = client.get(self.path).data.get('next')
+            if not next_url:
+                return False
+            parts = urlsplit(next_url)
+            self.path = f'{parts.path}?{parts.query}'
+        self.follow = 0
+        if self.revalidate:
+            etag = client.get(self.path).get('ETag')
+            if not etag:
+                return False
+            self.headers = {'HTTP_IF_NONE_MATCH': etag}
+        return True
+
+
+DEEP_PAGE_LISTS = [
+    ('appointments-list', '/api/appointments/'),
+    ('patients-list', '/api/patients/'),
+]
+
+
+def default_scenarios(deep_pages=(10, 100)):
+    """One scenario per router endpoint and notable query variant.
+
+    Write scenarios run inside a transaction that is rolled back, so the
+    dataset is unchanged after a run. Deep-page scenarios measure the page
+    reached after following ``next`` that many times, once with page
+    numbers (OFFSET) and once with the keyset cursor. ``-unchanged``
+    scenarios replay the resource's ETag and measure the 304 response.
+    """
+    patient = Patient.objects.order_by('pk').first()
+    doctor = Doctor.objects.select_related('user').order_by('pk').first()
+    appointment = Appointment.objects.order_by('pk').first()
+    pending = list(Appointment.objects.filter(status=Appointment.AppointmentStatus.PENDING).values_list('pk', flat=True)[:20])
+    lab_test = LabTest.objects.order_by('pk').first()
+    ward = Ward.objects.order_by('pk').first()
+    bed = Bed.objects.order_by('pk').first()
+    today = timezone.localdate()
+
+    scenarios = [
+        Scenario('auth-me', '/api/auth/me/'),
+        Scenario('dashboard-stats', '/api/dashboard/stats/'),
+        Scenario('patients-list', '/api/patients/'),
+        Scenario('patients-list-unchanged', '/api/patients/', revalidate=True),
+        Scenario('patients-list-cursor', '/api/patients/?pagination=cursor'),
+        Scenario('patients-list-compact', '/api/patients/?fields=compact'),
+        Scenario('patients-export', '/api/patients/export/'),
+        Scenario('doctors-list', '/api/doctors/'),
+        Scenario('doctors-availability', f'/api/doctors/availability/?start={today}&end={today + timedelta(days=6)}'),
+        Scenario('doctor-schedules-list', '/api/doctor-schedules/'),
+        Scenario('doctor-leaves-list', '/api/doctor-leaves/'),
+        Scenario('appointments-list', '/api/appointments/'),
+        Scenario('appointments-list-unchanged', '/api/appointments/', revalidate=True),
+        Scenario('appointments-list-cursor', '/api/appointments/?pagination=cursor'),
+        Scenario('appointments-list-filtered', f'/api/appointments/?status=pending&date_from={today}'),
+        Scenario('appointments-export', '/api/appointments/export/'),
+        Scenario('appointments-queue-all', '/api/appointments/queue/'),
+        Scenario('lab-tests-list', '/api/lab-tests/'),
+        Scenario('wards-list', '/api/wards/'),
+        Scenario('beds-list', '/api/beds/'),
+        Scenario('bed-transfers-list', '/api/bed-transfers/'),
+        *[
+            Scenario(f'{name}-metrics-{state}', path, settings={'METRICS_ENABLED': enabled})
+            for name, path in (('auth-me', '/api/auth/me/'), ('patients-list', '/api/patients/'))
+            for state, enabled in (('on', True), ('off', False))
+        ],
+    ]
+    for name, path in DEEP_PAGE_LISTS:
+        for depth in deep_pages:
+            scenarios += [
+                Scenario(f'{name}-page-{depth}', path, follow=depth),
+                Scenario(f'{name}-cursor-page-{depth}', f'{path}?pagination=cursor', follow=depth),
+            ]
+    if patient:
+        scenarios += [
+            Scenario('patients-detail', f'/api/patients/{patient.pk}/'),
+            Scenario('patients-detail-unchanged', f'/api/patients/{patient.pk}/', revalidate=True),
+            Scenario('patients-search', f'/api/patients/search/?q={patient.last_name}'),
+            Scenario('patients-search-prefix', f'/api/patients/search/?q={patient.last_name[:2]}'),
+            Scenario('patients-search-full-name', f'/api/patients/search/?q={patient.first_name}+{patient.last_name}'),
+            Scenario('patients-search-phone', f'/api/patients/search/?q={patient.phone}'),
+            Scenario('patients-search-phone-prefix', f'/api/patients/search/?q={patient.phone[:4]}'),
+            Scenario('patients-timeline', f'/api/patients/{patient.pk}/timeline/'),
+            Scenario('patients-create', '/api/patients/', 'post', {
+                'first_name': 'Bench', 'last_name': 'Mark', 'dob': '1990-01-01', 'gender': 'female',
+                'phone': '9000000000', 'address': 'Benchmark Street',
+            }),
+        ]
+    if doctor:
+        scenarios += [
+            Scenario('doctors-detail', f'/api/doctors/{doctor.pk}/'),
+            Scenario('appointments-queue', f'/api/appointments/queue/?doctor={doctor.user_id}'),
+        ]
+    if appointment:
+        scenarios += [
+            Scenario('appointments-detail', f'/api/appointments/{appointment.pk}/'),
+            Scenario('appointments-detail-unchanged', f'/api/appointments/{appointment.pk}/', revalidate=True),
+        ]
+    if patient and doctor:
+        scenarios.append(Scenario('appointments-create', '/api/appointments/', 'post', {
+            'patient': patient.pk, 'doctor_user_id': doctor.user_id,
+            'appointment_date': f'{today + timedelta(days=1)}T10:00:00Z', 'reason': 'Benchmark',
+        }))
+    if pending:
+        scenarios += [
+            Scenario('appointments-bulk-status', '/api/appointments/bulk-status/', 'post', {'ids': pending, 'status': 'approved'}),
+            Scenario('appointments-approve', f'/api/appointments/{pending[0]}/approve/', 'post'),
+            # Denied by the role policy before the appointment is looked up.
+            Scenario('appointments-approve-denied', f'/api/appointments/{pending[0]}/approve/', 'post', role=User.Roles.RECEPTIONIST),
+        ]
+    if lab_test:
+        scenarios.append(Scenario('lab-tests-detail', f'/api/lab-tests/{lab_test.pk}/'))
+    if ward:
+        scenarios += [
+            Scenario('wards-detail', f'/api/wards/{ward.pk}/'),
+            Scenario('wards-update-denied', f'/api/wards/{ward.pk}/', 'patch', {'name': 'Benchmark'}, role=User.Roles.DOCTOR),
+        ]
+    if bed:
+        scenarios.append(Scenario('beds-detail', f'/api/beds/{bed.pk}/'))
+    return scenarios
+
+
+def dataset_counts():
+    models = [Patient, Doctor, DoctorSchedule, DoctorLeave, Appointment, LabTest, Ward, Bed, BedTransfer]
+    return {model._meta.model_name: model.objects.count() for model in models}
+
+
+def _percentile(ordered, pct):
+    # Nearest-rank percentile of an already sorted list.
+    if not ordered:
+        return None
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def _request(client, scenario):
+    record = RequestRecord()
+    started = time.perf_counter()
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(record))
+        if scenario.writes:
+            stack.enter_context(transaction.atomic())
+        if scenario.writes:
+            response = getattr(client, scenario.method)(scenario.path, scenario.data, format='json')
+        else:
+            response = client.get(scenario.path, **scenario.headers)
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+        if scenario.writes:
+            transaction.set_rollback(True)
+    return time.perf_counter() - started, record, response.status_code
+
+
+def run_scenario(client, scenario, iterations, warmup=2, reconnect=False):
+    """Issue ``scenario`` sequentially and summarise latency and query counts.
+
+    With ``reconnect`` every request starts without a database connection,
+    which is what CONN_MAX_AGE=0 costs in production.
+    """
+    for _ in range(warmup):
+        _request(client, scenario)
+
+    latencies, queries, db_seconds, errors, statuses = [], [], [], 0, set()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        if reconnect:
+            connections.close_all()
+        elapsed, record, status_code = _request(client, scenario)
+        latencies.append(elapsed * 1000)
+        queries.append(record.queries)
+        db_seconds.append(record.db_seconds * 1000)
+        statuses.add(status_code)
+        errors += status_code >= 400
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'name': scenario.name,
+        'method': scenario.method.upper(),
+        'path': scenario.path,
+        'iterations': iterations,
+        'status_codes': sorted(statuses),
+        'errors': errors,
+        'p50_ms': round(_percentile(latencies, 50), 3),
+        'p95_ms': round(_percentile(latencies, 95), 3),
+        'p99_ms': round(_percentile(latencies, 99), 3),
+        'mean_ms': round(sum(latencies) / iterations, 3),
+        'max_ms': round(latencies[-1], 3),
+        'queries_mean': round(sum(queries) / iterations, 2),
+        'queries_max': max(queries),
+        'db_mean_ms': round(sum(db_seconds) / iterations, 3),
+        'throughput_rps': round(iterations / wall, 2),
+    }
+
+
+def _client(user):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+    return client
+
+
+def run_benchmark(user, iterations=30, warmup=2, only=None, reconnect=False, include_writes=True, deep_pages=(10, 100)):
+    client = _client(user)
+    role_clients = {}
+    pattern = re.compile(only) if only else None
+
+    results, skipped = [], []
+    for scenario in default_scenarios(deep_pages):
+        if pattern and not pattern.search(scenario.name):
+            continue
+        if scenario.writes and not include_writes:
+            continue
+        if scenario.role and scenario.role not in role_clients:
+            role_user = User.objects.filter(role=scenario.role, is_active=True).order_by('pk').first()
+            role_clients[scenario.role] = role_user and _client(role_user)
+        with override_settings(**scenario.settings):
+            if scenario.role:
+                scenario_client = role_clients[scenario.role]
+            else:
+                # Middleware is loaded on a client's first request.
+                scenario_client = _client(user) if scenario.settings else client
+            if not scenario_client or not scenario.resolve(scenario_client):
+                skipped.append(scenario.name)
+                continue
+            results.append(run_scenario(scenario_client, scenario, iterations, warmup, reconnect))
+
+    return {
+        'generated_at': timezone.now().isoformat(),
+        'environment': {
+            'database_vendor': connection.vendor,
+            'conn_max_age': connection.settings_dict.get('CONN_MAX_AGE'),
+            'debug': settings.DEBUG,
+            'cache_backend': settings.CACHES['default']['BACKEND'],
+            'metrics_enabled': settings.METRICS_ENABLED,
+        },
+        'options': {
+            'user': user.username,
+            'iterations': iterations,
+            'warmup': warmup,
+            'only': only,
+            'reconnect': reconnect,
+            'include_writes': include_writes,
+            'deep_pages': list(deep_pages),
+        },
+        'dataset': dataset_counts(),
+        'scenarios': results,
+        # Deep-page scenarios past the last page, revalidation without an ETag,
+        # or a scenario role with no active user.
+        'skipped': skipped,
+    }
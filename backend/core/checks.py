@@ -0,0 +1,39 @@
+import os
+
+from django.conf import settings
+from django.core.checks import Error, Tags, Warning, register
+
+# Backends whose entries live in one process: every gunicorn/uvicorn worker
+# gets its own copy, so cached versions, auth users and queue boards drift.
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def process_local_cache():
+    return settings.CACHES['default']['BACKEND'] in PROCESS_LOCAL_CACHES
+
+
+@register(Tags.caches, deploy=False)
+def check_shared_cache(app_configs, **kwargs):
+    if not process_local_cache():
+        return []
+    if settings.DATABASE_REPLICAS:
+        # Read-your-writes pins would only be seen by the worker that wrote.
+        return [
+            Error(
+                'Read replicas are configured but the default cache is process-local.',
+                hint='Set DJANGO_CACHE_BACKEND and DJANGO_CACHE_LOCATION to a shared cache such as Redis or Memcached.',
+                id='core.E001',
+            )
+        ]
+    if int(os.getenv('WEB_CONCURRENCY', '1') or '1') > 1:
+        return [
+            Warning(
+                'The default cache is process-local but this deployment runs several workers.',
+                hint='Set DJANGO_CACHE_BACKEND and DJANGO_CACHE_LOCATION to a shared cache such as Redis or Memcached.',
+                id='core.W001',
+            )
+        ]
+    return []
@@ -0,0 +1,66 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+
+
+def _table_version_key(model):
+    return f'etag:version:{model._meta.label_lower}'
+
+
+def table_versions(models):
+    # One counter per table, bumped after every committed write to it. The
+    # value is the time of the last bump, so an evicted key never comes back
+    # as an older version; a fresh key is dated outside the replica lag
+    # window since no write is known to have bumped it.
+    keys = [_table_version_key(model) for model in models]
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        seed = time.time_ns() - settings.READ_YOUR_WRITES_SECONDS * 10**9
+        for key in missing:
+            cache.add(key, seed, None)
+        versions.update(cache.get_many(missing))
+    return [versions[key] for key in keys]
+
+
+def bump_table_version(*models):
+    now = time.time_ns()
+    cache.set_many({_table_version_key(model): now for model in models}, None)
+
+
+def recently_changed(versions):
+    # Replicas may not have caught up with a write bumped this recently.
+    return any(time.time_ns() - version < settings.READ_YOUR_WRITES_SECONDS * 10**9 for version in versions)
+
+
+def make_etag(*parts):
+    digest = hashlib.sha1('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+    return f'W/"{digest}"'
+
+
+def _weak(etag):
+    return etag[2:] if etag.startswith('W/') else etag
+
+
+def is_not_modified(request, etag, last_modified=None, use_modified_since=True):
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match:
+        if if_none_match.strip() == '*':
+            return True
+        return _weak(etag) in {_weak(tag) for tag in parse_etags(if_none_match)}
+    if use_modified_since and last_modified:
+        since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+        return since is not None and int(last_modified.timestamp()) <= since
+    return False
+
+
+def set_validators(response, etag, last_modified=None):
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    response['Cache-Control'] = 'private, no-cache'
+    response['Vary'] = 'Authorization'
+    return response
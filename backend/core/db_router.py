@@ -0,0 +1,76 @@
+import hashlib
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+
+_use_replica = ContextVar('use_replica', default=False)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def replica_aliases():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+@contextmanager
+def primary():
+    # Reads that fill version-keyed caches must not come from a lagging
+    # replica, or stale rows get cached under the current version.
+    token = _use_replica.set(False)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+class ReplicaRouter:
+    # Reads go to a replica only while ReplicaRoutingMiddleware has marked the
+    # current request as read-only; everything else uses the primary.
+
+    def db_for_read(self, model, **hints):
+        replicas = replica_aliases()
+        if replicas and _use_replica.get():
+            return random.choice(replicas)
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+
+def _client_key(request):
+    identity = request.META.get('HTTP_AUTHORIZATION') or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if not identity:
+        return None
+    return 'db:pin-primary:' + hashlib.sha1(identity.encode('utf-8')).hexdigest()
+
+
+class ReplicaRoutingMiddleware:
+    # After a client writes, its reads stay on the primary for
+    # READ_YOUR_WRITES_SECONDS so it never sees replication lag on its own data.
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not replica_aliases():
+            return self.get_response(request)
+
+        client_key = _client_key(request)
+        if request.method not in SAFE_METHODS:
+            response = self.get_response(request)
+            if client_key:
+                cache.set(client_key, True, settings.READ_YOUR_WRITES_SECONDS)
+            return response
+
+        pinned = client_key is not None and cache.get(client_key, False)
+        token = _use_replica.set(not pinned)
+        try:
+            return self.get_response(request)
+        finally:
+            _use_replica.reset(token)
@@ -0,0 +1,124 @@
+import csv
+import itertools
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+FORMATS = ('csv', 'ndjson')
+
+APPOINTMENT_EXPORT_FIELDS = [
+    ('id', 'id'),
+    ('patient', 'patient_id'),
+    ('patient_first_name', 'patient__first_name'),
+    ('patient_last_name', 'patient__last_name'),
+    ('doctor', 'doctor_id'),
+    ('doctor_username', 'doctor__username'),
+    ('appointment_date', 'appointment_date'),
+    ('status', 'status'),
+    ('token_number', 'token_number'),
+    ('reason', 'reason'),
+    ('created_by', 'created_by_id'),
+    ('created_at', 'created_at'),
+    ('updated_at', 'updated_at'),
+]
+
+PATIENT_EXPORT_FIELDS = [
+    ('id', 'id'),
+    ('first_name', 'first_name'),
+    ('last_name', 'last_name'),
+    ('dob', 'dob'),
+    ('gender', 'gender'),
+    ('phone', 'phone'),
+    ('email', 'email'),
+    ('address', 'address'),
+    ('blood_group', 'blood_group'),
+    ('emergency_contact', 'emergency_contact'),
+    ('medical_history', 'medical_history'),
+    ('discharge_summary', 'discharge_summary'),
+    ('created_by', 'created_by_id'),
+    ('created_at', 'created_at'),
+    ('updated_at', 'updated_at'),
+]
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def _keyset(queryset, lookups):
+    # Keyset batches on the primary key rather than .iterator(): MySQL's client
+    # library buffers the whole result set, so one big cursor is not constant
+    # memory there. ``lookups[0]`` must be the primary key.
+    return queryset.order_by('pk').values_list(*lookups)
+
+
+def _batch(rows, last_pk, chunk_size):
+    return (rows if last_pk is None else rows.filter(pk__gt=last_pk))[:chunk_size]
+
+
+def iter_chunks(queryset, lookups, encode, chunk_size=2000):
+    rows, last_pk = _keyset(queryset, lookups), None
+    while True:
+        batch = list(_batch(rows, last_pk, chunk_size))
+        if not batch:
+            return
+        yield encode(batch)
+        last_pk = batch[-1][0]
+
+
+async def aiter_chunks(queryset, lookups, encode, chunk_size=2000):
+    # Under ASGI, Django buffers a sync iterator with list() before sending
+    # anything, so each batch is fetched in a worker thread instead.
+    rows, last_pk = _keyset(queryset, lookups), None
+    while True:
+        batch = await sync_to_async(list)(_batch(rows, last_pk, chunk_size))
+        if not batch:
+            return
+        yield encode(batch)
+        last_pk = batch[-1][0]
+
+
+def _csv_encoder(header):
+    writer = csv.writer(_Echo())
+
+    def encode(rows):
+        return ''.join(
+            writer.writerow([value.isoformat() if hasattr(value, 'isoformat') else value for value in row]) for row in rows
+        )
+
+    return writer.writerow(header), encode
+
+
+def _ndjson_encoder(header):
+    def encode(rows):
+        return ''.join(json.dumps(dict(zip(header, row)), cls=DjangoJSONEncoder) + '\n' for row in rows)
+
+    return None, encode
+
+
+async def _aprepend(first, chunks):
+    if first:
+        yield first
+    async for chunk in chunks:
+        yield chunk
+
+
+def export_response(request, queryset, fields, fmt, filename, chunk_size=2000):
+    header = [name for name, _ in fields]
+    lookups = [lookup for _, lookup in fields]
+    # The body is read after ReplicaRoutingMiddleware has returned, so fix
+    # the database the router picks for this request now.
+    queryset = queryset.using(queryset.db)
+    first, encode = _ndjson_encoder(header) if fmt == 'ndjson' else _csv_encoder(header)
+    if isinstance(getattr(request, '_request', request), ASGIRequest):
+        body = _aprepend(first, aiter_chunks(queryset, lookups, encode, chunk_size))
+    else:
+        body = itertools.chain([first] if first else [], iter_chunks(queryset, lookups, encode, chunk_size))
+    content_type = 'application/x-ndjson' if fmt == 'ndjson' else 'text/csv'
+    streaming = StreamingHttpResponse(body, content_type=content_type)
+    streaming['Content-Disposition'] = f'attachment; filename="{filename}.{fmt}"'
+    return streaming
@@ -0,0 +1,71 @@
+from datetime import datetime, time, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework import filters, serializers
+
+from .models import Appointment
+
+
+def _parse_int(value, param):
+    try:
+        return int(value)
+    except (TypeError, ValueError) as exc:
+        raise serializers.ValidationError({param: 'Must be an integer'}) from exc
+
+
+def _parse_moment(value, param):
+    try:
+        day = parse_date(value)
+        moment = None if day else parse_datetime(value)
+    except ValueError:
+        day = moment = None
+    if day is not None:
+        return timezone.make_aware(datetime.combine(day, time.min)), True
+    if moment is None:
+        raise serializers.ValidationError({param: 'Use YYYY-MM-DD or an ISO 8601 datetime'})
+    return (moment if timezone.is_aware(moment) else timezone.make_aware(moment)), False
+
+
+class AppointmentFilterBackend(filters.BaseFilterBackend):
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+
+        statuses = [item for item in params.get('status', '').split(',') if item]
+        if statuses:
+            invalid = set(statuses) - set(Appointment.AppointmentStatus.values)
+            if invalid:
+                raise serializers.ValidationError({'status': f'Invalid status: {", ".join(sorted(invalid))}'})
+            queryset = queryset.filter(status__in=statuses)
+        if params.get('doctor'):
+            queryset = queryset.filter(doctor_id=_parse_int(params['doctor'], 'doctor'))
+        if params.get('patient'):
+            queryset = queryset.filter(patient_id=_parse_int(params['patient'], 'patient'))
+        if params.get('date_from'):
+            moment, _ = _parse_moment(params['date_from'], 'date_from')
+            queryset = queryset.filter(appointment_date__gte=moment)
+        if params.get('date_to'):
+            moment, is_day = _parse_moment(params['date_to'], 'date_to')
+            if is_day:
+                queryset = queryset.filter(appointment_date__lt=moment + timedelta(days=1))
+            else:
+                queryset = queryset.filter(appointment_date__lte=moment)
+        return queryset
+
+
+class PatientFilterBackend(filters.BaseFilterBackend):
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+
+        if params.get('phone'):
+            queryset = queryset.filter(phone=params['phone'].strip())
+        terms = params.get('search', '').split()
+        if len(terms) == 1:
+            queryset = queryset.filter(Q(first_name__istartswith=terms[0]) | Q(last_name__istartswith=terms[0]))
+        elif len(terms) > 1:
+            queryset = queryset.filter(
+                Q(first_name__istartswith=terms[0], last_name__istartswith=terms[-1])
+                | Q(last_name__istartswith=terms[0], first_name__istartswith=terms[-1])
+            )
+        return queryset
@@ -0,0 +1,88 @@
+import csv
+import json
+import time
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Max
+
+from . import search, stats
+from .conditional import bump_table_version
+from .models import Patient
+from .serializers import PatientSerializer
+
+FORMATS = ('csv', 'ndjson')
+MAX_BATCH_SIZE = 5000
+
+
+def detect_format(filename, default='csv'):
+    name = (filename or '').lower()
+    if name.endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    if name.endswith('.csv'):
+        return 'csv'
+    return default
+
+
+def read_rows(stream, fmt):
+    # ``stream`` is any iterable of text lines. Rows are yielded one at a time
+    # as (row_number, row) so memory stays flat for any file size.
+    if fmt == 'csv':
+        for row_number, row in enumerate(csv.DictReader(stream), start=1):
+            yield row_number, {key: value for key, value in row.items() if key}
+    elif fmt == 'ndjson':
+        for row_number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as exc:
+                yield row_number, exc
+                continue
+            yield row_number, row
+    else:
+        raise ValueError(f'Unsupported format: {fmt}')
+
+
+def _chunks(rows, size):
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+
+def import_patients(rows, created_by=None, batch_size=500, on_error=None):
+    if not 1 <= batch_size <= MAX_BATCH_SIZE:
+        raise ValueError(f'batch_size must be between 1 and {MAX_BATCH_SIZE}')
+    result = {'total': 0, 'imported': 0, 'failed': 0}
+    started = time.perf_counter()
+    last_id = Patient.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+
+    for chunk in _chunks(rows, batch_size):
+        patients = []
+        for row_number, row in chunk:
+            result['total'] += 1
+            if isinstance(row, Exception):
+                errors = {'non_field_errors': [str(row)]}
+            else:
+                serializer = PatientSerializer(data=row)
+                if serializer.is_valid():
+                    patients.append(Patient(**serializer.validated_data, created_by=created_by))
+                    continue
+                errors = serializer.errors
+            result['failed'] += 1
+            if on_error:
+                on_error(row_number, errors)
+        if patients:
+            with transaction.atomic():
+                Patient.objects.bulk_create(patients, batch_size=batch_size)
+                stats.increment(stats.TOTAL_PATIENTS, len(patients))
+                transaction.on_commit(lambda: bump_table_version(Patient))
+            result['imported'] += len(patients)
+
+    # bulk_create skips signals (and does not return primary keys on MySQL),
+    # so index everything inserted since the import started.
+    search.reindex_patients(start_after=last_id)
+    result['elapsed_seconds'] = round(time.perf_counter() - started, 3)
+    result['rows_per_second'] = round(result['total'] / result['elapsed_seconds'], 1) if result['elapsed_seconds'] else None
+    return result
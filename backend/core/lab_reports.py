@@ -0,0 +1,237 @@
+import hashlib
+import os
+import re
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.core.handlers.asgi import ASGIRequest
+from django.db import IntegrityError, transaction
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+
+from .conditional import is_not_modified
+from .models import LabReportBlob
+
+CHUNK_SIZE = 64 * 1024
+SENDFILE_MODES = ('', 'x-accel-redirect', 'x-sendfile')
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class ReportTooLarge(Exception):
+    pass
+
+
+class HashingFileUploadHandler(TemporaryFileUploadHandler):
+    """Spool every multipart upload to a temp file, hashing it on the way through."""
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.hasher = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        upload = super().file_complete(file_size)
+        upload.sha256 = self.hasher.hexdigest()
+        return upload
+
+
+def spool_stream(stream, name, content_type):
+    """Copy a raw request body to a temp file in chunks, hashing as it goes."""
+    upload = TemporaryUploadedFile(name, content_type, 0, None)
+    hasher = hashlib.sha256()
+    size = 0
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > settings.LAB_REPORT_MAX_BYTES:
+            upload.close()
+            raise ReportTooLarge()
+        hasher.update(chunk)
+        upload.write(chunk)
+    upload.seek(0)
+    upload.size = size
+    upload.sha256 = hasher.hexdigest()
+    return upload
+
+
+def _sha256(upload):
+    digest = getattr(upload, 'sha256', None)
+    if digest is None:
+        hasher = hashlib.sha256()
+        for chunk in upload.chunks(CHUNK_SIZE):
+            hasher.update(chunk)
+        digest = hasher.hexdigest()
+    return digest
+
+
+def get_or_create_blob(upload):
+    """Return the blob for the upload's content, storing the file only if it is new."""
+    digest = _sha256(upload)
+    blob = LabReportBlob.objects.filter(sha256=digest).first()
+    if blob is not None:
+        upload.close()
+        # Reuse counts as use: prune_blobs skips recently touched blobs, so
+        # this one cannot be pruned before the caller links it.
+        LabReportBlob.objects.filter(pk=blob.pk).update(updated_at=timezone.now())
+        return blob
+
+    extension = os.path.splitext(upload.name or '')[1].lower()
+    blob = LabReportBlob(sha256=digest, size=upload.size, content_type=upload.content_type or '')
+    # The default storage moves temporary uploads into place instead of copying.
+    blob.file.save(f'{digest[:2]}/{digest}{extension}', upload, save=False)
+    try:
+        with transaction.atomic():
+            blob.save()
+    except IntegrityError:
+        # A concurrent upload of the same content won the race.
+        blob.file.delete(save=False)
+        blob = LabReportBlob.objects.get(sha256=digest)
+    return blob
+
+
+def attach_report(lab_test, upload):
+    blob = get_or_create_blob(upload)
+    lab_test.report_blob = blob
+    lab_test.report_file.name = blob.file.name
+    lab_test.save(update_fields=['report_blob', 'report_file', 'updated_at'])
+    return lab_test
+
+
+def prune_blobs(min_age):
+    """Delete blobs no lab test links to that were not used within ``min_age``.
+
+    Returns the number of blobs removed and the bytes freed.
+    """
+    cutoff = timezone.now() - min_age
+    orphans = LabReportBlob.objects.filter(updated_at__lt=cutoff, lab_tests__isnull=True)
+    pruned = freed = 0
+    for blob in orphans.order_by('pk').iterator():
+        # Re-check at delete time in case a report was linked meanwhile.
+        deleted, _ = orphans.filter(pk=blob.pk).delete()
+        if deleted:
+            blob.file.delete(save=False)
+            pruned += 1
+            freed += blob.size
+    return pruned, freed
+
+
+def parse_range(header, size):
+    """Return (start, end) for a single satisfiable byte range, None to serve the
+    whole file, or raise ValueError for an unsatisfiable range."""
+    match = _RANGE_RE.match(header.strip()) if header else None
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if start >= size or end < start:
+            raise ValueError(header)
+    else:
+        suffix = int(last)
+        if suffix == 0:
+            raise ValueError(header)
+        start, end = max(size - suffix, 0), size - 1
+    return start, end
+
+
+def _iter_range(handle, start, length):
+    try:
+        handle.seek(start)
+        while length > 0:
+            chunk = handle.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        handle.close()
+
+
+async def _aiter_range(handle, start, length):
+    # Under ASGI, Django drains a sync iterator with list() before sending
+    # anything, so each chunk is read in a worker thread instead.
+    try:
+        await sync_to_async(handle.seek)(start)
+        while length > 0:
+            chunk = await sync_to_async(handle.read)(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        await sync_to_async(handle.close)()
+
+
+def _sendfile_response(field, content_type, filename):
+    mode = settings.LAB_REPORT_SENDFILE
+    response = HttpResponse(content_type=content_type)
+    if mode == 'x-accel-redirect':
+        response['X-Accel-Redirect'] = f'{settings.LAB_REPORT_ACCEL_PREFIX}{field.name}'
+    else:
+        response['X-Sendfile'] = field.path
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def report_response(request, lab_test):
+    """Serve a lab report without loading it into memory.
+
+    Hands the transfer to the web server when LAB_REPORT_SENDFILE is set,
+    otherwise streams it from storage with single-range support: through
+    FileResponse under WSGI and an async chunk iterator under ASGI.
+    """
+    field = lab_test.report_file
+    blob = lab_test.report_blob
+    etag = f'"{blob.sha256}"' if blob else None
+    if etag and is_not_modified(request, etag, use_modified_since=False):
+        response = HttpResponse(status=304)
+        response['ETag'] = etag
+        return response
+
+    content_type = (blob.content_type if blob else '') or 'application/octet-stream'
+    filename = f'lab-test-{lab_test.pk}{os.path.splitext(field.name)[1].lower()}'
+
+    if settings.LAB_REPORT_SENDFILE:
+        response = _sendfile_response(field, content_type, filename)
+    else:
+        size = blob.size if blob else field.size
+        byte_range = None
+        if_range = request.headers.get('If-Range')
+        if not if_range or if_range == etag:
+            try:
+                byte_range = parse_range(request.headers.get('Range'), size)
+            except ValueError:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f'bytes */{size}'
+                return response
+
+        asgi = isinstance(getattr(request, '_request', request), ASGIRequest)
+        handle = field.open('rb')
+        if byte_range is None and not asgi:
+            # Lets a WSGI server use wsgi.file_wrapper.
+            response = FileResponse(handle, as_attachment=True, filename=filename, content_type=content_type)
+        else:
+            start, end = byte_range or (0, size - 1)
+            iterate = _aiter_range if asgi else _iter_range
+            response = StreamingHttpResponse(
+                iterate(handle, start, end - start + 1), status=200 if byte_range is None else 206, content_type=content_type
+            )
+            if byte_range is not None:
+                response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = str(end - start + 1)
+            response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        response['Accept-Ranges'] = 'bytes'
+
+    if etag:
+        response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
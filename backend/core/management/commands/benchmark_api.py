@@ -0,0 +1,80 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from core.benchmark import run_benchmark
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Drive the API endpoints through the DRF test client and report latency percentiles, queries and throughput.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Username to authenticate as (defaults to the first admin).')
+        parser.add_argument('--iterations', type=int, default=30)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--only', help='Regular expression matched against scenario names.')
+        parser.add_argument('--reconnect', action='store_true', help='Open a new database connection for every request.')
+        parser.add_argument('--read-only', action='store_true', help='Skip the (rolled back) write scenarios.')
+        parser.add_argument(
+            '--deep-pages', type=int, nargs='+', default=[10, 100],
+            help='Page depths for the deep pagination scenarios (page numbers and cursor).',
+        )
+        parser.add_argument('--output', help='Write the results as JSON to this file.')
+        parser.add_argument('--baseline', help='Previous JSON results to compare p50/p95 against.')
+
+    def handle(self, *args, **options):
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+        else:
+            user = User.objects.filter(role=User.Roles.ADMIN, is_active=True).order_by('pk').first()
+        if user is None:
+            raise CommandError('No user to authenticate as; run generate_hospital_data or pass --user')
+        if options['iterations'] < 1:
+            raise CommandError('--iterations must be at least 1')
+        if any(depth < 1 for depth in options['deep_pages']):
+            raise CommandError('--deep-pages must be at least 1')
+
+        baseline = {}
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as handle:
+                baseline = {row['name']: row for row in json.load(handle)['scenarios']}
+
+        # Allows the test client's host and keeps outgoing email in memory.
+        setup_test_environment()
+        try:
+            results = run_benchmark(
+                user,
+                iterations=options['iterations'],
+                warmup=options['warmup'],
+                only=options['only'],
+                reconnect=options['reconnect'],
+                include_writes=not options['read_only'],
+                deep_pages=options['deep_pages'],
+            )
+        finally:
+            teardown_test_environment()
+
+        self.stdout.write(f"{'scenario':<36} {'p50':>9} {'p95':>9} {'p99':>9} {'queries':>8} {'req/s':>9}")
+        for row in results['scenarios']:
+            line = (
+                f"{row['name']:<36} {row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} {row['p99_ms']:>9.2f} "
+                f"{row['queries_mean']:>8.1f} {row['throughput_rps']:>9.1f}"
+            )
+            previous = baseline.get(row['name'])
+            if previous:
+                line += f"  p50 {row['p50_ms'] - previous['p50_ms']:+.2f}ms p95 {row['p95_ms'] - previous['p95_ms']:+.2f}ms"
+            if row['errors']:
+                line += f"  ({row['errors']} errors, status {row['status_codes']})"
+            self.stdout.write(line)
+
+        if results['skipped']:
+            self.stdout.write(f"Skipped (not enough pages or no ETag): {', '.join(results['skipped'])}")
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as handle:
+                json.dump(results, handle, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
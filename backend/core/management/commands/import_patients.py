@@ -0,0 +1,57 @@
+import csv
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core.importers import FORMATS, MAX_BATCH_SIZE, detect_format, import_patients, read_rows
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Stream patients from a CSV or NDJSON file into the database in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=FORMATS)
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--errors', help='Write rejected rows to this CSV file.')
+        parser.add_argument('--created-by', help='Username recorded as created_by on imported patients.')
+
+    def handle(self, *args, **options):
+        if not 1 <= options['batch_size'] <= MAX_BATCH_SIZE:
+            raise CommandError(f'--batch-size must be between 1 and {MAX_BATCH_SIZE}')
+        created_by = None
+        if options['created_by']:
+            try:
+                created_by = User.objects.get(username=options['created_by'])
+            except User.DoesNotExist as exc:
+                raise CommandError(f"Unknown user: {options['created_by']}") from exc
+
+        fmt = options['format'] or detect_format(options['path'])
+        error_file = open(options['errors'], 'w', newline='', encoding='utf-8') if options['errors'] else None
+        try:
+            error_writer = csv.writer(error_file) if error_file else None
+            if error_writer:
+                error_writer.writerow(['row', 'errors'])
+
+            def on_error(row_number, errors):
+                if error_writer:
+                    error_writer.writerow([row_number, json.dumps(errors)])
+
+            with open(options['path'], newline='', encoding='utf-8-sig') as stream:
+                result = import_patients(
+                    read_rows(stream, fmt),
+                    created_by=created_by,
+                    batch_size=options['batch_size'],
+                    on_error=on_error,
+                )
+        finally:
+            if error_file:
+                error_file.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result['imported']} of {result['total']} rows ({result['failed']} failed) "
+            f"in {result['elapsed_seconds']}s, {result['rows_per_second']} rows/sec"
+        ))
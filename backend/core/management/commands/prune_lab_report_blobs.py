@@ -0,0 +1,21 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.lab_reports import prune_blobs
+
+
+class Command(BaseCommand):
+    help = 'Delete stored lab report files that no lab test links to any more.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age-hours', type=float, default=24,
+            help='Only prune blobs unused for at least this long, so uploads in flight are kept (default 24).',
+        )
+
+    def handle(self, *args, **options):
+        if options['min_age_hours'] < 0:
+            raise CommandError('--min-age-hours must not be negative')
+        pruned, freed = prune_blobs(timedelta(hours=options['min_age_hours']))
+        self.stdout.write(self.style.SUCCESS(f'Pruned {pruned} lab report blobs ({freed} bytes)'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.search import reindex_patients
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the patient search token index, e.g. after bulk loads that bypass signals.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        total = reindex_patients(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {total} patients'))
@@ -0,0 +1,26 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.stats import reconcile
+
+
+class Command(BaseCommand):
+    help = 'Recount the dashboard counters from the source tables to correct drift.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Keep running, recounting every DASHBOARD_STATS_RECONCILE_SECONDS.',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            values = reconcile()
+            for key, value in sorted(values.items()):
+                self.stdout.write(f'{key}: {value}')
+            self.stdout.write(self.style.SUCCESS('Dashboard counters reconciled'))
+            if not options['loop']:
+                break
+            time.sleep(settings.DASHBOARD_STATS_RECONCILE_SECONDS)
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.notifications import deliver_batch
+
+
+class Command(BaseCommand):
+    help = 'Drain the notification outbox, delivering queued emails and SMS in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--max-attempts', type=int, default=5)
+        parser.add_argument('--backoff', type=int, default=30, help='Base retry delay in seconds, doubled per attempt.')
+        parser.add_argument('--poll-interval', type=float, default=5.0)
+        parser.add_argument('--once', action='store_true', help='Drain what is currently due and exit.')
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            processed = deliver_batch(
+                batch_size=options['batch_size'],
+                workers=options['workers'],
+                max_attempts=options['max_attempts'],
+                backoff_seconds=options['backoff'],
+            )
+            total += processed
+            if processed:
+                continue
+            if options['once']:
+                break
+            time.sleep(options['poll_interval'])
+        self.stdout.write(self.style.SUCCESS(f'Processed {total} notifications'))
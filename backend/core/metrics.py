@@ -0,0 +1,198 @@
+import cProfile
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+METRICS = {
+    'hospital_http_request_duration_seconds': ('Total request latency.', LATENCY_BUCKETS),
+    'hospital_http_request_queries': ('SQL queries executed per request.', QUERY_BUCKETS),
+    'hospital_http_request_db_seconds': ('Time spent executing SQL per request.', LATENCY_BUCKETS),
+    'hospital_http_request_serialization_seconds': ('Time spent serializing and rendering the response.', LATENCY_BUCKETS),
+}
+
+_current = ContextVar('metrics_request', default=None)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+
+    def observe(self, name, labels, value):
+        key = (name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(METRICS[name][1])
+            histogram.observe(value)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            snapshot = {
+                key: (list(histogram.counts), histogram.sum, histogram.count)
+                for key, histogram in self._histograms.items()
+            }
+        lines = []
+        for name, (help_text, buckets) in METRICS.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} histogram')
+            for (metric, labels), (counts, total, count) in sorted(snapshot.items()):
+                if metric != name:
+                    continue
+                label_text = ','.join(f'{label}="{_escape(value)}"' for label, value in labels)
+                cumulative = 0
+                for bound, bucket_count in zip(buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f'{name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{{label_text},le="+Inf"}} {count}')
+                lines.append(f'{name}_sum{{{label_text}}} {total}')
+                lines.append(f'{name}_count{{{label_text}}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class RequestRecord:
+    __slots__ = ('queries', 'db_seconds', 'serialization_seconds')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serialization_seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        # Installed with connection.execute_wrapper(); times every query.
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_seconds += time.perf_counter() - started
+            self.queries += 1
+
+
+@contextmanager
+def serialization_timer():
+    record = _current.get()
+    if record is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record.serialization_seconds += time.perf_counter() - started
+
+
+class TimedJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with serialization_timer():
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+# Any other verb is reported as OTHER so clients cannot mint label values.
+HTTP_METHODS = frozenset({'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS', 'TRACE', 'CONNECT'})
+
+
+def _method_label(request):
+    return request.method if request.method in HTTP_METHODS else 'OTHER'
+
+
+def _view_label(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.view_name or match.route
+
+
+class MetricsMiddleware:
+    """Record per-view query count, DB time, serialization time and latency.
+
+    Requests are sampled for cProfile at METRICS_PROFILE_SAMPLE_RATE and the
+    profile is kept only when the request took longer than
+    METRICS_PROFILE_SLOW_MS.
+    """
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        record = RequestRecord()
+        token = _current.set(record)
+        profiler = self._start_profiler()
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(record))
+                response = self.get_response(request)
+        finally:
+            elapsed = time.perf_counter() - started
+            _current.reset(token)
+            if profiler is not None:
+                profiler.disable()
+
+        labels = (('view', _view_label(request)), ('method', _method_label(request)))
+        registry.observe('hospital_http_request_duration_seconds', labels, elapsed)
+        registry.observe('hospital_http_request_queries', labels, record.queries)
+        registry.observe('hospital_http_request_db_seconds', labels, record.db_seconds)
+        registry.observe('hospital_http_request_serialization_seconds', labels, record.serialization_seconds)
+        if profiler is not None and elapsed * 1000 >= settings.METRICS_PROFILE_SLOW_MS:
+            self._dump_profile(profiler, labels[0][1], elapsed)
+        return response
+
+    def _start_profiler(self):
+        rate = settings.METRICS_PROFILE_SAMPLE_RATE
+        if not settings.METRICS_PROFILE_SLOW_MS or rate <= 0 or random.random() >= rate:
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is already active on this thread.
+            return None
+        return profiler
+
+    def _dump_profile(self, profiler, view, elapsed):
+        directory = settings.METRICS_PROFILE_DIR
+        os.makedirs(directory, exist_ok=True)
+        stamp = timezone.now().strftime('%Y%m%dT%H%M%S%f')
+        safe_view = ''.join(char if char.isalnum() or char in '-_' else '_' for char in view)
+        profiler.dump_stats(os.path.join(directory, f'{stamp}-{safe_view}-{int(elapsed * 1000)}ms.prof'))
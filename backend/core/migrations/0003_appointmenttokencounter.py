@@ -0,0 +1,27 @@
+# Generated by Django 5.1.5 on 2026-10-18 10:32
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_alter_appointment_doctor'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AppointmentTokenCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('last_token', models.PositiveIntegerField(default=0)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='token_counters', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('doctor', 'day')},
+            },
+        ),
+    ]
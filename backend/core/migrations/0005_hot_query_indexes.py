@@ -0,0 +1,33 @@
+# Generated by Django 5.1.5 on 2026-10-18 10:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_notificationoutbox'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['appointment_date'], name='core_appoin_appoint_5d7cff_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['status', 'appointment_date'], name='core_appoin_status_6824f8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bed',
+            index=models.Index(fields=['ward', 'is_occupied'], name='core_bed_ward_id_0c3acd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bed',
+            index=models.Index(fields=['is_occupied', 'is_icu'], name='core_bed_is_occu_01705e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='labtest',
+            index=models.Index(fields=['patient', 'booked_at'], name='core_labtes_patient_a98ebb_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.5 on 2026-10-18 10:34
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardCounter',
+            fields=[
+                ('key', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('value', models.IntegerField(default=0)),
+                ('reconciled_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
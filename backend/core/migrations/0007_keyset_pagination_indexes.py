@@ -0,0 +1,21 @@
+# Generated by Django 5.1.5 on 2026-10-18 10:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_dashboardcounter'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='labtest',
+            index=models.Index(fields=['booked_at'], name='core_labtes_booked__014432_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['created_at'], name='core_patien_created_010e5a_idx'),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.1.5 on 2026-10-18 10:37
+
+import re
+import unicodedata
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Frozen copy of core.search.patient_tokens as of this migration, so later
+# tokenizer changes do not alter what it writes; rebuild_patient_search
+# reindexes with the current tokenizer.
+def _normalize(value):
+    value = unicodedata.normalize('NFKD', value or '')
+    return ''.join(char for char in value if not unicodedata.combining(char)).lower()
+
+
+def patient_tokens(patient):
+    tokens = set()
+    for part in re.split(r'[^\w]+', _normalize(f'{patient.first_name} {patient.last_name}')):
+        if part:
+            tokens.add(f'n:{part}'[:255])
+    if patient.email:
+        tokens.add(f'e:{_normalize(patient.email)}'[:255])
+    digits = re.sub(r'\D', '', patient.phone or '')[-10:]
+    if digits:
+        tokens.add(f'p:{digits}')
+        tokens.update(f'pd:{digits[:index]}{digits[index + 1:]}' for index in range(len(digits)))
+    return tokens
+
+
+def index_existing_patients(apps, schema_editor):
+    Patient = apps.get_model('core', 'Patient')
+    PatientSearchToken = apps.get_model('core', 'PatientSearchToken')
+    rows = []
+    for patient in Patient.objects.only('id', 'first_name', 'last_name', 'email', 'phone').iterator(chunk_size=1000):
+        rows.extend(PatientSearchToken(patient_id=patient.pk, token=token) for token in patient_tokens(patient))
+        if len(rows) >= 5000:
+            PatientSearchToken.objects.bulk_create(rows)
+            rows = []
+    PatientSearchToken.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_list_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PatientSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=255)),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='core.patient')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['token', 'patient'], name='core_patien_token_0bb069_idx')],
+            },
+        ),
+        migrations.RunPython(index_existing_patients, migrations.RunPython.noop),
+    ]
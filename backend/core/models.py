@@ -1,6 +1,8 @@
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import connection, models, transaction
+from django.db.models import Max
+from django.utils import timezone
 
 
 class User(AbstractUser):
@@ -34,10 +36,26 @@ class Patient(TimeStampedModel):
     discharge_summary = models.TextField(blank=True)
     created_by = models.ForeignKey('User', on_delete=models.SET_NULL, null=True, related_name='registered_patients')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at']),
+            models.Index(fields=['phone']),
+            models.Index(fields=['last_name', 'first_name']),
+            models.Index(fields=['first_name']),
+        ]
+
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
 
 
+class PatientSearchToken(models.Model):
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='search_tokens')
+    token = models.CharField(max_length=255)
+
+    class Meta:
+        indexes = [models.Index(fields=['token', 'patient'])]
+
+
 class Doctor(TimeStampedModel):
     user = models.OneToOneField('User', on_delete=models.CASCADE, related_name='doctor_profile')
     specialization = models.CharField(max_length=120)
@@ -101,9 +119,71 @@ class Appointment(TimeStampedModel):
     token_number = models.PositiveIntegerField(default=1)
     created_by = models.ForeignKey('User', on_delete=models.SET_NULL, null=True, related_name='appointments_created')
 
+    ALLOWED_TRANSITIONS = {
+        AppointmentStatus.PENDING: {AppointmentStatus.APPROVED, AppointmentStatus.REJECTED, AppointmentStatus.CANCELLED},
+        AppointmentStatus.APPROVED: {AppointmentStatus.COMPLETED, AppointmentStatus.CANCELLED},
+        AppointmentStatus.REJECTED: set(),
+        AppointmentStatus.CANCELLED: set(),
+        AppointmentStatus.COMPLETED: set(),
+    }
+
     class Meta:
         ordering = ['appointment_date']
         unique_together = ('doctor', 'appointment_date', 'token_number')
+        indexes = [
+            models.Index(fields=['appointment_date']),
+            models.Index(fields=['status', 'appointment_date']),
+            models.Index(fields=['doctor', 'status', 'appointment_date']),
+        ]
+
+
+class AppointmentTokenCounter(models.Model):
+    doctor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='token_counters')
+    day = models.DateField()
+    last_token = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('doctor', 'day')
+
+    @classmethod
+    def next_token(cls, doctor, day):
+        # The counter row is locked for the rest of the caller's transaction, so
+        # concurrent bookings for the same doctor and day are serialized here
+        # instead of racing on Max(token_number).
+        with transaction.atomic():
+            if not cls.objects.filter(doctor=doctor, day=day).exists():
+                # Create the row before locking it: a locking read of a missing
+                # row takes an InnoDB gap lock, and two first bookings holding
+                # gap locks deadlock on their INSERTs. An upsert rather than a
+                # plain INSERT: a duplicate-key error leaves a shared lock that
+                # select_for_update() must upgrade, and three such bookings
+                # deadlock on the upgrade. ON DUPLICATE KEY UPDATE (ON CONFLICT
+                # DO UPDATE) takes the exclusive lock directly; the later
+                # bookings just wait for the first to commit.
+                seed = Appointment.objects.filter(
+                    doctor=doctor,
+                    appointment_date__date=day,
+                ).aggregate(max_token=Max('token_number'))['max_token'] or 0
+                cls.objects.bulk_create(
+                    [cls(doctor=doctor, day=day, last_token=seed)],
+                    update_conflicts=True,
+                    # MySQL infers the key; PostgreSQL and SQLite need it named.
+                    unique_fields=['doctor', 'day'] if connection.features.supports_update_conflicts_with_target else None,
+                    update_fields=['day'],
+                )
+            # A locking read sees the latest committed row even under
+            # REPEATABLE READ, unlike the get() in get_or_create.
+            counter = cls.objects.select_for_update().get(doctor=doctor, day=day)
+            counter.last_token += 1
+            counter.save(update_fields=['last_token'])
+            return counter.last_token
+
+
+class LabReportBlob(TimeStampedModel):
+    sha256 = models.CharField(max_length=64, unique=True)
+    size = models.PositiveBigIntegerField()
+    content_type = models.CharField(max_length=120, blank=True)
+    file = models.FileField(upload_to='lab_reports/blobs/')
 
 
 class LabTest(TimeStampedModel):
@@ -118,8 +198,15 @@ class LabTest(TimeStampedModel):
     booked_at = models.DateTimeField()
     result_summary = models.TextField(blank=True)
     report_file = models.FileField(upload_to='lab_reports/', blank=True, null=True)
+    report_blob = models.ForeignKey(LabReportBlob, on_delete=models.SET_NULL, null=True, blank=True, related_name='lab_tests')
     status = models.CharField(max_length=20, choices=LabStatus.choices, default=LabStatus.BOOKED)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['patient', 'booked_at']),
+            models.Index(fields=['booked_at']),
+        ]
+
 
 class Ward(TimeStampedModel):
     name = models.CharField(max_length=120)
@@ -136,6 +223,10 @@ class Bed(TimeStampedModel):
 
     class Meta:
         unique_together = ('ward', 'bed_number')
+        indexes = [
+            models.Index(fields=['ward', 'is_occupied']),
+            models.Index(fields=['is_occupied', 'is_icu']),
+        ]
 
 
 class BedTransfer(TimeStampedModel):
@@ -144,3 +235,33 @@ class BedTransfer(TimeStampedModel):
     to_bed = models.ForeignKey(Bed, on_delete=models.CASCADE, related_name='transfers_in')
     reason = models.TextField(blank=True)
     transferred_at = models.DateTimeField(auto_now_add=True)
+
+
+class NotificationOutbox(TimeStampedModel):
+    class Channel(models.TextChoices):
+        EMAIL = 'email', 'Email'
+        SMS = 'sms', 'SMS'
+
+    class DeliveryStatus(models.TextChoices):
+        PENDING = 'pending', 'Pending'
+        SENT = 'sent', 'Sent'
+        FAILED = 'failed', 'Failed'
+
+    channel = models.CharField(max_length=10, choices=Channel.choices)
+    recipient = models.CharField(max_length=254)
+    subject = models.CharField(max_length=200, blank=True)
+    message = models.TextField()
+    status = models.CharField(max_length=20, choices=DeliveryStatus.choices, default=DeliveryStatus.PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'next_attempt_at'])]
+
+
+class DashboardCounter(models.Model):
+    key = models.CharField(max_length=64, primary_key=True)
+    value = models.IntegerField(default=0)
+    reconciled_at = models.DateTimeField(default=timezone.now)
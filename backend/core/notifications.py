@@ -0,0 +1,158 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Appointment, NotificationOutbox
+from .utils import send_mock_sms
+
+logger = logging.getLogger(__name__)
+
+
+STATUS_NOTIFICATIONS = {
+    Appointment.AppointmentStatus.APPROVED: (
+        'Appointment Approved',
+        'Your appointment #{id} has been approved.',
+        'Appointment #{id} approved.',
+    ),
+    Appointment.AppointmentStatus.REJECTED: (
+        'Appointment Rejected',
+        'Your appointment #{id} has been rejected.',
+        'Appointment #{id} rejected.',
+    ),
+}
+
+
+def build_patient_notifications(patient, subject, email_message, sms_message):
+    rows = []
+    if patient.email:
+        rows.append(NotificationOutbox(
+            channel=NotificationOutbox.Channel.EMAIL,
+            recipient=patient.email,
+            subject=subject,
+            message=email_message,
+        ))
+    if patient.phone:
+        rows.append(NotificationOutbox(
+            channel=NotificationOutbox.Channel.SMS,
+            recipient=patient.phone,
+            message=sms_message,
+        ))
+    return rows
+
+
+def queue_patient_notification(patient, subject, email_message, sms_message):
+    # Call inside the transaction that changes the appointment so the
+    # notifications commit or roll back together with it.
+    rows = build_patient_notifications(patient, subject, email_message, sms_message)
+    if rows:
+        NotificationOutbox.objects.bulk_create(rows)
+    return rows
+
+
+def queue_status_notifications(appointments):
+    rows = []
+    for appointment in appointments:
+        if appointment.status in STATUS_NOTIFICATIONS:
+            subject, email_message, sms_message = STATUS_NOTIFICATIONS[appointment.status]
+            rows.extend(build_patient_notifications(
+                appointment.patient,
+                subject,
+                email_message.format(id=appointment.id),
+                sms_message.format(id=appointment.id),
+            ))
+    if rows:
+        NotificationOutbox.objects.bulk_create(rows)
+    return rows
+
+
+def claim_batch(batch_size, lease_seconds=300):
+    # The lease pushes next_attempt_at forward, so rows held by a worker that
+    # dies are picked up again once it expires.
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            NotificationOutbox.objects.select_for_update(skip_locked=True)
+            .filter(status=NotificationOutbox.DeliveryStatus.PENDING, next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        if batch:
+            NotificationOutbox.objects.filter(pk__in=[item.pk for item in batch]).update(
+                next_attempt_at=now + timedelta(seconds=lease_seconds)
+            )
+    return batch
+
+
+def _send_emails(notifications):
+    results = []
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+        for notification in notifications:
+            message = EmailMessage(
+                subject=notification.subject,
+                body=notification.message,
+                to=[notification.recipient],
+                connection=connection,
+            )
+            try:
+                message.send()
+                results.append((notification, None))
+            except Exception as exc:
+                results.append((notification, exc))
+    except Exception as exc:
+        done = {item.pk for item, _ in results}
+        results.extend((item, exc) for item in notifications if item.pk not in done)
+    finally:
+        connection.close()
+    return results
+
+
+def _send_sms(notification):
+    try:
+        send_mock_sms(notification.recipient, notification.message)
+        return notification, None
+    except Exception as exc:
+        return notification, exc
+
+
+def _record_result(notification, error, max_attempts, backoff_seconds):
+    now = timezone.now()
+    notification.attempts += 1
+    if error is None:
+        notification.status = NotificationOutbox.DeliveryStatus.SENT
+        notification.sent_at = now
+        notification.last_error = ''
+    else:
+        logger.warning('Notification %s delivery failed: %s', notification.pk, error)
+        notification.last_error = str(error)
+        if notification.attempts >= max_attempts:
+            notification.status = NotificationOutbox.DeliveryStatus.FAILED
+        else:
+            notification.next_attempt_at = now + timedelta(seconds=backoff_seconds * 2 ** (notification.attempts - 1))
+    notification.save(update_fields=['attempts', 'status', 'sent_at', 'last_error', 'next_attempt_at', 'updated_at'])
+
+
+def deliver_batch(batch_size=100, workers=4, max_attempts=5, backoff_seconds=30):
+    # Emails share one backend connection per batch and SMS fan out on the
+    # pool; only the calling thread touches the database.
+    batch = claim_batch(batch_size)
+    if not batch:
+        return 0
+
+    emails = [item for item in batch if item.channel == NotificationOutbox.Channel.EMAIL]
+    sms = [item for item in batch if item.channel == NotificationOutbox.Channel.SMS]
+    results = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        email_future = pool.submit(_send_emails, emails) if emails else None
+        sms_futures = [pool.submit(_send_sms, item) for item in sms]
+        if email_future:
+            results.extend(email_future.result())
+        results.extend(future.result() for future in sms_futures)
+
+    for notification, error in results:
+        _record_result(notification, error, max_attempts, backoff_seconds)
+    return len(batch)
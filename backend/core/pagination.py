@@ -0,0 +1,37 @@
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class HybridPagination(PageNumberPagination):
+    """Page-number pagination with opt-in keyset (cursor) pagination.
+
+    Views that declare ``cursor_ordering`` switch to cursor pagination when the
+    request passes ``?pagination=cursor`` or a ``cursor`` token, which avoids
+    the COUNT(*) and OFFSET scans of page-number pagination on large tables.
+    """
+
+    mode_query_param = 'pagination'
+    cursor_query_param = 'cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        ordering = getattr(view, 'cursor_ordering', None)
+        wants_cursor = (
+            request.query_params.get(self.mode_query_param) == 'cursor'
+            or self.cursor_query_param in request.query_params
+        )
+        if ordering and wants_cursor:
+            self.cursor_paginator = CursorPagination()
+            self.cursor_paginator.ordering = ordering
+            self.cursor_paginator.page_size = self.page_size
+            return self.cursor_paginator.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class TimelinePagination(PageNumberPagination):
+    page_size_query_param = 'page_size'
+    max_page_size = 100
@@ -1,5 +1,7 @@
 from rest_framework.permissions import BasePermission
 
+from .policies import decide
+
 
 class IsRole(BasePermission):
     allowed_roles = []
@@ -33,13 +35,13 @@ class IsAdminOrDoctorRole(IsRole):
     allowed_roles = ["admin", "doctor"]
 
 
-class IsAppointmentOwnerDoctorOrAdmin(BasePermission):
-    def has_permission(self, request, view):
-        user = request.user
-        return bool(user and user.is_authenticated)
+class PolicyPermission(BasePermission):
+    """Check the view's policy action against the precompiled role policies."""
 
-    def has_object_permission(self, request, view, obj):
+    def has_permission(self, request, view):
         user = request.user
-        if user.is_superuser or user.role == "admin":
-            return True
-        return user.role == "doctor" and obj.doctor_id == user.id
+        if not user or not user.is_authenticated:
+            return False
+        decision = decide(user, view.queryset.model, view.get_policy_action())
+        self.message = decision.message
+        return decision.allowed
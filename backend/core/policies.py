@@ -0,0 +1,100 @@
+from django.contrib.auth import get_user_model
+from django.db.models import Q
+
+User = get_user_model()
+
+READ = 'read'
+CREATE = 'create'
+UPDATE = 'update'
+DELETE = 'delete'
+# Appointment workflow (approve/reject/cancel/complete, bulk status, patient detail).
+MANAGE = 'manage'
+IMPORT = 'import'
+
+ADMIN = User.Roles.ADMIN
+DOCTOR = User.Roles.DOCTOR
+RECEPTIONIST = User.Roles.RECEPTIONIST
+STAFF = (ADMIN, RECEPTIONIST, DOCTOR)
+
+DEFAULT_MESSAGE = 'Insufficient role permissions'
+
+
+def own_appointments(user):
+    return Q(doctor=user)
+
+
+def _grant(roles, scope=None):
+    return {role: scope for role in roles}
+
+
+def _crud(write_roles, read=None):
+    write = _grant(write_roles)
+    return {READ: read or _grant(STAFF), CREATE: write, UPDATE: write, DELETE: write}
+
+
+# model label -> action -> {role: scope}. A role missing from an action is
+# denied. A scope of None allows every row; otherwise it is a function of
+# the user returning a Q that is applied to the queryset in SQL.
+POLICIES = {
+    'core.patient': {**_crud(STAFF), IMPORT: _grant([ADMIN])},
+    'core.doctor': _crud([ADMIN]),
+    'core.doctorschedule': _crud([ADMIN, DOCTOR]),
+    'core.doctorleave': _crud([ADMIN, DOCTOR]),
+    'core.appointment': {
+        **_crud([ADMIN, RECEPTIONIST], read={ADMIN: None, RECEPTIONIST: None, DOCTOR: own_appointments}),
+        MANAGE: {ADMIN: None, DOCTOR: own_appointments},
+    },
+    'core.labtest': _crud(STAFF),
+    'core.ward': _crud([ADMIN, RECEPTIONIST]),
+    'core.bed': _crud([ADMIN, RECEPTIONIST]),
+    'core.bedtransfer': _crud([ADMIN, RECEPTIONIST]),
+}
+
+MESSAGES = {
+    ('core.patient', IMPORT): 'You do not have permission to perform this action.',
+    ('core.appointment', CREATE): 'Only admin/receptionist can create appointments',
+    ('core.appointment', UPDATE): 'Doctors cannot edit appointment payload directly',
+    ('core.appointment', DELETE): 'Doctors cannot delete appointments',
+    ('core.appointment', MANAGE): 'You do not have permission to perform this action.',
+}
+
+
+class Decision:
+    __slots__ = ('allowed', 'scope', 'message')
+
+    def __init__(self, allowed, scope=None, message=DEFAULT_MESSAGE):
+        self.allowed = allowed
+        self.scope = scope
+        self.message = message
+
+
+DENIED = Decision(False)
+
+_decisions = {}
+
+
+def compile_policies():
+    """Flatten POLICIES into one Decision per (role, model, action)."""
+    decisions = {}
+    for label, actions in POLICIES.items():
+        for action, grants in actions.items():
+            message = MESSAGES.get((label, action), DEFAULT_MESSAGE)
+            for role in User.Roles.values:
+                decisions[(role, label, action)] = Decision(role in grants, grants.get(role), message)
+    _decisions.clear()
+    _decisions.update(decisions)
+
+
+def decide(user, model, action):
+    # Superusers get the admin policy whatever their role.
+    role = ADMIN if user.is_superuser else user.role
+    return _decisions.get((role, model._meta.label_lower, action), DENIED)
+
+
+def scope_queryset(queryset, user, action):
+    decision = decide(user, queryset.model, action)
+    if not decision.allowed:
+        return queryset.none()
+    if decision.scope is None:
+        return queryset
+    return queryset.filter(decision.scope(user))
@@ -0,0 +1,130 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce, Concat, NullIf, Trim
+from rest_framework import serializers
+
+COMPACT = 'compact'
+
+# Field types whose representation differs from the raw database value.
+CONVERTED_FIELDS = (
+    serializers.BooleanField,
+    serializers.DateField,
+    serializers.DateTimeField,
+    serializers.DecimalField,
+    serializers.DurationField,
+    serializers.FloatField,
+    serializers.TimeField,
+    serializers.UUIDField,
+)
+
+
+def patient_name(prefix=''):
+    """SQL equivalent of ``Patient.__str__``."""
+    return Concat(F(f'{prefix}first_name'), Value(' '), F(f'{prefix}last_name'))
+
+
+def user_display_name(prefix=''):
+    """SQL equivalent of ``user.get_full_name() or user.username``."""
+    full_name = Trim(Concat(F(f'{prefix}first_name'), Value(' '), F(f'{prefix}last_name')))
+    return Coalesce(NullIf(full_name, Value('')), F(f'{prefix}username'))
+
+
+class ListProjection:
+    """Render list pages from ``values()`` rows instead of model instances.
+
+    Keys, their order and their representation come from the serializer's
+    readable fields, so the output matches ``serializer_class(many=True)``.
+    Fields computed in Python (dotted sources, method fields) need a database
+    expression in ``annotations``. ``compact`` names the reduced field set
+    returned for ``?fields=compact``.
+    """
+
+    def __init__(self, serializer_class, annotations=None, compact=()):
+        self.serializer_class = serializer_class
+        self.annotations = annotations or {}
+        self.compact = tuple(compact)
+        self._columns = None
+
+    @property
+    def columns(self):
+        if self._columns is None:
+            self._columns = self._build_columns()
+        return self._columns
+
+    def _build_columns(self):
+        columns = {}
+        for name, field in self.serializer_class().fields.items():
+            if field.write_only:
+                continue
+            if name in self.annotations:
+                columns[name] = (None, None)
+            elif isinstance(field, serializers.SerializerMethodField) or field.source == '*' or '.' in field.source:
+                raise ImproperlyConfigured(f'{self.serializer_class.__name__}.{name} needs an annotation to be projected.')
+            elif isinstance(field, serializers.FileField):
+                columns[name] = (field.source, field)
+            elif isinstance(field, CONVERTED_FIELDS):
+                columns[name] = (field.source, field.to_representation)
+            else:
+                columns[name] = (field.source, None)
+        return columns
+
+    def select(self, fields_param):
+        """Resolve ``?fields=`` to output keys; raises ValueError for unknown names."""
+        if not fields_param:
+            return list(self.columns)
+        if fields_param == COMPACT:
+            return list(self.compact)
+        requested = {name.strip() for name in fields_param.split(',') if name.strip()}
+        unknown = requested - set(self.columns)
+        if unknown:
+            raise ValueError(', '.join(sorted(unknown)))
+        return [name for name in self.columns if name in requested]
+
+    def values(self, queryset, keys, extra=()):
+        """``extra`` lists model fields the paginator needs besides the output keys."""
+        sources = {self.columns[key][0] for key in keys if self.columns[key][0]}
+        sources.update(extra)
+        if any(hasattr(self.columns[key][1], 'url_for') for key in keys):
+            sources.add('pk')
+        annotations = {key: self.annotations[key] for key in keys if key in self.annotations}
+        return queryset.values(*sources, **annotations)
+
+    def render(self, rows, keys, request=None):
+        plan = []
+        for key in keys:
+            source, convert = self.columns[key]
+            if isinstance(convert, serializers.FileField):
+                plan.append((key, source, None, self._file_converter(convert, request)))
+            else:
+                plan.append((key, source or key, convert, None))
+
+        data = []
+        for row in rows:
+            item = {}
+            for key, source, convert, convert_file in plan:
+                value = row[source]
+                if convert_file is not None:
+                    item[key] = convert_file(value, row)
+                else:
+                    item[key] = convert(value) if convert is not None and value is not None else value
+            data.append(item)
+        return data
+
+    def _file_converter(self, field, request):
+        # Fields with ``url_for(pk, request)`` link to an endpoint rather
+        # than to storage.
+        storage = self.serializer_class.Meta.model._meta.get_field(field.source).storage
+        use_url = getattr(field, 'use_url', True)
+        url_for = getattr(field, 'url_for', None)
+
+        def convert(name, row):
+            if not name:
+                return None
+            if url_for is not None:
+                return url_for(row['pk'], request)
+            if not use_url:
+                return name
+            url = storage.url(name)
+            return request.build_absolute_uri(url) if request is not None else url
+
+        return convert
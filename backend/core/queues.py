@@ -0,0 +1,273 @@
+import threading
+import time
+from bisect import insort
+from datetime import datetime, time as clock, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .db_router import primary
+from .models import Appointment, User
+from .realtime import Hub
+
+WAITING = Appointment.AppointmentStatus.APPROVED
+COMPLETED = Appointment.AppointmentStatus.COMPLETED
+# Version keys are per day; keep them past midnight, then let them expire.
+VERSION_TIMEOUT = 2 * 24 * 60 * 60
+
+
+def _version_key(day, doctor_user_id):
+    return f'queue:version:{day.isoformat()}:{doctor_user_id}'
+
+
+def _day_bounds(day):
+    start = timezone.make_aware(datetime.combine(day, clock.min))
+    return start, start + timedelta(days=1)
+
+
+def queue_key(appointment):
+    # (doctor user id, local day) of an appointment as loaded or last saved.
+    appointment_date = appointment.__dict__.get('appointment_date')
+    if appointment_date is None:
+        return None
+    return appointment.__dict__.get('doctor_id'), timezone.localtime(appointment_date).date()
+
+
+def entry(appointment, deleted=False):
+    # Plain values, so an on_commit callback does not see later edits.
+    return (
+        appointment.pk,
+        appointment.doctor_id,
+        appointment.token_number,
+        None if deleted else appointment.status,
+        timezone.localtime(appointment.appointment_date).date(),
+        getattr(appointment, '_queue_key', None),
+    )
+
+
+class DoctorQueue:
+    """One doctor's approved and completed tokens for a single day."""
+
+    __slots__ = ('doctor', 'day', 'version', 'waiting', 'tokens', 'completed', 'last_completed', '_snapshot')
+
+    def __init__(self, doctor, day, version):
+        self.doctor = doctor
+        self.day = day
+        self.version = version
+        self.waiting = []  # (token_number, appointment_id), token order
+        self.tokens = {}  # appointment_id -> token_number for waiting rows
+        self.completed = set()
+        self.last_completed = None
+        self._snapshot = None
+
+    def add(self, appointment_id, token, status):
+        self._snapshot = None
+        if status == WAITING:
+            self.tokens[appointment_id] = token
+            insort(self.waiting, (token, appointment_id))
+        else:
+            self.completed.add(appointment_id)
+            self.last_completed = token if self.last_completed is None else max(self.last_completed, token)
+
+    def discard(self, appointment_id):
+        self._snapshot = None
+        token = self.tokens.pop(appointment_id, None)
+        if token is not None:
+            self.waiting.remove((token, appointment_id))
+        self.completed.discard(appointment_id)
+
+    def snapshot(self):
+        # Rendered once per change; every display reads the same dict.
+        if self._snapshot is None:
+            slot = settings.APPOINTMENT_SLOT_MINUTES
+            upcoming = self.waiting[1:settings.QUEUE_DISPLAY_NEXT_TOKENS + 1]
+            self._snapshot = {
+                'doctor': self.doctor,
+                'date': self.day,
+                'version': self.version,
+                'current_token': self.waiting[0][0] if self.waiting else None,
+                'next_tokens': [
+                    {'token': token, 'estimated_wait_minutes': position * slot}
+                    for position, (token, _) in enumerate(upcoming, start=1)
+                ],
+                'waiting': len(self.waiting),
+                'completed': len(self.completed),
+                'last_completed_token': self.last_completed,
+            }
+        return self._snapshot
+
+
+class QueueBoard:
+    """Today's token queues for every doctor, kept in process memory.
+
+    The board is built from the database on first use in each worker and
+    again when the day changes. Committed status changes are applied in
+    place and pushed to the doctor's hub. Each change also bumps a
+    per-doctor version in the cache, and a worker whose copy is behind
+    reloads that doctor before answering, so workers stay consistent
+    without a query per refresh.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._day = None
+        self._queues = {}
+        self._owners = {}  # appointment_id -> doctor user id
+        self._hubs = {}
+        self._doctors = set()  # user ids confirmed to have the doctor role
+
+    def _current_version(self, day, doctor):
+        key = _version_key(day, doctor)
+        version = cache.get(key)
+        if version is None:
+            cache.add(key, time.time_ns(), VERSION_TIMEOUT)
+            version = cache.get(key)
+        return version
+
+    def _bump(self, day, doctor):
+        key = _version_key(day, doctor)
+        try:
+            return cache.incr(key)
+        except ValueError:
+            version = time.time_ns()
+            cache.set(key, version, VERSION_TIMEOUT)
+            return version
+
+    def _is_doctor(self, doctor):
+        # Unknown ids get no queue, version key or hub, so clients cannot
+        # grow them without bound.
+        if doctor in self._doctors:
+            return True
+        if not User.objects.filter(pk=doctor, role=User.Roles.DOCTOR).exists():
+            return False
+        self._doctors.add(doctor)
+        return True
+
+    def _load(self, day, doctors=None):
+        start, end = _day_bounds(day)
+        rows = Appointment.objects.filter(
+            appointment_date__gte=start, appointment_date__lt=end, status__in=[WAITING, COMPLETED]
+        )
+        if doctors is not None:
+            rows = rows.filter(doctor_id__in=doctors)
+        queues = {doctor: DoctorQueue(doctor, day, self._current_version(day, doctor)) for doctor in doctors or ()}
+        with primary():
+            rows = list(rows.values_list('id', 'doctor_id', 'token_number', 'status'))
+        for appointment_id, doctor, token, status in rows:
+            queue = queues.get(doctor)
+            if queue is None:
+                queue = queues[doctor] = DoctorQueue(doctor, day, self._current_version(day, doctor))
+            queue.add(appointment_id, token, status)
+        return queues
+
+    def _ensure_day(self):
+        day = timezone.localdate()
+        if self._day != day:
+            self._queues = self._load(day)
+            self._owners = {
+                appointment_id: queue.doctor
+                for queue in self._queues.values()
+                for appointment_id in (*queue.tokens, *queue.completed)
+            }
+            self._day = day
+        return day
+
+    def _reload(self, doctor):
+        stale = self._queues.get(doctor)
+        if stale is not None:
+            for appointment_id in (*stale.tokens, *stale.completed):
+                self._owners.pop(appointment_id, None)
+        queue = self._load(self._day, [doctor])[doctor]
+        self._queues[doctor] = queue
+        for appointment_id in (*queue.tokens, *queue.completed):
+            self._owners[appointment_id] = doctor
+        return queue
+
+    def _queue(self, doctor, version=None):
+        if version is None:
+            version = self._current_version(self._day, doctor)
+        queue = self._queues.get(doctor)
+        if queue is None or queue.version != version:
+            queue = self._reload(doctor)
+        return queue
+
+    def get(self, doctor):
+        """Snapshot of ``doctor``'s queue, or None if it is not a doctor's user id."""
+        with self._lock:
+            if not self._is_doctor(doctor):
+                return None
+            self._ensure_day()
+            return self._queue(doctor).snapshot()
+
+    def all(self):
+        with self._lock:
+            day = self._ensure_day()
+            doctors = sorted(self._queues)
+            versions = cache.get_many([_version_key(day, doctor) for doctor in doctors])
+            return [self._queue(doctor, versions.get(_version_key(day, doctor))).snapshot() for doctor in doctors]
+
+    def apply(self, entries):
+        """Apply committed appointment changes (see ``entry``).
+
+        ``status`` None means the appointment was deleted.
+        """
+        today = timezone.localdate()
+        published = []
+        with self._lock:
+            built = self._day == today
+            touched = set()
+            for appointment_id, doctor, token, status, day, previous_key in entries:
+                if previous_key and previous_key[1] == today:
+                    # It may still be queued under the old doctor elsewhere.
+                    touched.add(previous_key[0])
+                previous = self._owners.pop(appointment_id, None) if built else None
+                if previous is not None and previous in self._queues:
+                    self._queues[previous].discard(appointment_id)
+                    touched.add(previous)
+                if day != today:
+                    continue
+                touched.add(doctor)
+                if built and status in (WAITING, COMPLETED):
+                    queue = self._queues.get(doctor)
+                    if queue is None:
+                        queue = self._queues[doctor] = DoctorQueue(doctor, today, None)
+                    queue.add(appointment_id, token, status)
+                    self._owners[appointment_id] = doctor
+            for doctor in touched:
+                version = self._bump(today, doctor)
+                queue = self._queues.get(doctor) if built else None
+                if queue is None:
+                    continue
+                if queue.version is not None and version == queue.version + 1:
+                    queue.version = version
+                    queue._snapshot = None
+                else:
+                    # Another worker changed this queue since our copy was
+                    # loaded (or the key expired), so our copy is incomplete.
+                    queue = self._reload(doctor)
+                published.append((doctor, queue.snapshot()))
+            hubs = {doctor: self._hubs.get(doctor) for doctor, _ in published}
+        for doctor, snapshot in published:
+            if hubs[doctor] is not None:
+                hubs[doctor].publish({'type': 'queue', **snapshot})
+
+    def hub(self, doctor):
+        """Event hub for ``doctor``, or None if it is not a doctor's user id."""
+        with self._lock:
+            if not self._is_doctor(doctor):
+                return None
+            hub = self._hubs.get(doctor)
+            if hub is None:
+                hub = self._hubs[doctor] = Hub()
+            return hub
+
+    def reset(self):
+        with self._lock:
+            self._day = None
+            self._queues = {}
+            self._owners = {}
+            self._doctors = set()
+
+
+board = QueueBoard()
@@ -0,0 +1,79 @@
+import asyncio
+import json
+import threading
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+class Subscription:
+    def __init__(self, hub, loop, max_queue):
+        self.hub = hub
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=max_queue)
+
+    def _put(self, event):
+        # Runs on the subscriber's loop. A slow client loses its oldest events
+        # and is told to resync instead of growing memory without bound.
+        if self.queue.full():
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({'type': 'resync'})
+            return
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+
+class Hub:
+    # In-process fan-out: each worker process keeps its own subscribers, fed by
+    # the model signals that run in that process.
+
+    def __init__(self, max_queue=100):
+        self.max_queue = max_queue
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        subscription = Subscription(self, asyncio.get_running_loop(), self.max_queue)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def publish(self, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._put, event)
+            except RuntimeError:
+                self.unsubscribe(subscription)
+
+    def __len__(self):
+        return len(self._subscriptions)
+
+
+bed_hub = Hub()
+
+
+def format_sse(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event, cls=DjangoJSONEncoder)}\n\n"
+
+
+def bed_event(bed, event_type='bed'):
+    return {
+        'type': event_type,
+        'id': bed.pk,
+        'ward': bed.ward_id,
+        'bed_number': bed.bed_number,
+        'is_icu': bed.is_icu,
+        'is_occupied': bed.is_occupied,
+        'current_patient': bed.current_patient_id,
+    }
@@ -0,0 +1,174 @@
+import re
+import unicodedata
+
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Patient, PatientSearchToken
+
+NAME_PREFIX = 'n:'
+EMAIL_PREFIX = 'e:'
+PHONE_PREFIX = 'p:'
+PHONE_DELETION_PREFIX = 'pd:'
+
+TOKEN_MAX_LENGTH = PatientSearchToken._meta.get_field('token').max_length
+MIN_TERM_LENGTH = 2
+MIN_FUZZY_PHONE_LENGTH = 7
+# Index entries read per search condition.
+SCAN_LIMIT = 1000
+PHONE_QUERY_RE = re.compile(r'^[\d\s()+.-]+$')
+
+EXACT_SCORE = 3
+PREFIX_SCORE = 2
+FUZZY_SCORE = 1
+
+
+def normalize(value):
+    value = unicodedata.normalize('NFKD', value or '')
+    return ''.join(char for char in value if not unicodedata.combining(char)).lower()
+
+
+def phone_digits(value):
+    digits = re.sub(r'\D', '', value or '')
+    # National numbers are searched without the country code.
+    return digits[-10:]
+
+
+def _token(prefix, value):
+    # Long emails are cut to fit the column; queries are cut the same way,
+    # so exact and prefix matches still line up.
+    return f'{prefix}{value}'[:TOKEN_MAX_LENGTH]
+
+
+def _deletions(digits):
+    return {digits[:index] + digits[index + 1:] for index in range(len(digits))}
+
+
+def patient_tokens(patient):
+    tokens = set()
+    for part in re.split(r'[^\w]+', normalize(f'{patient.first_name} {patient.last_name}')):
+        if part:
+            tokens.add(_token(NAME_PREFIX, part))
+    if patient.email:
+        tokens.add(_token(EMAIL_PREFIX, normalize(patient.email)))
+    digits = phone_digits(patient.phone)
+    if digits:
+        tokens.add(f'{PHONE_PREFIX}{digits}')
+        # Storing every one-digit deletion lets a single mistyped, missing or
+        # extra digit still match (symmetric-deletion lookup).
+        tokens.update(f'{PHONE_DELETION_PREFIX}{variant}' for variant in _deletions(digits))
+    return tokens
+
+
+def index_patients(patients):
+    patients = list(patients)
+    PatientSearchToken.objects.filter(patient__in=patients).delete()
+    PatientSearchToken.objects.bulk_create(
+        [PatientSearchToken(patient=patient, token=token) for patient in patients for token in patient_tokens(patient)],
+        batch_size=1000,
+    )
+
+
+def reindex_patients(start_after=0, batch_size=1000):
+    last_id = start_after
+    total = 0
+    while True:
+        batch = list(
+            Patient.objects.filter(pk__gt=last_id)
+            .only('id', 'first_name', 'last_name', 'email', 'phone')
+            .order_by('pk')[:batch_size]
+        )
+        if not batch:
+            return total
+        with transaction.atomic():
+            index_patients(batch)
+        last_id = batch[-1].pk
+        total += len(batch)
+
+
+def _prefix(token):
+    # A range rather than startswith: LIKE with ESCAPE cannot use the
+    # (token, patient) index on every backend, a range always can.
+    return Q(token__gte=token, token__lt=token[:-1] + chr(ord(token[-1]) + 1))
+
+
+def _term_conditions(term):
+    if '@' in term:
+        token = _token(EMAIL_PREFIX, normalize(term))
+        return [(Q(token=token), EXACT_SCORE), (_prefix(token), PREFIX_SCORE)]
+    if PHONE_QUERY_RE.match(term) and len(re.sub(r'\D', '', term)) >= MIN_TERM_LENGTH:
+        digits = phone_digits(term)
+        conditions = [
+            (Q(token=f'{PHONE_PREFIX}{digits}'), EXACT_SCORE),
+            (_prefix(f'{PHONE_PREFIX}{digits}'), PREFIX_SCORE),
+        ]
+        if len(digits) >= MIN_FUZZY_PHONE_LENGTH:
+            variants = _deletions(digits) | {digits}
+            conditions.append((
+                Q(token__in=[f'{PHONE_DELETION_PREFIX}{variant}' for variant in variants])
+                | Q(token__in=[f'{PHONE_PREFIX}{variant}' for variant in variants]),
+                FUZZY_SCORE,
+            ))
+        return conditions
+    token = _token(NAME_PREFIX, normalize(term))
+    return [(Q(token=token), EXACT_SCORE), (_prefix(token), PREFIX_SCORE)]
+
+
+def split_query(query):
+    query = (query or '').strip()
+    if PHONE_QUERY_RE.match(query):
+        terms = [query]
+    else:
+        terms = query.split()
+    return [term for term in terms if len(term) >= MIN_TERM_LENGTH]
+
+
+def _term_scores(term, patient_ids=None, enough=None):
+    """Best score per patient for ``term``, and whether every match was read.
+
+    Conditions are read best first, each as an index range scan on
+    (token, patient) cut at SCAN_LIMIT entries, so the cost is bounded by
+    SCAN_LIMIT and not by how many patients share a common name or phone
+    prefix. ``patient_ids`` restricts the scan to existing candidates;
+    reading stops once ``enough`` patients have been found.
+    """
+    scores, complete = {}, True
+    for condition, score in _term_conditions(term):
+        rows = PatientSearchToken.objects.filter(condition)
+        if patient_ids is not None:
+            rows = rows.filter(patient_id__in=patient_ids)
+        matched = list(rows.order_by('token', 'patient_id').values_list('patient_id', flat=True)[:SCAN_LIMIT])
+        complete = complete and len(matched) < SCAN_LIMIT
+        for patient_id in matched:
+            scores.setdefault(patient_id, score)
+        if enough is not None and len(scores) >= enough:
+            return scores, False
+    return scores, complete
+
+
+def search_patients(query, limit=20):
+    # Every term must match; patients are ranked by the summed best score of
+    # each term (exact > prefix > fuzzy phone), then by id.
+    terms = split_query(query)
+    if not terms:
+        return []
+
+    if len(terms) == 1:
+        ranks, _ = _term_scores(terms[0], enough=limit)
+    else:
+        scanned = [_term_scores(term) for term in terms]
+        # Candidates come from a term whose matches were all read (a rare
+        # name), so a common first name cut at SCAN_LIMIT cannot hide them.
+        driver = min(range(len(terms)), key=lambda index: (not scanned[index][1], len(scanned[index][0])))
+        ranks = dict(scanned[driver][0])
+        for index, term in enumerate(terms):
+            if index == driver or not ranks:
+                continue
+            scores, complete = scanned[index]
+            if not complete:
+                scores, _ = _term_scores(term, patient_ids=list(ranks))
+            ranks = {patient_id: rank + scores[patient_id] for patient_id, rank in ranks.items() if patient_id in scores}
+
+    patient_ids = sorted(ranks, key=lambda patient_id: (-ranks[patient_id], patient_id))[:limit]
+    patients = Patient.objects.in_bulk(patient_ids)
+    return [patients[patient_id] for patient_id in patient_ids if patient_id in patients]
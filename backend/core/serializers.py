@@ -1,10 +1,16 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.core.mail import send_mail
-from django.db.models import Max
+from django.db import transaction
+from django.utils import timezone
 from rest_framework import serializers
+from rest_framework.reverse import reverse
 
-from .models import Appointment, Bed, BedTransfer, Doctor, DoctorLeave, DoctorSchedule, LabTest, Patient, Ward
-from .utils import send_mock_sms
+from . import stats
+from .conditional import bump_table_version
+from .models import Appointment, AppointmentTokenCounter, Bed, BedTransfer, Doctor, DoctorLeave, DoctorSchedule, LabTest, Patient, Ward
+from .notifications import queue_patient_notification
+from .realtime import bed_event, bed_hub
+from .timeline import invalidate as invalidate_timeline
 
 User = get_user_model()
 
@@ -112,23 +118,17 @@ class AppointmentSerializer(serializers.ModelSerializer):
         validated_data.pop('doctor_user_id', None)
         doctor = validated_data['doctor']
         appointment_date = validated_data['appointment_date']
-        daily_last_token = Appointment.objects.filter(
-            doctor=doctor,
-            appointment_date__date=appointment_date.date(),
-        ).aggregate(max_token=Max('token_number'))['max_token'] or 0
-        validated_data['token_number'] = daily_last_token + 1
-        instance = super().create(validated_data)
-
-        if instance.patient.email:
-            send_mail(
-                subject='Hospital Appointment Booked',
-                message=f'Your token number is {instance.token_number} for {instance.appointment_date}.',
-                from_email=None,
-                recipient_list=[instance.patient.email],
-                fail_silently=True,
+        with transaction.atomic():
+            validated_data['token_number'] = AppointmentTokenCounter.next_token(
+                doctor, timezone.localtime(appointment_date).date()
+            )
+            instance = super().create(validated_data)
+            queue_patient_notification(
+                instance.patient,
+                'Hospital Appointment Booked',
+                f'Your token number is {instance.token_number} for {instance.appointment_date}.',
+                f'Appointment booked. Token: {instance.token_number}',
             )
-        if instance.patient.phone:
-            send_mock_sms(instance.patient.phone, f'Appointment booked. Token: {instance.token_number}')
         return instance
 
     def update(self, instance, validated_data):
@@ -137,22 +137,67 @@ class AppointmentSerializer(serializers.ModelSerializer):
         return super().update(instance, validated_data)
 
 
+class AppointmentBulkStatusSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=500)
+    status = serializers.ChoiceField(choices=Appointment.AppointmentStatus.choices)
+
+
+class ReportFileField(serializers.FileField):
+    # Reports are not served from MEDIA_URL; clients download them through
+    # the permission-checked report action.
+    def to_representation(self, value):
+        if not value:
+            return None
+        return self.url_for(value.instance.pk, self.context.get('request'))
+
+    @staticmethod
+    def url_for(pk, request=None):
+        return reverse('lab-tests-report', kwargs={'pk': pk}, request=request)
+
+
 class LabTestSerializer(serializers.ModelSerializer):
+    report_file = ReportFileField(required=False, allow_null=True)
+
     class Meta:
         model = LabTest
         fields = '__all__'
+        read_only_fields = ['report_blob']
+
+    def validate_report_file(self, value):
+        if value and value.size > settings.LAB_REPORT_MAX_BYTES:
+            raise serializers.ValidationError('Report exceeds the maximum upload size.')
+        return value
 
 
 class WardSerializer(serializers.ModelSerializer):
     available_beds = serializers.SerializerMethodField()
+    occupied_beds = serializers.SerializerMethodField()
+    icu_available_beds = serializers.SerializerMethodField()
 
     class Meta:
         model = Ward
-        fields = ['id', 'name', 'ward_type', 'total_beds', 'available_beds', 'created_at', 'updated_at']
+        fields = [
+            'id', 'name', 'ward_type', 'total_beds', 'available_beds', 'occupied_beds', 'icu_available_beds',
+            'created_at', 'updated_at',
+        ]
 
+    # WardViewSet annotates these counts; the fallbacks only run for instances
+    # that did not come from its queryset (e.g. the response to a create).
     def get_available_beds(self, obj):
+        if hasattr(obj, 'available_beds'):
+            return obj.available_beds
         return obj.beds.filter(is_occupied=False).count()
 
+    def get_occupied_beds(self, obj):
+        if hasattr(obj, 'occupied_beds'):
+            return obj.occupied_beds
+        return obj.beds.filter(is_occupied=True).count()
+
+    def get_icu_available_beds(self, obj):
+        if hasattr(obj, 'icu_available_beds'):
+            return obj.icu_available_beds
+        return obj.beds.filter(is_icu=True, is_occupied=False).count()
+
 
 class BedSerializer(serializers.ModelSerializer):
     class Meta:
@@ -166,18 +211,99 @@ class BedTransferSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
     def create(self, validated_data):
-        from_bed = validated_data.get('from_bed')
-        to_bed = validated_data['to_bed']
         patient = validated_data['patient']
+        bed_ids = {validated_data['to_bed'].pk}
+        if validated_data.get('from_bed'):
+            bed_ids.add(validated_data['from_bed'].pk)
+        if len(bed_ids) == 1 and validated_data.get('from_bed'):
+            raise serializers.ValidationError({'to_bed': 'Patient is already in this bed'})
+
+        with transaction.atomic():
+            # Lock both rows in primary-key order so concurrent transfers
+            # touching the same beds cannot deadlock.
+            beds = {bed.pk: bed for bed in Bed.objects.select_for_update().filter(pk__in=bed_ids).order_by('pk')}
+            to_bed = beds[validated_data['to_bed'].pk]
+            from_bed = beds.get(validated_data['from_bed'].pk) if validated_data.get('from_bed') else None
+
+            if to_bed.is_occupied:
+                raise serializers.ValidationError({'to_bed': 'Bed is already occupied'})
+            if from_bed and from_bed.current_patient_id not in (None, patient.pk):
+                raise serializers.ValidationError({'from_bed': 'Bed is occupied by another patient'})
+
+            if from_bed:
+                from_bed.is_occupied = False
+                from_bed.current_patient = None
+                from_bed.save(update_fields=['is_occupied', 'current_patient', 'updated_at'])
+
+            to_bed.is_occupied = True
+            to_bed.current_patient = patient
+            to_bed.save(update_fields=['is_occupied', 'current_patient', 'updated_at'])
+
+            validated_data['from_bed'] = from_bed
+            validated_data['to_bed'] = to_bed
+            return super().create(validated_data)
+
+
+class BedAllocationSerializer(serializers.Serializer):
+    ward = serializers.PrimaryKeyRelatedField(queryset=Ward.objects.all(), required=False)
+    is_icu = serializers.BooleanField(required=False, allow_null=True, default=None)
+    count = serializers.IntegerField(min_value=1, max_value=500, required=False)
+    patients = serializers.PrimaryKeyRelatedField(queryset=Patient.objects.all(), many=True, required=False)
+    reason = serializers.CharField(required=False, allow_blank=True, default='')
 
-        if from_bed:
-            from_bed.is_occupied = False
-            from_bed.current_patient = None
-            from_bed.save(update_fields=['is_occupied', 'current_patient'])
-
-        to_bed.is_occupied = True
-        to_bed.current_patient = patient
-        to_bed.save(update_fields=['is_occupied', 'current_patient'])
-
-        return super().create(validated_data)
+    def validate(self, attrs):
+        patients = attrs.get('patients') or []
+        if not attrs.get('count'):
+            if not patients:
+                raise serializers.ValidationError({'count': 'Provide count or patients'})
+            attrs['count'] = len(patients)
+        if patients and len(patients) != attrs['count']:
+            raise serializers.ValidationError({'patients': 'Provide one patient per allocated bed'})
+        if len({patient.pk for patient in patients}) != len(patients):
+            raise serializers.ValidationError({'patients': 'Duplicate patients'})
+        return attrs
 
+    def create(self, validated_data):
+        count = validated_data['count']
+        patients = validated_data.get('patients') or []
+        free_beds = Bed.objects.select_for_update(skip_locked=True).filter(is_occupied=False)
+        if validated_data.get('ward'):
+            free_beds = free_beds.filter(ward=validated_data['ward'])
+        if validated_data.get('is_icu') is not None:
+            free_beds = free_beds.filter(is_icu=validated_data['is_icu'])
+
+        with transaction.atomic():
+            if patients:
+                # Lock the patients first so two allocations naming the same
+                # patient serialize and the second sees the first one's bed.
+                patient_ids = sorted(patient.pk for patient in patients)
+                list(Patient.objects.select_for_update().filter(pk__in=patient_ids).values_list('pk'))
+                seated = sorted(Bed.objects.filter(current_patient__in=patient_ids).values_list('current_patient_id', flat=True))
+                if seated:
+                    raise serializers.ValidationError(
+                        {'patients': f'Patients already occupy a bed: {", ".join(map(str, seated))}'}
+                    )
+            beds = list(free_beds.order_by('ward_id', 'bed_number')[:count])
+            if len(beds) < count:
+                raise serializers.ValidationError({'count': f'Only {len(beds)} matching beds are free'})
+
+            now = timezone.now()
+            for index, bed in enumerate(beds):
+                bed.is_occupied = True
+                bed.current_patient = patients[index] if patients else None
+                bed.updated_at = now
+            Bed.objects.bulk_update(beds, ['is_occupied', 'current_patient', 'updated_at'])
+            if patients:
+                BedTransfer.objects.bulk_create([
+                    BedTransfer(patient=patient, to_bed=bed, reason=validated_data['reason'])
+                    for patient, bed in zip(patients, beds)
+                ])
+            # bulk_update skips the signals that maintain the dashboard counter,
+            # the occupancy board and the patients' timelines.
+            stats.increment(stats.BEDS_AVAILABLE, -len(beds))
+            transaction.on_commit(lambda: bump_table_version(Bed, BedTransfer))
+            events = [bed_event(bed) for bed in beds]
+            transaction.on_commit(lambda: [bed_hub.publish(event) for event in events])
+            patient_ids = [patient.pk for patient in patients]
+            transaction.on_commit(lambda: invalidate_timeline(*patient_ids))
+        return beds
@@ -0,0 +1,189 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from . import availability, queues, search, stats, timeline
+from .authentication import invalidate_cached_user
+from .conditional import bump_table_version
+from .realtime import bed_event, bed_hub
+from .models import Appointment, Bed, BedTransfer, Doctor, DoctorLeave, DoctorSchedule, LabTest, Patient, User, Ward
+
+
+@receiver(post_save, sender=Patient)
+def patient_saved(sender, instance, created, **kwargs):
+    if created:
+        stats.increment(stats.TOTAL_PATIENTS)
+    search.index_patients([instance])
+
+
+@receiver(post_delete, sender=Patient)
+def patient_deleted(sender, instance, **kwargs):
+    stats.increment(stats.TOTAL_PATIENTS, -1)
+
+
+@receiver(post_save, sender=Doctor)
+def doctor_saved(sender, instance, created, **kwargs):
+    if created:
+        stats.increment(stats.TOTAL_DOCTORS)
+
+
+@receiver(post_delete, sender=Doctor)
+def doctor_deleted(sender, instance, **kwargs):
+    stats.increment(stats.TOTAL_DOCTORS, -1)
+
+
+@receiver(post_init, sender=Appointment)
+def appointment_loaded(sender, instance, **kwargs):
+    # Read from __dict__ so deferred fields are not fetched one row at a time.
+    instance._stats_status = instance.__dict__.get('status')
+    instance._stats_date = instance.__dict__.get('appointment_date')
+
+
+@receiver(post_save, sender=Appointment)
+def appointment_saved(sender, instance, created, **kwargs):
+    new_day = stats.appointment_day(instance.appointment_date)
+    if created:
+        stats.increment(stats.TOTAL_APPOINTMENTS)
+        stats.increment(stats.status_key(instance.status))
+        stats.increment(stats.day_key(new_day))
+    else:
+        if instance._stats_status and instance._stats_status != instance.status:
+            stats.increment(stats.status_key(instance._stats_status), -1)
+            stats.increment(stats.status_key(instance.status))
+        if instance._stats_date:
+            old_day = stats.appointment_day(instance._stats_date)
+            if old_day != new_day:
+                stats.increment(stats.day_key(old_day), -1)
+                stats.increment(stats.day_key(new_day))
+    instance._stats_status = instance.status
+    instance._stats_date = instance.appointment_date
+
+
+@receiver(post_delete, sender=Appointment)
+def appointment_deleted(sender, instance, **kwargs):
+    stats.increment(stats.TOTAL_APPOINTMENTS, -1)
+    stats.increment(stats.status_key(instance.status), -1)
+    stats.increment(stats.day_key(stats.appointment_day(instance.appointment_date)), -1)
+
+
+@receiver(post_init, sender=Bed)
+def bed_loaded(sender, instance, **kwargs):
+    instance._stats_is_occupied = instance.__dict__.get('is_occupied')
+
+
+@receiver(post_save, sender=Bed)
+def bed_saved(sender, instance, created, **kwargs):
+    if created:
+        if not instance.is_occupied:
+            stats.increment(stats.BEDS_AVAILABLE)
+    elif instance._stats_is_occupied is not None and instance._stats_is_occupied != instance.is_occupied:
+        stats.increment(stats.BEDS_AVAILABLE, 1 if not instance.is_occupied else -1)
+    instance._stats_is_occupied = instance.is_occupied
+
+
+@receiver(post_delete, sender=Bed)
+def bed_deleted(sender, instance, **kwargs):
+    if not instance.is_occupied:
+        stats.increment(stats.BEDS_AVAILABLE, -1)
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+def appointment_changed_availability(sender, instance, **kwargs):
+    transaction.on_commit(lambda: availability.invalidate(instance.doctor_id))
+
+
+@receiver(post_save, sender=DoctorSchedule)
+@receiver(post_delete, sender=DoctorSchedule)
+@receiver(post_save, sender=DoctorLeave)
+@receiver(post_delete, sender=DoctorLeave)
+def doctor_calendar_changed(sender, instance, **kwargs):
+    doctor_user_id = Doctor.objects.filter(pk=instance.doctor_id).values_list('user_id', flat=True).first()
+    if doctor_user_id:
+        transaction.on_commit(lambda: availability.invalidate(doctor_user_id))
+
+
+@receiver(post_init, sender=Appointment)
+@receiver(post_init, sender=LabTest)
+@receiver(post_init, sender=BedTransfer)
+@receiver(post_init, sender=Bed)
+def timeline_owner_loaded(sender, instance, **kwargs):
+    owner_field = 'current_patient_id' if sender is Bed else 'patient_id'
+    instance._timeline_patient_id = instance.__dict__.get(owner_field)
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+@receiver(post_save, sender=LabTest)
+@receiver(post_delete, sender=LabTest)
+@receiver(post_save, sender=BedTransfer)
+@receiver(post_delete, sender=BedTransfer)
+@receiver(post_save, sender=Bed)
+@receiver(post_delete, sender=Bed)
+def patient_history_changed(sender, instance, **kwargs):
+    # Invalidate both the previous and the current owner when a row moves
+    # between patients (e.g. a bed is reassigned).
+    current = instance.current_patient_id if sender is Bed else instance.patient_id
+    patient_ids = (instance._timeline_patient_id, current)
+    instance._timeline_patient_id = current
+    if any(patient_ids):
+        transaction.on_commit(lambda: timeline.invalidate(*patient_ids))
+
+
+@receiver(post_init, sender=Appointment)
+def queue_entry_loaded(sender, instance, **kwargs):
+    instance._queue_key = queues.queue_key(instance)
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+def appointment_changed_queue(sender, instance, **kwargs):
+    entry = queues.entry(instance, deleted=kwargs['signal'] is post_delete)
+    instance._queue_key = queues.queue_key(instance)
+    transaction.on_commit(lambda: queues.board.apply([entry]))
+
+
+@receiver(post_save, sender=Bed)
+def bed_changed_broadcast(sender, instance, **kwargs):
+    event = bed_event(instance)
+    transaction.on_commit(lambda: bed_hub.publish(event))
+
+
+@receiver(post_delete, sender=Bed)
+def bed_deleted_broadcast(sender, instance, **kwargs):
+    event = bed_event(instance, 'bed_deleted')
+    transaction.on_commit(lambda: bed_hub.publish(event))
+
+
+@receiver(post_save, sender=BedTransfer)
+def bed_transfer_broadcast(sender, instance, created, **kwargs):
+    if created:
+        event = {
+            'type': 'transfer',
+            'id': instance.pk,
+            'patient': instance.patient_id,
+            'from_bed': instance.from_bed_id,
+            'to_bed': instance.to_bed_id,
+        }
+        transaction.on_commit(lambda: bed_hub.publish(event))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    invalidate_cached_user(instance.pk)
+    transaction.on_commit(lambda: invalidate_cached_user(instance.pk))
+
+
+# Models served by the role viewsets; their list ETags are built from these
+# table versions. Bulk writes that skip signals bump them explicitly.
+VERSIONED_MODELS = (Appointment, Bed, BedTransfer, Doctor, DoctorLeave, DoctorSchedule, LabTest, Patient, User, Ward)
+
+
+def table_changed(sender, **kwargs):
+    transaction.on_commit(lambda: bump_table_version(sender))
+
+
+for model in VERSIONED_MODELS:
+    post_save.connect(table_changed, sender=model)
+    post_delete.connect(table_changed, sender=model)
@@ -0,0 +1,116 @@
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from .models import Appointment, Bed, DashboardCounter, Doctor, Patient
+
+TOTAL_PATIENTS = 'total_patients'
+TOTAL_DOCTORS = 'total_doctors'
+TOTAL_APPOINTMENTS = 'total_appointments'
+BEDS_AVAILABLE = 'beds_available'
+STATUS_PREFIX = 'appointments_status:'
+DAY_PREFIX = 'appointments_day:'
+
+STATIC_KEYS = [TOTAL_PATIENTS, TOTAL_DOCTORS, TOTAL_APPOINTMENTS, BEDS_AVAILABLE] + [
+    f'{STATUS_PREFIX}{status}' for status in Appointment.AppointmentStatus.values
+]
+
+
+def status_key(status):
+    return f'{STATUS_PREFIX}{status}'
+
+
+def day_key(day):
+    return f'{DAY_PREFIX}{day.isoformat()}'
+
+
+def appointment_day(appointment_date):
+    return timezone.localtime(appointment_date).date()
+
+
+def _apply(key, delta):
+    # Missing rows are left alone; the next reconcile creates them with the
+    # real value.
+    DashboardCounter.objects.filter(key=key).update(value=F('value') + delta)
+
+
+def increment(key, delta=1):
+    # Applied after commit, in its own short transaction: the counter rows
+    # are shared by every booking, and updating them inside the caller's
+    # transaction would hold their row locks until it commits. A worker
+    # that dies in between loses the delta until the next reconcile.
+    if delta:
+        transaction.on_commit(lambda: _apply(key, delta))
+
+
+def _day_bounds(day):
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+def _sources(day):
+    # The rows each counter of ``day`` counts.
+    start, end = _day_bounds(day)
+    sources = {
+        TOTAL_PATIENTS: Patient.objects.all(),
+        TOTAL_DOCTORS: Doctor.objects.all(),
+        TOTAL_APPOINTMENTS: Appointment.objects.all(),
+        BEDS_AVAILABLE: Bed.objects.filter(is_occupied=False),
+        day_key(day): Appointment.objects.filter(appointment_date__gte=start, appointment_date__lt=end),
+    }
+    sources.update({
+        status_key(status): Appointment.objects.filter(status=status) for status in Appointment.AppointmentStatus.values
+    })
+    return sources
+
+
+def reconcile(day=None):
+    day = day or timezone.localdate()
+    values = {key: source.count() for key, source in _sources(day).items() if not key.startswith(STATUS_PREFIX)}
+    values.update({status_key(status): 0 for status in Appointment.AppointmentStatus.values})
+    for row in Appointment.objects.values('status').annotate(total=Count('id')):
+        values[status_key(row['status'])] = row['total']
+
+    now = timezone.now()
+    with transaction.atomic():
+        for key, value in values.items():
+            DashboardCounter.objects.update_or_create(key=key, defaults={'value': value, 'reconciled_at': now})
+        DashboardCounter.objects.filter(key__startswith=DAY_PREFIX, key__lt=day_key(day - timedelta(days=7))).delete()
+    return values
+
+
+def _seed(keys, day):
+    # Counts only the missing rows: after midnight that is just the new
+    # day's key, one indexed range count. A concurrent seed may win the
+    # insert; both counted the same committed rows.
+    sources = _sources(day)
+    values = {key: sources[key].count() for key in keys}
+    DashboardCounter.objects.bulk_create(
+        [DashboardCounter(key=key, value=value) for key, value in values.items()], ignore_conflicts=True
+    )
+    return values
+
+
+def get_dashboard_stats():
+    # Never recounts existing rows: drift from lost deltas is corrected by
+    # reconcile_dashboard_stats, run on a schedule or with --loop.
+    today = timezone.localdate()
+    today_key = day_key(today)
+    keys = STATIC_KEYS + [today_key]
+    values = dict(DashboardCounter.objects.filter(key__in=keys).values_list('key', 'value'))
+    missing = [key for key in keys if key not in values]
+    if missing:
+        values.update(_seed(missing, today))
+
+    return {
+        'total_patients': values[TOTAL_PATIENTS],
+        'total_doctors': values[TOTAL_DOCTORS],
+        'total_appointments': values[TOTAL_APPOINTMENTS],
+        'beds_available': values[BEDS_AVAILABLE],
+        'appointments_today': values[today_key],
+        'appointments_by_status': {
+            status: values[status_key(status)] for status in Appointment.AppointmentStatus.values
+        },
+    }
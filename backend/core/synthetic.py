@@ -0,0 +1,242 @@
+import random
+from datetime import date, datetime, time, timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db.models import Max
+from django.utils import timezone
+
+from . import stats
+from .availability import invalidate as invalidate_availability
+from .conditional import bump_table_version
+from .models import Appointment, Bed, BedTransfer, Doctor, DoctorLeave, DoctorSchedule, LabTest, Patient, Ward
+from .search import reindex_patients
+
+User = get_user_model()
+
+PASSWORD = 'benchmark-password'
+
+FIRST_NAMES = [
+    'Aarav', 'Aisha', 'Ananya', 'Arjun', 'Daniel', 'Divya', 'Elena', 'Farhan', 'Grace', 'Hannah',
+    'Ishaan', 'James', 'Kavya', 'Liam', 'Maria', 'Meera', 'Noah', 'Olivia', 'Priya', 'Rahul',
+    'Rohan', 'Sara', 'Sneha', 'Tariq', 'Uma', 'Vikram', 'Wei', 'Yusuf', 'Zara', 'Zoe',
+]
+LAST_NAMES = [
+    'Ahmed', 'Brown', 'Chen', 'Das', 'Fernandes', 'Garcia', 'Gupta', 'Iyer', 'Johnson', 'Khan',
+    'Kumar', 'Lee', 'Menon', 'Miller', 'Nair', 'Patel', 'Reddy', 'Rao', 'Singh', 'Smith',
+    'Thomas', 'Verma', 'Williams', 'Wilson', 'Zhang',
+]
+SPECIALIZATIONS = ['Cardiology', 'Dermatology', 'General Medicine', 'Neurology', 'Orthopedics', 'Pediatrics', 'Radiology', 'ENT']
+WARD_TYPES = ['General', 'ICU', 'Maternity', 'Pediatric', 'Surgical', 'Cardiac']
+LAB_TEST_NAMES = ['Complete Blood Count', 'Lipid Panel', 'HbA1c', 'Liver Function Test', 'Thyroid Panel', 'Urinalysis', 'Chest X-Ray', 'MRI Brain']
+REASONS = ['Follow-up', 'Fever', 'Chest pain', 'Routine check-up', 'Back pain', 'Headache', 'Skin rash', 'Consultation']
+BLOOD_GROUPS = ['A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-']
+SHIFTS = [(time(8), time(14)), (time(9), time(17)), (time(13), time(19))]
+WORKING_DAYS = [
+    DoctorSchedule.WeekDay.MONDAY,
+    DoctorSchedule.WeekDay.TUESDAY,
+    DoctorSchedule.WeekDay.WEDNESDAY,
+    DoctorSchedule.WeekDay.THURSDAY,
+    DoctorSchedule.WeekDay.FRIDAY,
+]
+
+
+def _insert(model, rows, batch_size, return_pks=True):
+    """bulk_create ``rows`` in batches and return the new primary keys in order.
+
+    MySQL does not return ids from bulk inserts, so they are read back by range.
+    """
+    last_pk = model.objects.aggregate(last=Max('pk'))['last'] or 0
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        model.objects.bulk_create(batch)
+    if not return_pks:
+        return None
+    return list(model.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True))
+
+
+def _aware(day, moment):
+    return timezone.make_aware(datetime.combine(day, moment))
+
+
+def generate_hospital(
+    doctors=50,
+    patients=5000,
+    appointments=20000,
+    wards=10,
+    beds_per_ward=20,
+    lab_tests=10000,
+    days=60,
+    seed=42,
+    batch_size=1000,
+    prefix='synthetic',
+):
+    """Load a reproducible synthetic hospital with bulk inserts.
+
+    Appointments and lab tests are spread over ``days`` days centred on today;
+    past appointments are settled, future ones are pending or approved.
+    Returns the number of rows created per model.
+    """
+    if User.objects.filter(username__startswith=f'{prefix}-').exists():
+        raise ValueError(f'Synthetic data with prefix "{prefix}" already exists')
+
+    rng = random.Random(seed)
+    today = timezone.localdate()
+    first_day = today - timedelta(days=days // 2)
+    slot = timedelta(minutes=settings.APPOINTMENT_SLOT_MINUTES)
+    password = make_password(PASSWORD)
+
+    admin = User.objects.create(username=f'{prefix}-admin', password=password, role=User.Roles.ADMIN)
+    User.objects.create(username=f'{prefix}-receptionist', password=password, role=User.Roles.RECEPTIONIST)
+
+    doctor_user_ids = _insert(User, (
+        User(
+            username=f'{prefix}-doctor-{index}',
+            password=password,
+            role=User.Roles.DOCTOR,
+            first_name=rng.choice(FIRST_NAMES),
+            last_name=rng.choice(LAST_NAMES),
+            email=f'{prefix}-doctor-{index}@example.com',
+        )
+        for index in range(doctors)
+    ), batch_size)
+    doctor_ids = _insert(Doctor, (
+        Doctor(
+            user_id=user_id,
+            specialization=rng.choice(SPECIALIZATIONS),
+            qualification='MBBS, MD',
+            phone=f'8{rng.randrange(10 ** 9):09d}',
+        )
+        for user_id in doctor_user_ids
+    ), batch_size)
+
+    shifts = {doctor_id: rng.choice(SHIFTS) for doctor_id in doctor_ids}
+    _insert(DoctorSchedule, (
+        DoctorSchedule(doctor_id=doctor_id, day=day, start_time=shifts[doctor_id][0], end_time=shifts[doctor_id][1])
+        for doctor_id in doctor_ids
+        for day in WORKING_DAYS
+    ), batch_size, return_pks=False)
+    leave_doctors = rng.sample(doctor_ids, k=len(doctor_ids) // 10)
+
+    def leave_rows():
+        for doctor_id in leave_doctors:
+            start_date = first_day + timedelta(days=rng.randrange(days))
+            yield DoctorLeave(
+                doctor_id=doctor_id,
+                start_date=start_date,
+                end_date=start_date + timedelta(days=rng.randrange(1, 4)),
+                reason='Annual leave',
+                status=DoctorLeave.LeaveStatus.APPROVED,
+            )
+
+    _insert(DoctorLeave, leave_rows(), batch_size, return_pks=False)
+
+    def patient_rows():
+        for index in range(patients):
+            first_name, last_name = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            yield Patient(
+                first_name=first_name,
+                last_name=last_name,
+                dob=date(1940, 1, 1) + timedelta(days=rng.randrange(365 * 80)),
+                gender=rng.choice(['male', 'female']),
+                phone=f'9{rng.randrange(10 ** 9):09d}',
+                email=f'{first_name}.{last_name}.{index}@example.com'.lower(),
+                address=f'{rng.randrange(1, 999)} Main Street',
+                blood_group=rng.choice(BLOOD_GROUPS),
+                created_by=admin,
+            )
+
+    patient_ids = _insert(Patient, patient_rows(), batch_size)
+    reindex_patients(start_after=patient_ids[0] - 1 if patient_ids else 0, batch_size=batch_size)
+
+    doctor_users = dict(zip(doctor_ids, doctor_user_ids))
+    tokens = {}
+
+    def appointment_rows():
+        for _ in range(appointments):
+            doctor_id = rng.choice(doctor_ids)
+            day = first_day + timedelta(days=rng.randrange(days))
+            start, end = shifts[doctor_id]
+            slots = int((_aware(day, end) - _aware(day, start)) / slot)
+            moment = _aware(day, start) + slot * rng.randrange(slots)
+            key = (doctor_id, day)
+            tokens[key] = tokens.get(key, 0) + 1
+            if day < today:
+                status = rng.choices(['completed', 'cancelled', 'rejected'], weights=[80, 15, 5])[0]
+            else:
+                status = rng.choices(['pending', 'approved'], weights=[40, 60])[0]
+            yield Appointment(
+                patient_id=rng.choice(patient_ids),
+                doctor_id=doctor_users[doctor_id],
+                appointment_date=moment,
+                reason=rng.choice(REASONS),
+                status=status,
+                token_number=tokens[key],
+                created_by=admin,
+            )
+
+    _insert(Appointment, appointment_rows(), batch_size, return_pks=False)
+
+    ward_ids = _insert(Ward, (
+        Ward(name=f'{WARD_TYPES[index % len(WARD_TYPES)]} Ward {index + 1}', ward_type=WARD_TYPES[index % len(WARD_TYPES)], total_beds=beds_per_ward)
+        for index in range(wards)
+    ), batch_size)
+    occupants = iter(rng.sample(patient_ids, k=min(len(patient_ids), wards * beds_per_ward)))
+
+    def bed_rows():
+        for ward_id in ward_ids:
+            for number in range(1, beds_per_ward + 1):
+                patient_id = next(occupants, None) if rng.random() < 0.7 else None
+                yield Bed(
+                    ward_id=ward_id,
+                    bed_number=f'B{number:03d}',
+                    is_icu=number <= max(1, beds_per_ward // 10),
+                    is_occupied=patient_id is not None,
+                    current_patient_id=patient_id,
+                )
+
+    bed_ids = _insert(Bed, bed_rows(), batch_size)
+    occupied = dict(Bed.objects.filter(pk__in=bed_ids, is_occupied=True).values_list('pk', 'current_patient_id'))
+    _insert(BedTransfer, (
+        BedTransfer(patient_id=patient_id, to_bed_id=bed_id, reason='Admission')
+        for bed_id, patient_id in occupied.items()
+    ), batch_size, return_pks=False)
+
+    def lab_test_rows():
+        for _ in range(lab_tests):
+            booked_at = _aware(first_day + timedelta(days=rng.randrange(days)), time(rng.randrange(7, 19), rng.choice([0, 15, 30, 45])))
+            past = booked_at.date() < today
+            yield LabTest(
+                patient_id=rng.choice(patient_ids),
+                doctor_id=rng.choice(doctor_ids) if rng.random() < 0.8 else None,
+                test_name=rng.choice(LAB_TEST_NAMES),
+                booked_at=booked_at,
+                result_summary='Within normal limits' if past else '',
+                status=LabTest.LabStatus.COMPLETED if past else rng.choice([LabTest.LabStatus.BOOKED, LabTest.LabStatus.IN_PROGRESS]),
+            )
+
+    _insert(LabTest, lab_test_rows(), batch_size, return_pks=False)
+
+    # bulk_create skips the signals that maintain these.
+    stats.reconcile()
+    bump_table_version(User, Doctor, DoctorSchedule, DoctorLeave, Patient, Appointment, Ward, Bed, BedTransfer, LabTest)
+    for user_id in doctor_user_ids:
+        invalidate_availability(user_id)
+
+    return {
+        'users': len(doctor_user_ids) + 2,
+        'doctors': len(doctor_ids),
+        'doctor_schedules': len(doctor_ids) * len(WORKING_DAYS),
+        'doctor_leaves': len(leave_doctors),
+        'patients': len(patient_ids),
+        'appointments': appointments,
+        'wards': len(ward_ids),
+        'beds': len(bed_ids),
+        'bed_transfers': len(occupied),
+        'lab_tests': lab_tests,
+    }
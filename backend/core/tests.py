@@ -0,0 +1,1240 @@
+import asyncio
+import csv
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import date, datetime, time as clock, timedelta
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, connections, transaction
+from django.db.utils import load_backend
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import authentication, checks, exporters, metrics, queues, search, stats
+from .queues import board as queue_board
+from .authentication import CachedJWTAuthentication
+from .availability import get_availability
+from .conditional import bump_table_version
+from .lab_reports import attach_report, prune_blobs
+from .models import (
+    Appointment, Bed, BedTransfer, DashboardCounter, Doctor, DoctorLeave, DoctorSchedule, LabReportBlob, LabTest, NotificationOutbox, Patient, User, Ward,
+)
+from .realtime import Hub, bed_hub
+from .views import AppointmentViewSet
+
+
+class HospitalFixtures:
+    def create_fixtures(self):
+        self.admin = User.objects.create_user('admin', password='x', role=User.Roles.ADMIN)
+        self.receptionist = User.objects.create_user('reception', password='x', role=User.Roles.RECEPTIONIST)
+        self.doctor_user = User.objects.create_user('doctor', password='x', role=User.Roles.DOCTOR, first_name='Greg', last_name='House')
+        self.doctor = Doctor.objects.create(user=self.doctor_user, specialization='General Medicine', phone='1000000000')
+        self.patient = Patient.objects.create(
+            first_name='Ann', last_name='Lee', dob=date(1990, 1, 1), gender='female', phone='5550001234', address='1 Main Street'
+        )
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def book(self, client, appointment_date=None, doctor_user=None):
+        appointment_date = appointment_date or timezone.now() + timedelta(days=1)
+        return client.post('/api/appointments/', {
+            'patient_id': self.patient.pk,
+            'doctor_user_id': (doctor_user or self.doctor_user).pk,
+            'appointment_date': appointment_date.isoformat(),
+        }, format='json')
+
+
+def run_concurrently(workers, target):
+    """Run ``target(index)`` on ``workers`` threads released together.
+
+    Returns the results in worker order and the elapsed seconds; the first
+    exception raised by a worker is re-raised.
+    """
+    barrier = threading.Barrier(workers)
+    results, errors = [None] * workers, []
+
+    def run(index):
+        try:
+            barrier.wait()
+            results[index] = target(index)
+        except Exception as exc:  # noqa: BLE001 - reported below
+            errors.append(exc)
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(workers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    if errors:
+        raise errors[0]
+    return results, elapsed
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentTokenAllocationTests(HospitalFixtures, TransactionTestCase):
+    workers = 8
+    bookings_per_worker = 5
+
+    def setUp(self):
+        self.create_fixtures()
+
+    def test_concurrent_first_bookings_get_unique_tokens(self):
+        # Every worker books the same doctor-day, which has no counter row
+        # yet, so the first bookings also race to create it.
+        appointment_date = timezone.make_aware(datetime.combine(timezone.localdate() + timedelta(days=1), clock(10)))
+
+        def book(index):
+            client = self.client_for(self.receptionist)
+            return [self.book(client, appointment_date).status_code for _ in range(self.bookings_per_worker)]
+
+        results, elapsed = run_concurrently(self.workers, book)
+
+        total = self.workers * self.bookings_per_worker
+        statuses = [status for worker in results for status in worker]
+        self.assertEqual(statuses, [201] * total)
+        tokens = sorted(Appointment.objects.filter(doctor=self.doctor_user).values_list('token_number', flat=True))
+        self.assertEqual(tokens, list(range(1, total + 1)), f'{total / elapsed:.1f} bookings/s')
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentBedAllocationTests(HospitalFixtures, TransactionTestCase):
+    workers = 8
+
+    def setUp(self):
+        self.create_fixtures()
+        self.ward = Ward.objects.create(name='Surge', ward_type='ICU', total_beds=6)
+        self.beds = [Bed.objects.create(ward=self.ward, bed_number=f'B{index}') for index in range(6)]
+        self.patients = [
+            Patient.objects.create(
+                first_name=f'Patient{index}', last_name='Surge', dob=date(1980, 1, 1), gender='female', phone=f'555000{index:04d}', address='a'
+            )
+            for index in range(self.workers * 2)
+        ]
+
+    def assertNoDoubleOccupancy(self):
+        occupied = Bed.objects.filter(is_occupied=True)
+        occupants = list(occupied.values_list('current_patient_id', flat=True))
+        self.assertEqual(len(occupants), len(set(occupants)))
+        # Every occupied bed was filled by exactly one transfer.
+        self.assertEqual(BedTransfer.objects.count(), occupied.count())
+        self.assertEqual(BedTransfer.objects.values('to_bed').distinct().count(), occupied.count())
+
+    def test_concurrent_transfers_into_one_bed(self):
+        target = self.beds[0]
+
+        def transfer(index):
+            client = self.client_for(self.receptionist)
+            return client.post('/api/bed-transfers/', {'patient': self.patients[index].pk, 'to_bed': target.pk}, format='json').status_code
+
+        statuses, _ = run_concurrently(self.workers, transfer)
+
+        self.assertEqual(sorted(statuses), [201] + [400] * (self.workers - 1))
+        self.assertNoDoubleOccupancy()
+
+    def test_concurrent_surge_allocations(self):
+        # Eight requests for two beds each compete for six free beds.
+        def allocate(index):
+            client = self.client_for(self.receptionist)
+            patients = [self.patients[index * 2].pk, self.patients[index * 2 + 1].pk]
+            return client.post('/api/beds/allocate/', {'ward': self.ward.pk, 'patients': patients}, format='json').status_code
+
+        statuses, _ = run_concurrently(self.workers, allocate)
+
+        self.assertEqual(statuses.count(201), 3)
+        self.assertEqual(statuses.count(400), self.workers - 3)
+        self.assertEqual(Bed.objects.filter(is_occupied=True).count(), 6)
+        self.assertNoDoubleOccupancy()
+
+    def test_concurrent_allocations_of_one_patient(self):
+        def allocate(index):
+            client = self.client_for(self.receptionist)
+            return client.post('/api/beds/allocate/', {'ward': self.ward.pk, 'patients': [self.patient.pk]}, format='json').status_code
+
+        statuses, _ = run_concurrently(self.workers, allocate)
+
+        self.assertEqual(sorted(statuses), [201] + [400] * (self.workers - 1))
+        self.assertEqual(Bed.objects.filter(current_patient=self.patient).count(), 1)
+        self.assertNoDoubleOccupancy()
+
+
+class BedAllocationTests(HospitalFixtures, TestCase):
+    def setUp(self):
+        self.create_fixtures()
+        self.ward = Ward.objects.create(name='Surge', ward_type='ICU', total_beds=3)
+        self.beds = [Bed.objects.create(ward=self.ward, bed_number=f'B{index}') for index in range(3)]
+        self.other = Patient.objects.create(
+            first_name='Bo', last_name='Chen', dob=date(1975, 5, 5), gender='male', phone='5550009999', address='a'
+        )
+
+    def allocate(self, *patients):
+        client = self.client_for(self.receptionist)
+        return client.post('/api/beds/allocate/', {'ward': self.ward.pk, 'patients': [p.pk for p in patients]}, format='json')
+
+    def test_patient_with_a_bed_is_rejected(self):
+        self.assertEqual(self.allocate(self.patient).status_code, 201)
+
+        response = self.allocate(self.other, self.patient)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(str(self.patient.pk), response.data['patients'])
+        # Nothing from the rejected request is kept.
+        self.assertEqual(Bed.objects.filter(is_occupied=True).count(), 1)
+        self.assertFalse(Bed.objects.filter(current_patient=self.other).exists())
+
+
+class NotificationOutboxTests(HospitalFixtures, TestCase):
+    def setUp(self):
+        self.create_fixtures()
+        self.patient.email = 'ann@example.com'
+        self.patient.save()
+
+    def test_booking_queues_notifications_without_sending(self):
+        response = self.book(self.client_for(self.receptionist))
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(
+            sorted(NotificationOutbox.objects.values_list('channel', flat=True)),
+            [NotificationOutbox.Channel.EMAIL, NotificationOutbox.Channel.SMS],
+        )
+
+    def test_worker_delivers_queued_notifications(self):
+        self.book(self.client_for(self.receptionist))
+
+        call_command('send_notifications', '--once', stdout=mock.Mock())
+
+        self.assertEqual([message.to for message in mail.outbox], [['ann@example.com']])
+        self.assertFalse(NotificationOutbox.objects.exclude(status=NotificationOutbox.DeliveryStatus.SENT).exists())
+
+    def test_failed_delivery_is_retried_with_backoff(self):
+        self.book(self.client_for(self.receptionist))
+
+        with mock.patch('core.notifications.send_mock_sms', side_effect=RuntimeError('gateway down')):
+            call_command('send_notifications', '--once', '--backoff', '60', stdout=mock.Mock())
+
+        sms = NotificationOutbox.objects.get(channel=NotificationOutbox.Channel.SMS)
+        self.assertEqual((sms.status, sms.attempts, sms.last_error), (NotificationOutbox.DeliveryStatus.PENDING, 1, 'gateway down'))
+        self.assertGreater(sms.next_attempt_at, timezone.now() + timedelta(seconds=50))
+
+
+def index_name(model, *fields):
+    return next(index.name for index in model._meta.indexes if tuple(index.fields) == fields)
+
+
+@skipUnlessDBFeature('supports_explaining_query_execution')
+class HotQueryIndexTests(HospitalFixtures, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_fixtures(cls)
+        start = timezone.now()
+        statuses = list(Appointment.AppointmentStatus.values)
+        Appointment.objects.bulk_create(
+            Appointment(
+                patient=cls.patient,
+                doctor=cls.doctor_user,
+                appointment_date=start + timedelta(minutes=15 * index),
+                status=statuses[index % len(statuses)],
+                token_number=index + 1,
+            )
+            for index in range(2000)
+        )
+        LabTest.objects.bulk_create(
+            LabTest(patient=cls.patient, test_name='CBC', booked_at=start + timedelta(hours=index))
+            for index in range(500)
+        )
+        wards = [Ward.objects.create(name=f'Ward {index}', ward_type='General', total_beds=25) for index in range(20)]
+        cls.ward = wards[0]
+        Bed.objects.bulk_create(
+            Bed(ward=ward, bed_number=f'B{index:03d}', is_occupied=index % 3 == 0)
+            for ward in wards
+            for index in range(25)
+        )
+        # Refresh planner statistics so the plans reflect the seeded rows.
+        analyze = 'ANALYZE TABLE' if connection.vendor == 'mysql' else 'ANALYZE'
+        with connection.cursor() as cursor:
+            for model in (Appointment, LabTest, Bed):
+                cursor.execute(f'{analyze} {connection.ops.quote_name(model._meta.db_table)}')
+
+    def assertUsesIndex(self, queryset, name):
+        plan = queryset.explain()
+        self.assertIn(name, plan, plan)
+
+    def test_appointment_list_orders_by_date_index(self):
+        self.assertUsesIndex(Appointment.objects.order_by('appointment_date')[:20], index_name(Appointment, 'appointment_date'))
+
+    def test_status_filtered_appointment_list(self):
+        self.assertUsesIndex(
+            Appointment.objects.filter(status=Appointment.AppointmentStatus.PENDING).order_by('appointment_date')[:20],
+            index_name(Appointment, 'status', 'appointment_date'),
+        )
+
+    def test_doctor_appointment_list(self):
+        self.assertUsesIndex(
+            Appointment.objects.filter(doctor=self.doctor_user, status=Appointment.AppointmentStatus.APPROVED).order_by('appointment_date')[:20],
+            index_name(Appointment, 'doctor', 'status', 'appointment_date'),
+        )
+
+    def test_ward_bed_availability(self):
+        self.assertUsesIndex(Bed.objects.filter(ward=self.ward, is_occupied=False), index_name(Bed, 'ward', 'is_occupied'))
+
+    def test_patient_lab_history(self):
+        self.assertUsesIndex(
+            LabTest.objects.filter(patient=self.patient).order_by('-booked_at')[:20],
+            index_name(LabTest, 'patient', 'booked_at'),
+        )
+
+
+class WardListQueryTests(HospitalFixtures, TestCase):
+    def setUp(self):
+        self.create_fixtures()
+        self.client = self.client_for(self.admin)
+
+    def add_ward(self, index, beds=4):
+        ward = Ward.objects.create(name=f'Ward {index}', ward_type='General', total_beds=beds)
+        Bed.objects.bulk_create(
+            Bed(ward=ward, bed_number=f'B{bed}', is_icu=bed == 0, is_occupied=bed % 2 == 1)
+            for bed in range(beds)
+        )
+        return ward
+
+    def test_ward_list_query_count_does_not_grow_with_wards(self):
+        self.add_ward(0)
+        with CaptureQueriesContext(connection) as baseline:
+            self.client.get('/api/wards/')
+
+        for index in range(1, 15):
+            self.add_ward(index)
+        with self.assertNumQueries(len(baseline)):
+            response = self.client.get('/api/wards/')
+
+        self.assertEqual(response.data['count'], 15)
+        self.assertEqual(
+            {key: response.data['results'][0][key] for key in ('available_beds', 'occupied_beds', 'icu_available_beds')},
+            {'available_beds': 2, 'occupied_beds': 2, 'icu_available_beds': 1},
+        )
+
+
+class DashboardCounterTests(HospitalFixtures, TestCase):
+    def setUp(self):
+        self.create_fixtures()
+        stats.reconcile()
+
+    def counter(self, key):
+        return DashboardCounter.objects.get(key=key).value
+
+    def test_counters_are_updated_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.book(self.client_for(self.receptionist))
+                # The shared counter rows are not locked by the booking.
+                self.assertEqual(self.counter(stats.TOTAL_APPOINTMENTS), 0)
+
+        self.assertEqual(self.counter(stats.TOTAL_APPOINTMENTS), 1)
+        self.assertEqual(self.counter(stats.status_key(Appointment.AppointmentStatus.PENDING)), 1)
+
+    def test_rolled_back_changes_do_not_move_counters(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                Patient.objects.create(first_name='Bo', last_name='Kim', dob=date(1980, 1, 1), gender='male', phone='1', address='a')
+                transaction.set_rollback(True)
+
+        self.assertEqual(self.counter(stats.TOTAL_PATIENTS), 1)
+
+    def test_stale_counters_are_served_without_recounting(self):
+        DashboardCounter.objects.update(reconciled_at=timezone.now() - timedelta(days=1))
+        with self.assertNumQueries(1):
+            data = stats.get_dashboard_stats()
+        self.assertEqual((data['total_patients'], data['total_doctors']), (1, 1))
+
+    def test_new_day_counter_is_seeded_alone(self):
+        DashboardCounter.objects.filter(key=stats.day_key(timezone.localdate())).delete()
+        Appointment.objects.create(patient=self.patient, doctor=self.doctor_user, appointment_date=timezone.now())
+        with self.assertNumQueries(3):
+            self.assertEqual(stats.get_dashboard_stats()['appointments_today'], 1)
+        self.assertEqual(self.counter(stats.day_key(timezone.localdate())), 1)
+
+
+class PatientSearchTests(HospitalFixtures, TestCase):
+    def setUp(self):
+        self.create_fixtures()
+        self.client = self.client_for(self.receptionist)
+
+    def test_limit_is_clamped(self):
+        for limit in ('-5', '0'):
+            response = self.client.get('/api/patients/search/', {'q': 'Ann', 'limit': limit})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual([row['id'] for row in response.data['results']], [self.patient.pk])
+
+    def test_long_email_fits_token_column(self):
+        email = f"{'a' * 64}@{'b' * 185}.com"
+        self.patient.email = email
+        self.patient.save()
+
+        tokens = self.patient.search_tokens.values_list('token', flat=True)
+        self.assertLessEqual(max(len(token) for token in tokens), 255)
+        response = self.client.get('/api/patients/search/', {'q': email})
+        self.assertEqual([row['id'] for row in response.data['results']], [self.patient.pk])
+
+    def add_patients(self, *names):
+        return [
+            Patient.objects.create(first_name=first, last_name=last, dob=date(1990, 1, 1), gender='female', phone=f'555000{index:04d}', address='')
+            for index, (first, last) in enumerate(name.split() for name in names)
+        ]
+
+    def test_scan_is_cut_but_rare_terms_still_match(self):
+        # Ann Lee (the fixture) plus four more Anns; Zed is the newest row.
+        *_, zed = self.add_patients('Ann Moss', 'Ann Park', 'Ann Ray', 'Annie Stone', 'Ann Zed')
+        with mock.patch.object(search, 'SCAN_LIMIT', 2):
+            with self.assertNumQueries(2):
+                self.assertEqual([patient.pk for patient in search.search_patients('ann', limit=2)], [self.patient.pk, self.patient.pk + 1])
+            self.assertEqual([patient.pk for patient in search.search_patients('ann zed')], [zed.pk])
+
+    def test_exact_matches_rank_before_prefix_matches(self):
+        leeann, = self.add_patients('Leeann Cho')
+        self.assertEqual([patient.pk for patient in search.search_patients('lee')], [self.patient.pk, leeann.pk])
+        self.assertEqual([patient.pk for patient in search.search_patients('lee cho')], [leeann.pk])
+
+
+class PatientImportTests(HospitalFixtures, TestCase):
+    csv_data = b'first_name,last_name,dob,gender,phone,address\nBo,Kim,1980-01-01,male,5550009999,2 Side Street\n'
+
+    def setUp(self):
+        self.create_fixtures()
+
+    def test_endpoint_rejects_invalid_batch_size(self):
+        client = self.client_for(self.admin)
+        for batch_size in ('0', '-1', '100000'):
+            upload = SimpleUploadedFile('patients.csv', self.csv_data, content_type='text/csv')
+            response = client.post('/api/patients/import/', {'file': upload, 'batch_size': batch_size})
+            self.assertEqual(response.status_code, 400, batch_size)
+        self.assertFalse(Patient.objects.filter(last_name='Kim').exists())
+
+    def test_command_rejects_invalid_batch_size(self):
+        for batch_size in ('0', '-1'):
+            with self.assertRaisesMessage(CommandError, '--batch-size must be between'):
+                call_command('import_patients', 'patients.csv', '--batch-size', batch_size)
+
+
+class CachedJWTAuthenticationTests(HospitalFixtures, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.create_fixtures()
+        self.authenticator = CachedJWTAuthentication()
+
+    def authenticate(self, token):
+        request = RequestFactory().get('/api/patients/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        return self.authenticator.authenticate(request)[0]
+
+    def save(self, user):
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save()
+
+    def test_cached_user_needs_no_queries(self):
+        token = AccessToken.for_user(self.receptionist)
+        self.authenticate(token)
+        with self.assertNumQueries(0):
+            user = self.authenticate(token)
+        self.assertEqual((user.pk, user.role), (self.receptionist.pk, User.Roles.RECEPTIONIST))
+
+    def test_role_change_applies_to_the_next_request(self):
+        self.book(self.client_for(self.receptionist))
+        token = AccessToken.for_user(self.receptionist)
+        response = self.client.get('/api/appointments/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(response.data['count'], 1)
+        self.receptionist.role = User.Roles.DOCTOR
+        self.save(self.receptionist)
+
+        self.assertEqual(self.authenticate(token).role, User.Roles.DOCTOR)
+        # Doctors only see their own appointments, even when revalidating.
+        response = self.client.get('/api/appointments/', HTTP_AUTHORIZATION=f'Bearer {token}', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual((response.status_code, response.data['count']), (200, 0))
+
+    def test_deactivation_applies_to_the_next_request(self):
+        token = AccessToken.for_user(self.receptionist)
+        self.authenticate(token)
+        self.receptionist.is_active = False
+        self.save(self.receptionist)
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+
+    def test_revoked_token_is_rejected_from_cache(self):
+        with mock.patch.object(authentication.api_settings, 'CHECK_REVOKE_TOKEN', True):
+            revoked = AccessToken.for_user(self.receptionist)
+            self.authenticate(revoked)
+            self.receptionist.set_password('new password')
+            self.save(self.receptionist)
+            current = AccessToken.for_user(self.receptionist)
+            self.authenticate(current)
+
+            with self.assertNumQueries(0), self.assertRaisesMessage(AuthenticationFailed, 'password has been changed'):
+                self.authenticate(revoked)
+
+
+class AvailabilityCacheTests(HospitalFixtures, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.create_fixtures()
+        self.day = timezone.localdate() + timedelta(days=1)
+        DoctorSchedule.objects.create(
+            doctor=self.doctor, day=DoctorSchedule.WeekDay.values[self.day.weekday()], start_time=clock(9), end_time=clock(10)
+        )
+
+    def free_slots(self):
+        return get_availability([(self.doctor.pk, self.doctor_user.pk)], self.day, self.day)[self.doctor_user.pk][self.day.isoformat()]
+
+    def test_evicted_version_does_not_resurrect_stale_slots(self):
+        self.assertEqual(len(self.free_slots()), 4)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book(self.client_for(self.receptionist), timezone.make_aware(datetime.combine(self.day, clock(9))))
+        self.assertEqual(len(self.free_slots()), 3)
+
+        cache.delete(f'availability:version:{self.doctor_user.pk}')
+
+        self.assertEqual(len(self.free_slots()), 3)
+
+
+class AppointmentTransitionTests(HospitalFixtures, TestCase):
+    def setUp(self):
+        self.create_fixtures()
+        self.appointment_id = self.book(self.client_for(self.receptionist)).data['id']
+        self.client = self.client_for(self.doctor_user)
+
+    def post(self, action):
+        return self.client.post(f'/api/appointments/{self.appointment_id}/{action}/')
+
+    def test_single_transitions_follow_allowed_transitions(self):
+        self.assertEqual(self.post('complete').status_code, 400)
+        self.assertEqual(self.post('approve').status_code, 200)
+        self.assertEqual(self.post('complete').status_code, 200)
+
+        response = self.post('cancel')
+        self.assertEqual((response.status_code, response.data['detail']), (400, 'Cannot change completed to cancelled'))
+        self.assertEqual(self.post('approve').status_code, 400)
+        self.assertEqual(Appointment.objects.get(pk=self.appointment_id).status, Appointment.AppointmentStatus.COMPLETED)
+
+    def test_transition_checks_the_locked_row(self):
+        # Another request cancels between get_object() and the update.
+        get_object = AppointmentViewSet.get_object
+
+        def stale_get_object(view):
+            instance = get_object(view)
+            Appointment.objects.filter(pk=instance.pk).update(status=Appointment.AppointmentStatus.CANCELLED)
+            return instance
+
+        with mock.patch.object(AppointmentViewSet, 'get_object', stale_get_object), CaptureQueriesContext(connection) as queries:
+            response = self.post('approve')
+
+        self.assertEqual((response.status_code, response.data['detail']), (400, 'Cannot change cancelled to approved'))
+        self.assertEqual(Appointment.objects.get(pk=self.appointment_id).status, Appointment.AppointmentStatus.CANCELLED)
+        if connection.features.has_select_for_update:
+            self.assertTrue(any('FOR UPDATE' in query['sql'] for query in queries.captured_queries))
+
+
+class PolicyMatrixTests(HospitalFixtures, TestCase):
+    """Role x action matrix of the pre-policy permission classes."""
+
+    def setUp(self):
+        self.create_fixtures()
+        self.other_doctor_user = User.objects.create_user('other', password='x', role=User.Roles.DOCTOR)
+        Doctor.objects.create(user=self.other_doctor_user, specialization='Cardiology', phone='1000000001')
+        self.roles = {
+            'admin': self.admin,
+            'receptionist': self.receptionist,
+            'doctor': self.doctor_user,
+            'other_doctor': self.other_doctor_user,
+        }
+        ward = Ward.objects.create(name='General', ward_type='general', total_beds=1)
+        bed = Bed.objects.create(ward=ward, bed_number='G1')
+        self.appointment = Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor_user, appointment_date=timezone.now() + timedelta(days=1), token_number=1
+        )
+        self.objects = {
+            'patients': self.patient,
+            'doctors': self.doctor,
+            'doctor-schedules': DoctorSchedule.objects.create(doctor=self.doctor, day='monday', start_time=clock(9), end_time=clock(17)),
+            'doctor-leaves': DoctorLeave.objects.create(doctor=self.doctor, start_date=date(2030, 1, 1), end_date=date(2030, 1, 2)),
+            'appointments': self.appointment,
+            'lab-tests': LabTest.objects.create(patient=self.patient, doctor=self.doctor, test_name='CBC', booked_at=timezone.now()),
+            'wards': ward,
+            'beds': bed,
+            'bed-transfers': BedTransfer.objects.create(patient=self.patient, to_bed=bed),
+        }
+
+    def matrix(self):
+        staff = {'admin', 'receptionist', 'doctor', 'other_doctor'}
+        writers = {
+            'patients': staff,
+            'doctors': {'admin'},
+            'doctor-schedules': {'admin', 'doctor', 'other_doctor'},
+            'doctor-leaves': {'admin', 'doctor', 'other_doctor'},
+            'appointments': {'admin', 'receptionist'},
+            'lab-tests': staff,
+            'wards': {'admin', 'receptionist'},
+            'beds': {'admin', 'receptionist'},
+            'bed-transfers': {'admin', 'receptionist'},
+        }
+        # (method, path, roles allowed, roles answered 404 because the row is out of scope)
+        cases = []
+        for resource, roles in writers.items():
+            detail = f'/api/{resource}/{self.objects[resource].pk}/'
+            hidden = {'other_doctor'} if resource == 'appointments' else set()
+            cases += [
+                ('get', f'/api/{resource}/', staff, set()),
+                ('get', detail, staff - hidden, hidden),
+                ('post', f'/api/{resource}/', roles, set()),
+                ('patch', detail, roles, set()),
+                ('delete', detail, roles, set()),
+            ]
+        appointment = f'/api/appointments/{self.appointment.pk}'
+        cases += [
+            ('post', '/api/patients/import/', {'admin'}, set()),
+            ('post', f'{appointment}/approve/', {'admin', 'doctor'}, {'other_doctor'}),
+            ('post', f'{appointment}/reject/', {'admin', 'doctor'}, {'other_doctor'}),
+            ('post', f'{appointment}/cancel/', {'admin', 'doctor'}, {'other_doctor'}),
+            ('post', f'{appointment}/complete/', {'admin', 'doctor'}, {'other_doctor'}),
+            ('get', f'{appointment}/patient-detail/', {'admin', 'doctor'}, {'other_doctor'}),
+            # Receptionists used to get a per-id 403 for every row; now the whole call is denied.
+            ('post', '/api/appointments/bulk-status/', {'admin', 'doctor', 'other_doctor'}, set()),
+            ('post', '/api/beds/allocate/', {'admin', 'receptionist'}, set()),
+        ]
+        return cases
+
+    def test_role_action_matrix(self):
+        appointment = f'/api/appointments/{self.appointment.pk}'
+        drf_default = 'You do not have permission to perform this action.'
+        messages = {
+            ('post', '/api/appointments/'): 'Only admin/receptionist can create appointments',
+            ('patch', f'{appointment}/'): 'Doctors cannot edit appointment payload directly',
+            ('delete', f'{appointment}/'): 'Doctors cannot delete appointments',
+            ('post', '/api/patients/import/'): drf_default,
+            ('post', '/api/appointments/bulk-status/'): drf_default,
+            ('get', f'{appointment}/patient-detail/'): drf_default,
+            **{('post', f'{appointment}/{action}/'): drf_default for action in ('approve', 'reject', 'cancel', 'complete')},
+        }
+        for method, path, allowed, hidden in self.matrix():
+            for role, user in self.roles.items():
+                with self.subTest(role=role, method=method, path=path):
+                    client = self.client_for(user)
+                    if role in allowed or role in hidden:
+                        with transaction.atomic():
+                            response = getattr(client, method)(path, {}, format='json')
+                            transaction.set_rollback(True)
+                        if role in hidden:
+                            self.assertEqual(response.status_code, 404)
+                        else:
+                            self.assertNotIn(response.status_code, (403, 404))
+                        continue
+                    # Denied before the row or the payload is looked at.
+                    with self.assertNumQueries(0):
+                        response = getattr(client, method)(path, {}, format='json')
+                    self.assertEqual(response.status_code, 403)
+                    self.assertEqual(response.data['detail'], messages.get((method, path), 'Insufficient role permissions'))
+
+
+class AppointmentETagTests(HospitalFixtures, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.create_fixtures()
+        self.appointment_id = self.book(self.client_for(self.receptionist)).data['id']
+        self.client = self.client_for(self.receptionist)
+
+    def assertRenameChangesETag(self, path, rename):
+        etag = self.client.get(path)['ETag']
+        self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            rename()
+        response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def rename_patient(self):
+        self.patient.first_name = 'Anna'
+        self.patient.save()
+
+    def rename_doctor(self):
+        self.doctor_user.last_name = 'Wilson'
+        self.doctor_user.save()
+
+    def test_patient_rename_changes_list_and_detail_etags(self):
+        response = self.assertRenameChangesETag('/api/appointments/', self.rename_patient)
+        self.assertEqual(response.data['results'][0]['patient_name'], 'Anna Lee')
+        self.patient.first_name = 'Ann'
+        response = self.assertRenameChangesETag(f'/api/appointments/{self.appointment_id}/', self.rename_patient)
+        self.assertEqual(response.data['patient_name'], 'Anna Lee')
+
+    def test_doctor_rename_changes_list_and_detail_etags(self):
+        response = self.assertRenameChangesETag('/api/appointments/', self.rename_doctor)
+        self.assertEqual(response.data['results'][0]['doctor_name'], 'Greg Wilson')
+        self.doctor_user.last_name = 'House'
+        self.assertRenameChangesETag(f'/api/appointments/{self.appointment_id}/', self.rename_doctor)
+        self.doctor_user.last_name = 'House'
+        self.assertRenameChangesETag('/api/doctors/', self.rename_doctor)
+
+    def test_conditional_list_reads_no_rows(self):
+        etag = self.client.get('/api/appointments/')['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/appointments/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_bulk_writes_change_list_etags(self):
+        appointments = self.client.get('/api/appointments/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client_for(self.admin).post(
+                '/api/appointments/bulk-status/', {'ids': [self.appointment_id], 'status': 'approved'}, format='json'
+            )
+        self.assertEqual(response.data['updated'], 1)
+        self.assertEqual(self.client.get('/api/appointments/', HTTP_IF_NONE_MATCH=appointments).status_code, 200)
+
+        ward = Ward.objects.create(name='Surge', ward_type='ICU', total_beds=1)
+        Bed.objects.create(ward=ward, bed_number='B1')
+        wards = self.client.get('/api/wards/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/beds/allocate/', {'ward': ward.pk, 'patients': [self.patient.pk]}, format='json')
+        response = self.client.get('/api/wards/', HTTP_IF_NONE_MATCH=wards)
+        self.assertEqual((response.status_code, response.data['results'][0]['occupied_beds']), (200, 1))
+
+    def test_deleted_row_changes_list_etag(self):
+        etag = self.client.get('/api/appointments/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Appointment.objects.filter(pk=self.appointment_id).delete()
+        response = self.client.get('/api/appointments/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, response.data['results']), (200, []))
+
+
+@override_settings(DATABASE_REPLICAS=['lagging_replica'])
+class ReplicaRoutingTests(HospitalFixtures, TestCase):
+    # GET requests read from a second, in-memory SQLite database that never
+    # sees the appointment, standing in for a lagging replica.
+    replica = 'lagging_replica'
+
+    def setUp(self):
+        cache.clear()
+        queue_board.reset()
+        settings_dict = {
+            **connections['default'].settings_dict, 'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:', 'OPTIONS': {},
+        }
+        connections[self.replica] = load_backend(settings_dict['ENGINE']).DatabaseWrapper(settings_dict, self.replica)
+        self.addCleanup(connections.__delitem__, self.replica)
+        with connections[self.replica].schema_editor() as editor:
+            for model in apps.get_models():
+                editor.create_model(model)
+
+        self.create_fixtures()
+        self.day = timezone.localdate()
+        for instance in (self.receptionist, self.doctor_user, self.doctor, self.patient):
+            instance.save(using=self.replica)
+        self.appointment = Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor_user, status=Appointment.AppointmentStatus.APPROVED,
+            appointment_date=timezone.make_aware(datetime.combine(self.day, clock(0))),
+        )
+        self.client = self.client_for(self.receptionist)
+
+    def test_replica_serves_plain_reads(self):
+        self.assertEqual(self.client.get('/api/appointments/').data['count'], 0)
+
+    def test_lists_changed_within_the_lag_window_come_from_the_primary(self):
+        # A new list ETag must not be paired with rows the replica lacks.
+        bump_table_version(Appointment)
+        self.assertEqual(self.client.get('/api/appointments/').data['count'], 1)
+
+    def test_availability_is_computed_from_the_primary(self):
+        day = self.day + timedelta(days=1)
+        DoctorSchedule.objects.create(
+            doctor=self.doctor, day=DoctorSchedule.WeekDay.values[day.weekday()], start_time=clock(9), end_time=clock(10)
+        )
+        Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor_user, appointment_date=timezone.make_aware(datetime.combine(day, clock(9)))
+        )
+        slots = self.client.get(f'/api/doctors/availability/?start={day}&end={day}').data['results'][0]['slots']
+        self.assertEqual(len(slots[day.isoformat()]), 3)
+
+    def test_timeline_is_built_from_the_primary(self):
+        events = self.client.get(f'/api/patients/{self.patient.pk}/timeline/').data['results']
+        self.assertEqual([event['type'] for event in events], ['appointment'])
+
+    def test_export_streams_from_the_replica(self):
+        response = self.client.get('/api/appointments/export/')
+        self.assertEqual(b''.join(response.streaming_content).decode().splitlines()[1:], [])
+
+    def test_queue_is_loaded_from_the_primary(self):
+        queue = self.client.get(f'/api/appointments/queue/?doctor={self.doctor_user.pk}').data
+        self.assertEqual((queue['current_token'], queue['waiting']), (self.appointment.token_number, 1))
+
+
+class LabReportLinkTests(HospitalFixtures, TestCase):
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media = override_settings(MEDIA_ROOT=media_root.name)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.create_fixtures()
+        self.client = self.client_for(self.receptionist)
+
+    def test_report_is_linked_through_the_report_action_only(self):
+        created = self.client.post('/api/lab-tests/', {
+            'patient': self.patient.pk, 'test_name': 'CBC', 'booked_at': timezone.now().isoformat(),
+            'report_file': SimpleUploadedFile('cbc.pdf', b'%PDF-report', content_type='application/pdf'),
+        }, format='multipart')
+        self.assertEqual(created.status_code, 201, created.data)
+        lab_test = LabTest.objects.get(pk=created.data['id'])
+        link = f'http://testserver/api/lab-tests/{lab_test.pk}/report/'
+
+        self.assertEqual(created.data['report_file'], link)
+        self.assertEqual(self.client.get(f'/api/lab-tests/{lab_test.pk}/').data['report_file'], link)
+        self.assertEqual(self.client.get('/api/lab-tests/').data['results'][0]['report_file'], link)
+        self.assertEqual(b''.join(self.client.get(link).streaming_content), b'%PDF-report')
+
+    def lab_test(self, content):
+        lab_test = LabTest.objects.create(patient=self.patient, test_name='CBC', booked_at=timezone.now())
+        return attach_report(lab_test, SimpleUploadedFile('cbc.pdf', content, content_type='application/pdf'))
+
+    async def test_asgi_downloads_stream_asynchronously(self):
+        lab_test = await sync_to_async(self.lab_test)(b'0123456789' * 10000)
+        token = await sync_to_async(AccessToken.for_user)(self.receptionist)
+        headers = {'Authorization': f'Bearer {token}'}
+        path = f'/api/lab-tests/{lab_test.pk}/report/'
+
+        response = await self.async_client.get(path, headers=headers)
+        self.assertTrue(response.is_async)
+        self.assertEqual((response.status_code, response['Content-Length']), (200, '100000'))
+        self.assertEqual(b''.join([chunk async for chunk in response.streaming_content]), b'0123456789' * 10000)
+
+        response = await self.async_client.get(path, headers={**headers, 'Range': 'bytes=5-14'})
+        self.assertTrue(response.is_async)
+        self.assertEqual((response.status_code, response['Content-Range']), (206, 'bytes 5-14/100000'))
+        self.assertEqual(b''.join([chunk async for chunk in response.streaming_content]), b'5678901234')
+
+    def test_unlinked_blobs_are_pruned(self):
+        lab_test = self.lab_test(b'first report')
+        replaced = lab_test.report_blob
+        attach_report(lab_test, SimpleUploadedFile('cbc.pdf', b'second report', content_type='application/pdf'))
+        self.lab_test(b'second report')
+        storage = replaced.file.storage
+
+        # A blob unlinked just now may be about to be reused.
+        self.assertEqual(prune_blobs(timedelta(hours=1)), (0, 0))
+        self.assertEqual(prune_blobs(timedelta(0)), (1, len(b'first report')))
+
+        self.assertFalse(storage.exists(replaced.file.name))
+        self.assertEqual(list(LabReportBlob.objects.values_list('size', flat=True)), [len(b'second report')])
+        self.assertEqual(b''.join(self.client.get(f'/api/lab-tests/{lab_test.pk}/report/').streaming_content), b'second report')
+
+
+class ListProjectionParityTests(HospitalFixtures, TestCase):
+    # Projected list rows must match what the detail serializer renders.
+    def setUp(self):
+        self.create_fixtures()
+        unnamed = User.objects.create_user('locum', password='x', role=User.Roles.DOCTOR)
+        Doctor.objects.create(user=unnamed, specialization='Locum', phone='1000000001')
+        other = Patient.objects.create(first_name='Bo', last_name='Ng', dob=date(1975, 6, 30), gender='male', phone='5550004321', address='')
+        for index, doctor in enumerate([self.doctor_user, unnamed]):
+            Appointment.objects.create(
+                patient=other if index else self.patient, doctor=doctor, reason='Checkup' if index else '',
+                appointment_date=timezone.now() + timedelta(days=index + 1), token_number=index + 1,
+            )
+        LabTest.objects.create(patient=self.patient, doctor=self.doctor, test_name='CBC', booked_at=timezone.now(), report_file='lab_reports/cbc.pdf')
+        LabTest.objects.create(patient=other, test_name='Lipids', booked_at=timezone.now(), status=LabTest.LabStatus.COMPLETED)
+        ward = Ward.objects.create(name='General', ward_type='General', total_beds=2)
+        Bed.objects.create(ward=ward, bed_number='G1', is_occupied=True, current_patient=self.patient)
+        Bed.objects.create(ward=ward, bed_number='G2', is_icu=True)
+        self.client = self.client_for(self.admin)
+
+    def assertListMatchesDetail(self, path):
+        rows = self.client.get(path).json()['results']
+        self.assertEqual(len(rows), 2)
+        for row in rows:
+            detail = self.client.get(f'{path}{row["id"]}/').json()
+            self.assertEqual(list(row), list(detail))
+            self.assertEqual(row, detail)
+
+    def test_patients(self):
+        self.assertListMatchesDetail('/api/patients/')
+
+    def test_appointments(self):
+        self.assertListMatchesDetail('/api/appointments/')
+
+    def test_lab_tests(self):
+        self.assertListMatchesDetail('/api/lab-tests/')
+
+    def test_beds(self):
+        self.assertListMatchesDetail('/api/beds/')
+
+
+class QueueBoardTests(HospitalFixtures, TestCase):
+    def setUp(self):
+        cache.clear()
+        queue_board.reset()
+        self.create_fixtures()
+        self.client = self.client_for(self.receptionist)
+        self.today = timezone.localdate()
+
+    def approved(self, **kwargs):
+        return Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor_user, status=Appointment.AppointmentStatus.APPROVED,
+            appointment_date=timezone.make_aware(datetime.combine(self.today, clock(0))), **kwargs
+        )
+
+    def queue(self):
+        return self.client.get(f'/api/appointments/queue/?doctor={self.doctor_user.pk}').data
+
+    def test_change_from_another_worker_forces_a_reload(self):
+        self.assertEqual(self.queue()['waiting'], 0)
+        # Committed in another worker: this board never applies it, but the
+        # shared version moves on.
+        self.approved(token_number=1)
+        cache.incr(queues._version_key(self.today, self.doctor_user.pk))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.approved(token_number=2)
+
+        queue = queue_board.get(self.doctor_user.pk)
+        self.assertEqual((queue['waiting'], queue['current_token']), (2, 1))
+
+    def test_day_versions_expire(self):
+        with mock.patch.object(queues.cache, 'add', wraps=cache.add) as add:
+            self.queue()
+        add.assert_called_once_with(queues._version_key(self.today, self.doctor_user.pk), mock.ANY, queues.VERSION_TIMEOUT)
+
+    def test_unknown_doctor_is_rejected(self):
+        response = self.client.get(f'/api/appointments/queue/?doctor={self.receptionist.pk}')
+        self.assertEqual(response.status_code, 404)
+        self.assertIsNone(queue_board.hub(self.receptionist.pk))
+        self.assertIsNone(cache.get(queues._version_key(self.today, self.receptionist.pk)))
+
+    async def test_unknown_doctor_events_are_rejected(self):
+        token = await sync_to_async(AccessToken.for_user)(self.receptionist)
+        response = await self.async_client.get(
+            '/api/appointments/queue/events/', {'doctor': 987654, 'token': str(token)}
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class BedEventsTests(HospitalFixtures, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.create_fixtures()
+        self.ward = Ward.objects.create(name='General', ward_type='GEN', total_beds=1)
+        self.bed = Bed.objects.create(ward=self.ward, bed_number='B1')
+
+    async def test_full_subscription_is_told_to_resync(self):
+        hub = Hub(max_queue=2)
+        subscription = hub.subscribe()
+        for index in range(3):
+            hub.publish({'type': 'bed', 'id': index})
+        await asyncio.sleep(0)
+
+        self.assertEqual(await subscription.get(1), {'type': 'resync'})
+        with self.assertRaises(asyncio.TimeoutError):
+            await subscription.get(0.01)
+        subscription.close()
+        self.assertEqual(len(hub), 0)
+
+    async def test_stream_requires_a_valid_token(self):
+        subscribers = len(bed_hub)
+        self.assertEqual((await self.async_client.get('/api/beds/events/')).status_code, 401)
+        self.assertEqual((await self.async_client.get('/api/beds/events/', {'token': 'not-a-token'})).status_code, 401)
+        self.assertEqual(len(bed_hub), subscribers)
+
+    async def open_stream(self):
+        token = await sync_to_async(AccessToken.for_user)(self.receptionist)
+        response = await self.async_client.get('/api/beds/events/', {'token': str(token)})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        return response.streaming_content
+
+    def event(self, chunk):
+        kind, data = chunk.decode().split('\n')[:2]
+        return kind.removeprefix('event: '), json.loads(data.removeprefix('data: '))
+
+    async def test_stream_starts_with_a_ward_snapshot(self):
+        stream = await self.open_stream()
+        kind, data = self.event(await anext(stream))
+        await stream.aclose()
+
+        self.assertEqual((kind, data['wards']), ('snapshot', [{'id': self.ward.pk, 'available_beds': 1, 'occupied_beds': 0, 'icu_available_beds': 0}]))
+
+    async def test_changes_from_other_workers_trigger_resync(self):
+        with mock.patch('core.views.BED_EVENTS_HEARTBEAT_SECONDS', 0.01):
+            stream = await self.open_stream()
+            await anext(stream)
+            self.assertEqual(await anext(stream), b': ping\n\n')
+            # Another process wrote a bed; this worker's hub never saw it.
+            await sync_to_async(bump_table_version)(Bed)
+            self.assertEqual(self.event(await anext(stream))[0], 'resync')
+            self.assertEqual(await anext(stream), b': ping\n\n')
+            await stream.aclose()
+
+
+class HybridPaginationTests(HospitalFixtures, TestCase):
+    def setUp(self):
+        self.create_fixtures()
+        start = timezone.now() + timedelta(days=1)
+        # Fifteen appointments share each of three timestamps, so pages end
+        # in the middle of ties on appointment_date.
+        Appointment.objects.bulk_create(
+            Appointment(patient=self.patient, doctor=self.doctor_user, appointment_date=start + timedelta(hours=index % 3), token_number=index + 1)
+            for index in range(45)
+        )
+        self.client = self.client_for(self.receptionist)
+
+    def walk(self, url):
+        ids = []
+        while url:
+            data = self.client.get(url).data
+            ids += [row['id'] for row in data['results']]
+            url = data['next']
+        return ids
+
+    def test_cursor_pages_return_every_row_once_in_keyset_order(self):
+        expected = list(Appointment.objects.order_by('appointment_date', 'id').values_list('id', flat=True))
+        self.assertEqual(self.walk('/api/appointments/?pagination=cursor'), expected)
+
+    def test_bad_cursor_is_not_found(self):
+        self.assertEqual(self.client.get('/api/appointments/?cursor=not-a-cursor').status_code, 404)
+
+    def test_page_numbers_are_unchanged(self):
+        data = self.client.get('/api/appointments/?ordering=id&page=2').data
+        self.assertEqual(list(data), ['count', 'next', 'previous', 'results'])
+        self.assertEqual(data['count'], 45)
+        self.assertIn('page=3', data['next'])
+        self.assertEqual(self.walk('/api/appointments/?ordering=id'), sorted(Appointment.objects.values_list('id', flat=True)))
+        self.assertEqual(self.client.get('/api/appointments/?page=4').status_code, 404)
+
+
+class ListFilterTests(HospitalFixtures, TestCase):
+    def setUp(self):
+        self.create_fixtures()
+        other_user = User.objects.create_user('wilson', password='x', role=User.Roles.DOCTOR)
+        self.other = Patient.objects.create(first_name='Lee', last_name='Ann', dob=date(1980, 1, 1), gender='male', phone='5550009999', address='')
+        self.day = timezone.localdate() + timedelta(days=3)
+        late = timezone.make_aware(datetime.combine(self.day, clock(23, 30)))
+        self.appointments = {
+            'pending_late': Appointment.objects.create(patient=self.patient, doctor=self.doctor_user, appointment_date=late),
+            'approved_next_day': Appointment.objects.create(
+                patient=self.patient, doctor=self.doctor_user, appointment_date=late + timedelta(hours=1),
+                status=Appointment.AppointmentStatus.APPROVED,
+            ),
+            'other_doctor': Appointment.objects.create(patient=self.other, doctor=other_user, appointment_date=late - timedelta(hours=2)),
+        }
+        self.client = self.client_for(self.receptionist)
+
+    def appointment_ids(self, query):
+        response = self.client.get(f'/api/appointments/?{query}')
+        self.assertEqual(response.status_code, 200, response.data)
+        return {row['id'] for row in response.data['results']}
+
+    def ids(self, *names):
+        return {self.appointments[name].pk for name in names}
+
+    def test_appointment_filters(self):
+        self.assertEqual(self.appointment_ids('status=pending'), self.ids('pending_late', 'other_doctor'))
+        self.assertEqual(self.appointment_ids('status=approved,pending'), self.ids('pending_late', 'approved_next_day', 'other_doctor'))
+        self.assertEqual(self.appointment_ids(f'doctor={self.doctor_user.pk}'), self.ids('pending_late', 'approved_next_day'))
+        self.assertEqual(self.appointment_ids(f'patient={self.other.pk}'), self.ids('other_doctor'))
+        self.assertEqual(
+            self.appointment_ids(f'status=pending&doctor={self.doctor_user.pk}&date_from={self.day}&date_to={self.day}'),
+            self.ids('pending_late'),
+        )
+
+    def test_plain_date_to_includes_the_whole_day(self):
+        self.assertEqual(self.appointment_ids(f'date_to={self.day}'), self.ids('pending_late', 'other_doctor'))
+        self.assertEqual(self.appointment_ids(f'date_from={self.day + timedelta(days=1)}'), self.ids('approved_next_day'))
+
+    def test_invalid_filters_are_rejected(self):
+        for query in ('status=lost', 'doctor=x', 'date_from=tomorrow'):
+            self.assertEqual(self.client.get(f'/api/appointments/?{query}').status_code, 400, query)
+
+    def test_two_word_name_search_matches_either_order(self):
+        for search in ('ann lee', 'lee ann'):
+            ids = {row['id'] for row in self.client.get(f'/api/patients/?search={search}').data['results']}
+            self.assertEqual(ids, {self.patient.pk, self.other.pk}, search)
+        self.assertEqual(self.client.get('/api/patients/?search=lee lee').data['results'], [])
+        ids = {row['id'] for row in self.client.get('/api/patients/?phone=5550009999').data['results']}
+        self.assertEqual(ids, {self.other.pk})
+
+    def test_ordering_is_limited_to_whitelisted_fields(self):
+        def ordered(query):
+            return [row['id'] for row in self.client.get(f'/api/patients/?{query}').data['results']]
+
+        self.assertEqual(ordered('ordering=-first_name'), [self.other.pk, self.patient.pk])
+        self.assertEqual(ordered('ordering=phone'), ordered(''))
+        self.assertEqual(ordered('ordering=-phone'), ordered(''))
+
+
+class ExportTests(HospitalFixtures, TestCase):
+    def setUp(self):
+        self.create_fixtures()
+        other = User.objects.create_user('wilson', password='x', role=User.Roles.DOCTOR)
+        moment = timezone.now() + timedelta(days=1)
+        self.own = Appointment.objects.create(patient=self.patient, doctor=self.doctor_user, appointment_date=moment, reason='Cough, mild')
+        self.approved = Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor_user, appointment_date=moment + timedelta(hours=1),
+            status=Appointment.AppointmentStatus.APPROVED,
+        )
+        self.others = Appointment.objects.create(patient=self.patient, doctor=other, appointment_date=moment)
+
+    def export(self, user, query=''):
+        response = self.client_for(user).get(f'/api/appointments/export/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_csv_export(self):
+        response, body = self.export(self.receptionist)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="appointments.csv"')
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual([int(row['id']) for row in rows], [self.own.pk, self.approved.pk, self.others.pk])
+        self.assertEqual((rows[0]['patient_first_name'], rows[0]['doctor_username'], rows[0]['reason']), ('Ann', 'doctor', 'Cough, mild'))
+
+    def test_ndjson_export_applies_filters(self):
+        response, body = self.export(self.receptionist, 'export_format=ndjson&status=approved')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="appointments.ndjson"')
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([(row['id'], row['status']) for row in rows], [(self.approved.pk, 'approved')])
+
+    def test_doctors_export_only_their_appointments(self):
+        _, body = self.export(self.doctor_user, 'export_format=ndjson')
+        self.assertEqual([json.loads(line)['id'] for line in body.splitlines()], [self.own.pk, self.approved.pk])
+
+    def test_unknown_format_is_rejected(self):
+        self.assertEqual(self.client_for(self.receptionist).get('/api/patients/export/?export_format=xml').status_code, 400)
+
+    async def test_asgi_export_streams_batches_asynchronously(self):
+        token = await sync_to_async(AccessToken.for_user)(self.receptionist)
+        with mock.patch.object(exporters, 'aiter_chunks', wraps=exporters.aiter_chunks) as chunks:
+            response = await self.async_client.get(
+                '/api/patients/export/?export_format=ndjson', headers={'Authorization': f'Bearer {token}'}
+            )
+            self.assertTrue(response.is_async)
+            body = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        chunks.assert_called_once()
+        self.assertEqual([json.loads(line)['id'] for line in body.splitlines()], [self.patient.pk])
+
+
+class SharedCacheCheckTests(TestCase):
+    LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+    SHARED = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://cache:6379/1'}}
+
+    def ids(self, workers='1'):
+        with mock.patch.dict(os.environ, {'WEB_CONCURRENCY': workers}):
+            return [message.id for message in checks.check_shared_cache(None)]
+
+    def test_single_worker_may_use_locmem(self):
+        with override_settings(CACHES=self.LOCMEM, DATABASE_REPLICAS=[]):
+            self.assertEqual(self.ids(), [])
+
+    def test_locmem_with_several_workers_warns(self):
+        with override_settings(CACHES=self.LOCMEM, DATABASE_REPLICAS=[]):
+            self.assertEqual(self.ids('4'), ['core.W001'])
+
+    def test_locmem_with_replicas_is_an_error(self):
+        with override_settings(CACHES=self.LOCMEM, DATABASE_REPLICAS=['replica_1']):
+            self.assertEqual(self.ids(), ['core.E001'])
+
+    def test_shared_cache_passes(self):
+        with override_settings(CACHES=self.SHARED, DATABASE_REPLICAS=['replica_1']):
+            self.assertEqual(self.ids('4'), [])
+
+
+@override_settings(METRICS_ENABLED=True)
+class RequestMetricsTests(HospitalFixtures, TestCase):
+    def setUp(self):
+        self.create_fixtures()
+        metrics.registry.reset()
+        self.addCleanup(metrics.registry.reset)
+
+    def test_nonstandard_methods_share_one_label(self):
+        client = self.client_for(self.receptionist)
+        client.get('/api/patients/')
+        for verb in ('PURGE', 'X-RANDOM-1', 'X-RANDOM-2'):
+            client.generic(verb, '/api/patients/')
+
+        exposition = metrics.registry.render()
+        self.assertIn('method="GET"', exposition)
+        self.assertIn('hospital_http_request_duration_seconds_count{view="patients-list",method="OTHER"} 3', exposition)
+        self.assertNotIn('PURGE', exposition)
+
+
+class PatientTimelineTests(HospitalFixtures, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.create_fixtures()
+        self.other = Patient.objects.create(
+            first_name='Bo', last_name='Chen', dob=date(1975, 5, 5), gender='male', phone='5550009999', address='a'
+        )
+        now = timezone.now()
+        self.upcoming = Appointment.objects.create(patient=self.patient, doctor=self.doctor_user, appointment_date=now + timedelta(days=1))
+        self.lab_test = LabTest.objects.create(patient=self.patient, test_name='CBC', booked_at=now - timedelta(days=1))
+        ward = Ward.objects.create(name='General', ward_type='GEN', total_beds=1)
+        self.bed = Bed.objects.create(ward=ward, bed_number='B1')
+        transfer = BedTransfer.objects.create(patient=self.patient, to_bed=self.bed)
+        self.moved_in = now - timedelta(days=2)
+        BedTransfer.objects.filter(pk=transfer.pk).update(created_at=self.moved_in, transferred_at=self.moved_in)
+        self.bed.is_occupied, self.bed.current_patient = True, self.patient
+        self.bed.save()
+        self.past = Appointment.objects.create(patient=self.patient, doctor=self.doctor_user, appointment_date=now - timedelta(days=5))
+        self.client = self.client_for(self.receptionist)
+
+    def timeline(self, patient, query=''):
+        return self.client.get(f'/api/patients/{patient.pk}/timeline/{query}').data
+
+    def test_events_are_newest_first_across_sources(self):
+        events = self.timeline(self.patient)['results']
+
+        self.assertEqual(
+            [(event['type'], event['id']) for event in events],
+            [('appointment', self.upcoming.pk), ('lab_test', self.lab_test.pk), ('bed_transfer', events[2]['id']),
+             ('bed_allocation', self.bed.pk), ('appointment', self.past.pk)],
+        )
+        # Dated by the transfer into the bed, not the bed's later edits.
+        self.assertEqual(events[3]['at'], events[2]['at'])
+        self.assertGreater(self.bed.updated_at, self.moved_in)
+
+    def test_pages_split_the_merged_events(self):
+        pages = [self.timeline(self.patient, f'?page_size=2&page={page}') for page in (1, 2, 3)]
+
+        self.assertEqual([page['count'] for page in pages], [5, 5, 5])
+        self.assertEqual([[event['type'] for event in page['results']] for page in pages], [
+            ['appointment', 'lab_test'], ['bed_transfer', 'bed_allocation'], ['appointment'],
+        ])
+        self.assertIsNone(pages[2]['next'])
+
+    def test_moving_rows_between_patients_invalidates_both_timelines(self):
+        self.timeline(self.patient), self.timeline(self.other)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.upcoming.patient = self.other
+            self.upcoming.save()
+            self.bed.current_patient = self.other
+            self.bed.save()
+
+        self.assertEqual(
+            [event['type'] for event in self.timeline(self.patient)['results']], ['lab_test', 'bed_transfer', 'appointment']
+        )
+        self.assertEqual(
+            [(event['type'], event['id']) for event in self.timeline(self.other)['results']],
+            [('appointment', self.upcoming.pk), ('bed_allocation', self.bed.pk)],
+        )
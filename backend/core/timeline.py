@@ -0,0 +1,149 @@
+import heapq
+import time
+
+from django.core.cache import cache
+from django.db.models import Prefetch, prefetch_related_objects
+from rest_framework import serializers
+
+from .db_router import primary
+from .models import Appointment, Bed, BedTransfer, LabTest
+
+CACHE_TIMEOUT = 60 * 60
+
+_datetime = serializers.DateTimeField()
+
+
+def _version_key(patient_id):
+    return f'timeline:version:{patient_id}'
+
+
+def _events_key(patient_id, version):
+    return f'timeline:events:{patient_id}:{version}'
+
+
+def get_version(patient_id):
+    # Versions start from a timestamp, so an evicted version key never
+    # resurrects events cached under an older version.
+    key = _version_key(patient_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate(*patient_ids):
+    for patient_id in {patient_id for patient_id in patient_ids if patient_id}:
+        try:
+            cache.incr(_version_key(patient_id))
+        except ValueError:
+            cache.set(_version_key(patient_id), time.time_ns(), None)
+
+
+def _prefetches():
+    return [
+        Prefetch('appointments', queryset=Appointment.objects.select_related('doctor').order_by('-appointment_date', '-id')),
+        Prefetch('lab_tests', queryset=LabTest.objects.select_related('doctor__user').order_by('-booked_at', '-id')),
+        Prefetch('bed_transfers', queryset=BedTransfer.objects.select_related('from_bed__ward', 'to_bed__ward').order_by('-transferred_at', '-id')),
+        Prefetch('allocated_beds', queryset=Bed.objects.select_related('ward').order_by('-updated_at', '-id')),
+    ]
+
+
+def _appointment_events(patient):
+    for appointment in patient.appointments.all():
+        doctor = appointment.doctor
+        yield appointment.appointment_date, {
+            'type': 'appointment',
+            'id': appointment.id,
+            'status': appointment.status,
+            'token_number': appointment.token_number,
+            'reason': appointment.reason,
+            'doctor': doctor.id,
+            'doctor_name': doctor.get_full_name() or doctor.username,
+        }
+
+
+def _lab_test_events(patient):
+    for lab_test in patient.lab_tests.all():
+        yield lab_test.booked_at, {
+            'type': 'lab_test',
+            'id': lab_test.id,
+            'test_name': lab_test.test_name,
+            'status': lab_test.status,
+            'result_summary': lab_test.result_summary,
+            'doctor': lab_test.doctor_id,
+            'doctor_name': str(lab_test.doctor) if lab_test.doctor else None,
+            'has_report': bool(lab_test.report_file),
+        }
+
+
+def _bed_label(bed):
+    return f'{bed.ward.name} / {bed.bed_number}' if bed else None
+
+
+def _bed_transfer_events(patient):
+    for transfer in patient.bed_transfers.all():
+        yield transfer.transferred_at, {
+            'type': 'bed_transfer',
+            'id': transfer.id,
+            'from_bed': transfer.from_bed_id,
+            'from_bed_label': _bed_label(transfer.from_bed),
+            'to_bed': transfer.to_bed_id,
+            'to_bed_label': _bed_label(transfer.to_bed),
+            'reason': transfer.reason,
+        }
+
+
+def _bed_allocation_events(patient):
+    # The allocation happened when the patient was last moved into the bed;
+    # bed.updated_at also moves on unrelated edits to the bed.
+    moved_in = {}
+    for transfer in patient.bed_transfers.all():
+        moved_in.setdefault(transfer.to_bed_id, transfer.created_at)
+    events = [
+        (moved_in.get(bed.id, bed.updated_at), {
+            'type': 'bed_allocation',
+            'id': bed.id,
+            'bed_label': _bed_label(bed),
+            'ward': bed.ward_id,
+            'is_icu': bed.is_icu,
+        })
+        for bed in patient.allocated_beds.all()
+    ]
+    return sorted(events, key=lambda item: item[0], reverse=True)
+
+
+def build_timeline(patient):
+    """Newest-first events for ``patient`` from four prefetch queries.
+
+    Each related set is fetched already sorted newest first, so the streams
+    are combined with a heap merge instead of a full sort.
+    """
+    with primary():
+        prefetch_related_objects([patient], *_prefetches())
+    streams = [
+        _appointment_events(patient),
+        _lab_test_events(patient),
+        _bed_transfer_events(patient),
+        _bed_allocation_events(patient),
+    ]
+    return [
+        {'at': _datetime.to_representation(moment), **event}
+        for moment, event in heapq.merge(*streams, key=lambda item: item[0], reverse=True)
+    ]
+
+
+def get_timeline(patient, version=None):
+    """Cached ``build_timeline``; related writes bump the patient's version.
+
+    Doctor names are captured when the timeline is built, so a renamed
+    doctor shows the old name until CACHE_TIMEOUT.
+    """
+    if version is None:
+        version = get_version(patient.pk)
+    key = _events_key(patient.pk, version)
+    events = cache.get(key)
+    if events is None:
+        events = build_timeline(patient)
+        cache.set(key, events, CACHE_TIMEOUT)
+    return events
@@ -13,9 +13,12 @@ from .views import (
     LabTestViewSet,
     LogoutAPIView,
     MeAPIView,
+    MetricsAPIView,
     PatientViewSet,
     RegisterAPIView,
     WardViewSet,
+    appointment_queue_events,
+    bed_events,
 )
 
 router = DefaultRouter()
@@ -36,5 +39,8 @@ urlpatterns = [
     path('auth/logout/', LogoutAPIView.as_view(), name='logout'),
     path('auth/me/', MeAPIView.as_view(), name='me'),
     path('dashboard/stats/', DashboardStatsAPIView.as_view(), name='dashboard-stats'),
+    path('beds/events/', bed_events, name='bed-events'),
+    path('appointments/queue/events/', appointment_queue_events, name='appointment-queue-events'),
+    path('metrics/', MetricsAPIView.as_view(), name='metrics'),
     path('', include(router.urls)),
 ]
@@ -1,14 +1,47 @@
+import asyncio
+import codecs
+import os
+from collections import Counter
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.core.mail import send_mail
-from rest_framework import decorators, permissions, response, status, viewsets
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.db.models import Count, Q
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework import decorators, filters, permissions, response, status, viewsets
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken
 
+from . import policies, stats
+from .authentication import CachedJWTAuthentication
+from .availability import get_availability, invalidate as invalidate_availability
+from .conditional import bump_table_version, is_not_modified, make_etag, recently_changed, set_validators, table_versions
+from .db_router import primary
+from .exporters import APPOINTMENT_EXPORT_FIELDS, FORMATS as EXPORT_FORMATS, PATIENT_EXPORT_FIELDS, export_response
+from .filters import AppointmentFilterBackend, PatientFilterBackend
+from .importers import FORMATS as IMPORT_FORMATS, MAX_BATCH_SIZE as MAX_IMPORT_BATCH_SIZE, detect_format, import_patients, read_rows
+from .lab_reports import HashingFileUploadHandler, ReportTooLarge, attach_report, report_response, spool_stream
+from .metrics import registry as metrics_registry, serialization_timer
 from .models import Appointment, Bed, BedTransfer, Doctor, DoctorLeave, DoctorSchedule, LabTest, Patient, Ward
-from .permissions import IsAppointmentOwnerDoctorOrAdmin
+from .notifications import queue_status_notifications
+from .pagination import TimelinePagination
+from .permissions import IsAdminRole, PolicyPermission
+from .projections import ListProjection, patient_name, user_display_name
+from .queues import board as queue_board, entry as queue_entry
+from .realtime import bed_hub, format_sse
+from .search import search_patients
 from .serializers import (
+    AppointmentBulkStatusSerializer,
     AppointmentSerializer,
+    BedAllocationSerializer,
     BedSerializer,
     BedTransferSerializer,
     DoctorLeaveSerializer,
@@ -20,10 +53,15 @@ from .serializers import (
     UserSerializer,
     WardSerializer,
 )
-from .utils import send_mock_sms
+from .timeline import get_timeline, get_version as timeline_version, invalidate as invalidate_timeline
 
 User = get_user_model()
 
+BED_EVENTS_HEARTBEAT_SECONDS = 15
+QUEUE_EVENTS_HEARTBEAT_SECONDS = 15
+MAX_AVAILABILITY_DAYS = 31
+MAX_REPORTED_IMPORT_ERRORS = 1000
+
 
 class RegisterAPIView(APIView):
     permission_classes = [permissions.AllowAny]
@@ -54,132 +92,356 @@ class LogoutAPIView(APIView):
         return response.Response({'detail': 'Logged out successfully'})
 
 
-class BaseRoleViewSet(viewsets.ModelViewSet):
-    allowed_write_roles = [User.Roles.ADMIN]
-
-    def _can_write(self):
-        return self.request.user.role in self.allowed_write_roles or self.request.user.is_superuser
-
-    def create(self, request, *args, **kwargs):
-        if not self._can_write():
-            return response.Response({'detail': 'Insufficient role permissions'}, status=status.HTTP_403_FORBIDDEN)
-        return super().create(request, *args, **kwargs)
+STANDARD_POLICY_ACTIONS = {
+    'list': policies.READ,
+    'retrieve': policies.READ,
+    'create': policies.CREATE,
+    'update': policies.UPDATE,
+    'partial_update': policies.UPDATE,
+    'destroy': policies.DELETE,
+}
 
-    def update(self, request, *args, **kwargs):
-        if not self._can_write():
-            return response.Response({'detail': 'Insufficient role permissions'}, status=status.HTTP_403_FORBIDDEN)
-        return super().update(request, *args, **kwargs)
 
-    def partial_update(self, request, *args, **kwargs):
-        if not self._can_write():
-            return response.Response({'detail': 'Insufficient role permissions'}, status=status.HTTP_403_FORBIDDEN)
-        return super().partial_update(request, *args, **kwargs)
+class BaseRoleViewSet(viewsets.ModelViewSet):
+    # Role checks and row scoping come from core.policies; see get_policy_action.
+    permission_classes = [permissions.IsAuthenticated, PolicyPermission]
+    # Extra actions mapped to a policy action; unmapped extra actions are
+    # READ for safe methods and UPDATE otherwise.
+    policy_actions = {}
+    # Optional ListProjection that renders list pages from values() rows.
+    list_projection = None
+
+    def get_policy_action(self):
+        if self.action in self.policy_actions:
+            return self.policy_actions[self.action]
+        if self.action in STANDARD_POLICY_ACTIONS:
+            return STANDARD_POLICY_ACTIONS[self.action]
+        return policies.READ if self.request.method in permissions.SAFE_METHODS else policies.UPDATE
 
-    def destroy(self, request, *args, **kwargs):
-        if not self._can_write():
-            return response.Response({'detail': 'Insufficient role permissions'}, status=status.HTTP_403_FORBIDDEN)
-        return super().destroy(request, *args, **kwargs)
+    def get_queryset(self):
+        # Rows outside the user's scope never leave the database.
+        return policies.scope_queryset(super().get_queryset(), self.request.user, self.get_policy_action())
+
+    # Timestamps folded into a detail ETag; related paths cover joined rows
+    # that are rendered, such as names.
+    etag_modified_fields = ('updated_at',)
+    # Other models whose rows are rendered in this resource; writes to them
+    # change its ETags through conditional.table_versions.
+    etag_versions = ()
+
+    def _instance_modified(self, instance):
+        values = []
+        for field in self.etag_modified_fields:
+            value = instance
+            for attribute in field.split('__'):
+                value = getattr(value, attribute)
+            values.append(value)
+        return max(values)
+
+    def _etag(self, *parts):
+        # The role picks the policy scope, so a role change must not revalidate.
+        return make_etag(self.request.user.pk, self.request.user.role, self.request.get_full_path(), *parts)
+
+    def list(self, request, *args, **kwargs):
+        # List ETags come from per-table version counters, so a conditional
+        # request costs a cache read instead of an aggregate over the table.
+        versions = table_versions([self.queryset.model, *self.etag_versions])
+        etag = self._etag(*versions)
+        if is_not_modified(request, etag, use_modified_since=False):
+            return set_validators(response.Response(status=status.HTTP_304_NOT_MODIFIED), etag)
+        if not recently_changed(versions):
+            return set_validators(self._list_response(request, *args, **kwargs), etag)
+        # Do not pair a new version with rows from a lagging replica.
+        with primary():
+            return set_validators(self._list_response(request, *args, **kwargs), etag)
+
+    def _list_response(self, request, *args, **kwargs):
+        projection = self.list_projection
+        if projection is None:
+            return super().list(request, *args, **kwargs)
+        try:
+            keys = projection.select(request.query_params.get('fields'))
+        except ValueError as exc:
+            return response.Response({'detail': f'Unknown fields: {exc}'}, status=status.HTTP_400_BAD_REQUEST)
+        # Ordering columns must be present in the rows for cursor pagination.
+        extra = [*getattr(self, 'cursor_ordering', ()), *getattr(self, 'ordering_fields', ())]
+        queryset = projection.values(self.filter_queryset(self.get_queryset()), keys, extra)
+        page = self.paginate_queryset(queryset)
+        with serialization_timer():
+            data = projection.render(page if page is not None else queryset, keys, request)
+        if page is not None:
+            return self.get_paginated_response(data)
+        return response.Response(data)
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        last_modified = self._instance_modified(instance)
+        etag = self._etag(last_modified, *table_versions(self.etag_versions))
+        # Writes to etag_versions tables do not move Last-Modified.
+        if is_not_modified(request, etag, last_modified, use_modified_since=not self.etag_versions):
+            return set_validators(response.Response(status=status.HTTP_304_NOT_MODIFIED), etag, last_modified)
+        with serialization_timer():
+            data = self.get_serializer(instance).data
+        return set_validators(response.Response(data), etag, last_modified)
+
+    def _export(self, fields, filename):
+        fmt = self.request.query_params.get('export_format', 'csv')
+        if fmt not in EXPORT_FORMATS:
+            return response.Response({'detail': f'export_format must be one of {", ".join(EXPORT_FORMATS)}'}, status=status.HTTP_400_BAD_REQUEST)
+        return export_response(self.request, self.filter_queryset(self.get_queryset()), fields, fmt, filename)
 
 
 class PatientViewSet(BaseRoleViewSet):
     queryset = Patient.objects.all()
     serializer_class = PatientSerializer
-    allowed_write_roles = [User.Roles.ADMIN, User.Roles.RECEPTIONIST, User.Roles.DOCTOR]
+    cursor_ordering = ('created_at', 'id')
+    policy_actions = {'bulk_import': policies.IMPORT}
+    list_projection = ListProjection(PatientSerializer, compact=['id', 'first_name', 'last_name', 'dob', 'gender', 'phone'])
+    filter_backends = [PatientFilterBackend, filters.OrderingFilter]
+    ordering_fields = ['id', 'first_name', 'last_name', 'created_at', 'dob']
 
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
 
+    @decorators.action(detail=False, methods=['get'])
+    def search(self, request):
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 20)), 100))
+        except ValueError:
+            return response.Response({'detail': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        patients = search_patients(request.query_params.get('q', ''), limit=limit)
+        return response.Response({'results': self.get_serializer(patients, many=True).data})
+
+    @decorators.action(detail=False, methods=['get'])
+    def export(self, request):
+        return self._export(PATIENT_EXPORT_FIELDS, 'patients')
+
+    @decorators.action(detail=True, methods=['get'])
+    def timeline(self, request, pk=None):
+        patient = self.get_object()
+        version = timeline_version(patient.pk)
+        etag = self._etag(version)
+        if is_not_modified(request, etag, use_modified_since=False):
+            return set_validators(response.Response(status=status.HTTP_304_NOT_MODIFIED), etag)
+        paginator = TimelinePagination()
+        page = paginator.paginate_queryset(get_timeline(patient, version), request, view=self)
+        return set_validators(paginator.get_paginated_response(page), etag)
+
+    @decorators.action(
+        detail=False,
+        methods=['post'],
+        parser_classes=[MultiPartParser],
+        url_path='import',
+    )
+    def bulk_import(self, request):
+        upload = request.FILES.get('file')
+        if not upload:
+            return response.Response({'detail': 'file is required'}, status=status.HTTP_400_BAD_REQUEST)
+        fmt = request.data.get('format') or detect_format(upload.name)
+        if fmt not in IMPORT_FORMATS:
+            return response.Response({'detail': f'format must be one of {", ".join(IMPORT_FORMATS)}'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            batch_size = int(request.data.get('batch_size', 500))
+        except ValueError:
+            return response.Response({'detail': 'batch_size must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= batch_size <= MAX_IMPORT_BATCH_SIZE:
+            return response.Response(
+                {'detail': f'batch_size must be between 1 and {MAX_IMPORT_BATCH_SIZE}'}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        errors = []
+
+        def on_error(row_number, row_errors):
+            if len(errors) < MAX_REPORTED_IMPORT_ERRORS:
+                errors.append({'row': row_number, 'errors': row_errors})
+
+        result = import_patients(read_rows(codecs.iterdecode(upload, 'utf-8-sig'), fmt), created_by=request.user, batch_size=batch_size, on_error=on_error)
+        result['errors'] = errors
+        return response.Response(result, status=status.HTTP_201_CREATED if result['imported'] else status.HTTP_200_OK)
+
 
 class DoctorViewSet(BaseRoleViewSet):
     queryset = Doctor.objects.select_related('user').all()
+    etag_versions = (User,)
     serializer_class = DoctorSerializer
-    allowed_write_roles = [User.Roles.ADMIN]
+
+    @decorators.action(detail=False, methods=['get'])
+    def availability(self, request):
+        params = request.query_params
+        try:
+            start = parse_date(params['start']) if params.get('start') else timezone.localdate()
+            end = parse_date(params['end']) if params.get('end') else start + timedelta(days=6)
+            doctor_ids = [int(item) for item in params.get('doctor', '').split(',') if item]
+        except ValueError:
+            start = end = None
+        if start is None or end is None:
+            return response.Response({'detail': 'Use YYYY-MM-DD for start/end and integer doctor ids'}, status=status.HTTP_400_BAD_REQUEST)
+        if end < start or (end - start).days >= MAX_AVAILABILITY_DAYS:
+            return response.Response({'detail': f'end must be within {MAX_AVAILABILITY_DAYS} days after start'}, status=status.HTTP_400_BAD_REQUEST)
+
+        doctors = Doctor.objects.filter(is_active=True).order_by('id')
+        if doctor_ids:
+            doctors = doctors.filter(id__in=doctor_ids)
+        doctors = list(doctors.values_list('id', 'user_id'))
+        slots = get_availability(doctors, start, end)
+        return response.Response({
+            'start': start,
+            'end': end,
+            'slot_minutes': settings.APPOINTMENT_SLOT_MINUTES,
+            'results': [
+                {'doctor': doctor_id, 'doctor_user_id': user_id, 'slots': slots[user_id]}
+                for doctor_id, user_id in doctors
+            ],
+        })
 
 
 class DoctorScheduleViewSet(BaseRoleViewSet):
     queryset = DoctorSchedule.objects.select_related('doctor', 'doctor__user').all()
     serializer_class = DoctorScheduleSerializer
-    allowed_write_roles = [User.Roles.ADMIN, User.Roles.DOCTOR]
 
 
 class DoctorLeaveViewSet(BaseRoleViewSet):
     queryset = DoctorLeave.objects.select_related('doctor', 'doctor__user').all()
     serializer_class = DoctorLeaveSerializer
-    allowed_write_roles = [User.Roles.ADMIN, User.Roles.DOCTOR]
 
 
 class AppointmentViewSet(BaseRoleViewSet):
     queryset = Appointment.objects.select_related('patient', 'doctor').all()
+    # Patient and doctor names are part of the representation.
+    etag_modified_fields = ('updated_at', 'patient__updated_at')
+    etag_versions = (Patient, User)
     serializer_class = AppointmentSerializer
-    allowed_write_roles = [User.Roles.ADMIN, User.Roles.RECEPTIONIST]
-
-    def get_queryset(self):
-        qs = super().get_queryset()
-        user = self.request.user
-        if user.role == User.Roles.DOCTOR:
-            return qs.filter(doctor=user)
-        return qs
-
-    def create(self, request, *args, **kwargs):
-        if request.user.role not in [User.Roles.ADMIN, User.Roles.RECEPTIONIST] and not request.user.is_superuser:
-            return response.Response({'detail': 'Only admin/receptionist can create appointments'}, status=status.HTTP_403_FORBIDDEN)
-        return super().create(request, *args, **kwargs)
+    cursor_ordering = ('appointment_date', 'id')
+    policy_actions = {
+        action: policies.MANAGE
+        for action in ('approve', 'reject', 'cancel', 'complete', 'bulk_status', 'patient_detail')
+    }
+    list_projection = ListProjection(
+        AppointmentSerializer,
+        annotations={'patient_name': patient_name('patient__'), 'doctor_name': user_display_name('doctor__')},
+        compact=['id', 'patient', 'patient_name', 'doctor', 'doctor_name', 'appointment_date', 'status', 'token_number'],
+    )
+    filter_backends = [AppointmentFilterBackend, filters.OrderingFilter]
+    ordering_fields = ['id', 'appointment_date', 'status', 'token_number', 'created_at']
 
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
 
-    def update(self, request, *args, **kwargs):
-        if request.user.role == User.Roles.DOCTOR:
-            return response.Response({'detail': 'Doctors cannot edit appointment payload directly'}, status=status.HTTP_403_FORBIDDEN)
-        return super().update(request, *args, **kwargs)
-
-    def partial_update(self, request, *args, **kwargs):
-        if request.user.role == User.Roles.DOCTOR:
-            return response.Response({'detail': 'Doctors cannot edit appointment payload directly'}, status=status.HTTP_403_FORBIDDEN)
-        return super().partial_update(request, *args, **kwargs)
-
-    def destroy(self, request, *args, **kwargs):
-        if request.user.role == User.Roles.DOCTOR:
-            return response.Response({'detail': 'Doctors cannot delete appointments'}, status=status.HTTP_403_FORBIDDEN)
-        return super().destroy(request, *args, **kwargs)
-
-    @decorators.action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated, IsAppointmentOwnerDoctorOrAdmin])
-    def approve(self, request, pk=None):
+    @decorators.action(detail=False, methods=['get'])
+    def export(self, request):
+        return self._export(APPOINTMENT_EXPORT_FIELDS, 'appointments')
+
+    @decorators.action(detail=False, methods=['get'])
+    def queue(self, request):
+        # Served from the in-memory queue board; no appointment rows are read.
+        doctor = request.query_params.get('doctor')
+        if doctor is None:
+            data = queue_board.all()
+        elif doctor.isdigit():
+            data = queue_board.get(int(doctor))
+            if data is None:
+                return response.Response({'detail': 'No doctor with this user id'}, status=status.HTTP_404_NOT_FOUND)
+        else:
+            return response.Response({'detail': 'doctor must be a doctor user id'}, status=status.HTTP_400_BAD_REQUEST)
+        versions = [data['version']] if doctor else [(queue['doctor'], queue['version']) for queue in data]
+        etag = make_etag('queue', doctor, *versions)
+        if is_not_modified(request, etag, use_modified_since=False):
+            return set_validators(response.Response(status=status.HTTP_304_NOT_MODIFIED), etag)
+        return set_validators(response.Response(data), etag)
+
+    def _transition(self, target):
+        # Same rules as bulk-status; approve and reject also notify the patient.
         instance = self.get_object()
-        instance.status = Appointment.AppointmentStatus.APPROVED
-        instance.save(update_fields=['status'])
-        if instance.patient.email:
-            send_mail('Appointment Approved', f'Your appointment #{instance.id} has been approved.', None, [instance.patient.email], fail_silently=True)
-        if instance.patient.phone:
-            send_mock_sms(instance.patient.phone, f'Appointment #{instance.id} approved.')
+        with transaction.atomic():
+            # Re-read under a row lock so two concurrent actions cannot both
+            # pass the check against the status loaded above.
+            instance = self.get_queryset().select_for_update(of=('self',)).get(pk=instance.pk)
+            if target not in Appointment.ALLOWED_TRANSITIONS[instance.status]:
+                return response.Response(
+                    {'detail': f'Cannot change {instance.status} to {target}'}, status=status.HTTP_400_BAD_REQUEST
+                )
+            instance.status = target
+            instance.save(update_fields=['status', 'updated_at'])
+            queue_status_notifications([instance])
         return response.Response(self.get_serializer(instance).data)
 
-    @decorators.action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated, IsAppointmentOwnerDoctorOrAdmin])
+    @decorators.action(detail=True, methods=['post'])
+    def approve(self, request, pk=None):
+        return self._transition(Appointment.AppointmentStatus.APPROVED)
+
+    @decorators.action(detail=True, methods=['post'])
     def reject(self, request, pk=None):
-        instance = self.get_object()
-        instance.status = Appointment.AppointmentStatus.REJECTED
-        instance.save(update_fields=['status'])
-        if instance.patient.email:
-            send_mail('Appointment Rejected', f'Your appointment #{instance.id} has been rejected.', None, [instance.patient.email], fail_silently=True)
-        if instance.patient.phone:
-            send_mock_sms(instance.patient.phone, f'Appointment #{instance.id} rejected.')
-        return response.Response(self.get_serializer(instance).data)
+        return self._transition(Appointment.AppointmentStatus.REJECTED)
 
-    @decorators.action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated, IsAppointmentOwnerDoctorOrAdmin])
+    @decorators.action(detail=True, methods=['post'])
     def cancel(self, request, pk=None):
-        instance = self.get_object()
-        instance.status = Appointment.AppointmentStatus.CANCELLED
-        instance.save(update_fields=['status'])
-        return response.Response(self.get_serializer(instance).data)
+        return self._transition(Appointment.AppointmentStatus.CANCELLED)
 
-    @decorators.action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated, IsAppointmentOwnerDoctorOrAdmin])
+    @decorators.action(detail=True, methods=['post'])
     def complete(self, request, pk=None):
-        instance = self.get_object()
-        instance.status = Appointment.AppointmentStatus.COMPLETED
-        instance.save(update_fields=['status'])
-        return response.Response(self.get_serializer(instance).data)
-
-    @decorators.action(detail=True, methods=['get'], permission_classes=[permissions.IsAuthenticated, IsAppointmentOwnerDoctorOrAdmin], url_path='patient-detail')
+        return self._transition(Appointment.AppointmentStatus.COMPLETED)
+
+    @decorators.action(
+        detail=False,
+        methods=['post'],
+        url_path='bulk-status',
+    )
+    def bulk_status(self, request):
+        serializer = AppointmentBulkStatusSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = list(dict.fromkeys(serializer.validated_data['ids']))
+        target = serializer.validated_data['status']
+
+        results = {}
+        with transaction.atomic():
+            appointments = {
+                appointment.id: appointment
+                for appointment in self.get_queryset().select_related(None).select_related('patient')
+                .only('id', 'status', 'doctor_id', 'appointment_date', 'token_number', 'patient__email', 'patient__phone')
+                .select_for_update(of=('self',)).filter(id__in=ids)
+            }
+            eligible = []
+            for appointment_id in ids:
+                appointment = appointments.get(appointment_id)
+                if appointment is None:
+                    # Missing, or outside the user's policy scope.
+                    results[appointment_id] = {'id': appointment_id, 'result': 'not_found'}
+                elif target not in Appointment.ALLOWED_TRANSITIONS[appointment.status]:
+                    results[appointment_id] = {
+                        'id': appointment_id,
+                        'result': 'invalid_transition',
+                        'detail': f'Cannot change {appointment.status} to {target}',
+                    }
+                else:
+                    results[appointment_id] = {'id': appointment_id, 'result': 'updated', 'previous_status': appointment.status}
+                    eligible.append(appointment)
+
+            if eligible:
+                Appointment.objects.filter(id__in=[appointment.id for appointment in eligible]).update(
+                    status=target, updated_at=timezone.now()
+                )
+                # The UPDATE skips post_save, so apply its side effects set-wise.
+                for previous, total in Counter(appointment.status for appointment in eligible).items():
+                    stats.increment(stats.status_key(previous), -total)
+                stats.increment(stats.status_key(target), len(eligible))
+                transaction.on_commit(lambda: bump_table_version(Appointment))
+                for appointment in eligible:
+                    appointment.status = target
+                queue_status_notifications(eligible)
+                doctor_user_ids = {appointment.doctor_id for appointment in eligible}
+                patient_ids = {appointment.patient_id for appointment in eligible}
+                transaction.on_commit(lambda: [invalidate_availability(user_id) for user_id in doctor_user_ids])
+                transaction.on_commit(lambda: invalidate_timeline(*patient_ids))
+                entries = [queue_entry(appointment) for appointment in eligible]
+                transaction.on_commit(lambda: queue_board.apply(entries))
+
+        return response.Response({
+            'status': target,
+            'updated': len(eligible),
+            'results': [results[appointment_id] for appointment_id in ids],
+        })
+
+    @decorators.action(detail=True, methods=['get'], url_path='patient-detail')
     def patient_detail(self, request, pk=None):
         instance = self.get_object()
         payload = PatientSerializer(instance.patient).data
@@ -190,35 +452,209 @@ class LabTestViewSet(BaseRoleViewSet):
     queryset = LabTest.objects.select_related('patient', 'doctor', 'doctor__user').all()
     serializer_class = LabTestSerializer
     parser_classes = [MultiPartParser, FormParser]
-    allowed_write_roles = [User.Roles.ADMIN, User.Roles.RECEPTIONIST, User.Roles.DOCTOR]
+    cursor_ordering = ('booked_at', 'id')
+    list_projection = ListProjection(LabTestSerializer, compact=['id', 'patient', 'doctor', 'test_name', 'booked_at', 'status'])
+
+    def initialize_request(self, request, *args, **kwargs):
+        # Spool report uploads to disk and hash them while they are parsed.
+        request.upload_handlers = [HashingFileUploadHandler(request)]
+        return super().initialize_request(request, *args, **kwargs)
+
+    def perform_create(self, serializer):
+        self._save_with_report(serializer)
+
+    def perform_update(self, serializer):
+        self._save_with_report(serializer)
+
+    def _save_with_report(self, serializer):
+        upload = serializer.validated_data.get('report_file')
+        if upload:
+            del serializer.validated_data['report_file']
+        elif 'report_file' in serializer.validated_data:
+            serializer.validated_data['report_blob'] = None
+        with transaction.atomic():
+            instance = serializer.save()
+            if upload:
+                attach_report(instance, upload)
+
+    @decorators.action(detail=True, methods=['get', 'put'], parser_classes=[MultiPartParser])
+    def report(self, request, pk=None):
+        lab_test = self.get_object()
+        if request.method == 'GET':
+            if not lab_test.report_file:
+                return response.Response({'detail': 'No report uploaded'}, status=status.HTTP_404_NOT_FOUND)
+            try:
+                return report_response(request, lab_test)
+            except FileNotFoundError:
+                return response.Response({'detail': 'Report file is missing'}, status=status.HTTP_404_NOT_FOUND)
+
+        too_large = response.Response({'detail': 'Report exceeds the maximum upload size'}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        if request.content_type.startswith('multipart/form-data'):
+            upload = request.FILES.get('file')
+            if upload and upload.size > settings.LAB_REPORT_MAX_BYTES:
+                return too_large
+        elif request.stream is not None:
+            filename = os.path.basename(request.query_params.get('filename', '')) or 'report'
+            try:
+                upload = spool_stream(request.stream, filename, request.content_type.split(';')[0].strip())
+            except ReportTooLarge:
+                return too_large
+        else:
+            upload = None
+        if not upload or not upload.size:
+            return response.Response({'detail': 'file is required'}, status=status.HTTP_400_BAD_REQUEST)
+        attach_report(lab_test, upload)
+        return response.Response(self.get_serializer(lab_test).data)
 
 
 class WardViewSet(BaseRoleViewSet):
-    queryset = Ward.objects.all()
+    queryset = Ward.objects.annotate(
+        available_beds=Count('beds', filter=Q(beds__is_occupied=False)),
+        occupied_beds=Count('beds', filter=Q(beds__is_occupied=True)),
+        icu_available_beds=Count('beds', filter=Q(beds__is_icu=True, beds__is_occupied=False)),
+    ).order_by('id')
     serializer_class = WardSerializer
-    allowed_write_roles = [User.Roles.ADMIN, User.Roles.RECEPTIONIST]
+
+    etag_versions = (Bed,)
 
 
 class BedViewSet(BaseRoleViewSet):
     queryset = Bed.objects.select_related('ward', 'current_patient').all()
     serializer_class = BedSerializer
-    allowed_write_roles = [User.Roles.ADMIN, User.Roles.RECEPTIONIST]
+    list_projection = ListProjection(BedSerializer, compact=['id', 'ward', 'bed_number', 'is_icu', 'is_occupied', 'current_patient'])
+
+    @decorators.action(detail=False, methods=['post'])
+    def allocate(self, request):
+        serializer = BedAllocationSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        beds = serializer.save()
+        return response.Response(BedSerializer(beds, many=True).data, status=status.HTTP_201_CREATED)
 
 
 class BedTransferViewSet(BaseRoleViewSet):
     queryset = BedTransfer.objects.select_related('patient', 'from_bed', 'to_bed').all()
     serializer_class = BedTransferSerializer
-    allowed_write_roles = [User.Roles.ADMIN, User.Roles.RECEPTIONIST]
+
+
+class MetricsAPIView(APIView):
+    permission_classes = [permissions.IsAuthenticated, IsAdminRole]
+
+    def get(self, request):
+        return HttpResponse(metrics_registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 
 class DashboardStatsAPIView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
-        payload = {
-            'total_patients': Patient.objects.count(),
-            'total_doctors': Doctor.objects.count(),
-            'total_appointments': Appointment.objects.count(),
-            'beds_available': Bed.objects.filter(is_occupied=False).count(),
-        }
-        return response.Response(payload)
+        return response.Response(stats.get_dashboard_stats())
+
+
+def _bed_version():
+    return table_versions([Bed])[0]
+
+
+def _ward_snapshot():
+    return list(WardViewSet.queryset.values('id', 'available_beds', 'occupied_beds', 'icu_available_beds'))
+
+
+async def _authenticate_stream(request, name):
+    # EventSource cannot send headers, so the access token may also be
+    # passed as ?token=. Returns an error response, or None when valid.
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'detail': f'{name} require the ASGI server'}, status=status.HTTP_501_NOT_IMPLEMENTED)
+    authentication = CachedJWTAuthentication()
+    header = authentication.get_header(request)
+    raw_token = authentication.get_raw_token(header) if header else request.GET.get('token')
+    if not raw_token:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=status.HTTP_401_UNAUTHORIZED)
+    try:
+        await sync_to_async(authentication.get_user)(authentication.get_validated_token(raw_token))
+    except AuthenticationFailed as exc:
+        return JsonResponse({'detail': str(exc.detail)}, status=status.HTTP_401_UNAUTHORIZED)
+    return None
+
+
+def _event_stream(events):
+    streaming = StreamingHttpResponse(events, content_type='text/event-stream')
+    streaming['Cache-Control'] = 'no-cache'
+    streaming['X-Accel-Buffering'] = 'no'
+    return streaming
+
+
+async def bed_events(request):
+    # Server-Sent Events stream of bed occupancy changes.
+    error = await _authenticate_stream(request, 'Bed events')
+    if error:
+        return error
+
+    subscription = bed_hub.subscribe()
+    # The hub only carries changes made in this worker; the shared Bed table
+    # version, compared once per heartbeat, catches writes made elsewhere.
+    version = await sync_to_async(_bed_version)()
+    snapshot = await sync_to_async(_ward_snapshot)()
+
+    async def stream():
+        nonlocal version
+        loop = asyncio.get_running_loop()
+        check_at = loop.time() + BED_EVENTS_HEARTBEAT_SECONDS
+        try:
+            yield format_sse({'type': 'snapshot', 'wards': snapshot})
+            while True:
+                try:
+                    event = await subscription.get(max(check_at - loop.time(), 0))
+                except asyncio.TimeoutError:
+                    check_at = loop.time() + BED_EVENTS_HEARTBEAT_SECONDS
+                    current = await sync_to_async(_bed_version)()
+                    if current == version:
+                        yield ': ping\n\n'
+                        continue
+                    version = current
+                    event = {'type': 'resync'}
+                yield format_sse(event)
+        finally:
+            subscription.close()
+
+    return _event_stream(stream())
+
+
+async def appointment_queue_events(request):
+    # Server-Sent Events stream of one doctor's queue for waiting-room
+    # displays. Every event is a full queue snapshot.
+    error = await _authenticate_stream(request, 'Queue events')
+    if error:
+        return error
+    doctor = request.GET.get('doctor', '')
+    if not doctor.isdigit():
+        return JsonResponse({'detail': 'doctor must be a doctor user id'}, status=status.HTTP_400_BAD_REQUEST)
+    doctor = int(doctor)
+
+    hub = await sync_to_async(queue_board.hub)(doctor)
+    if hub is None:
+        return JsonResponse({'detail': 'No doctor with this user id'}, status=status.HTTP_404_NOT_FOUND)
+    subscription = hub.subscribe()
+    snapshot = await sync_to_async(queue_board.get)(doctor)
+
+    async def stream():
+        sent = snapshot['version']
+        try:
+            yield format_sse({'type': 'queue', **snapshot})
+            while True:
+                try:
+                    event = await subscription.get(QUEUE_EVENTS_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    # Changes made in other worker processes, or a new day,
+                    # are picked up here.
+                    current = await sync_to_async(queue_board.get)(doctor)
+                    if current['version'] == sent:
+                        yield ': ping\n\n'
+                        continue
+                    event = {'type': 'queue', **current}
+                if event['type'] == 'resync':
+                    event = {'type': 'queue', **await sync_to_async(queue_board.get)(doctor)}
+                sent = event['version']
+                yield format_sse(event)
+        finally:
+            subscription.close()
+
+    return _event_stream(stream())
@@ -3,6 +3,8 @@ import warnings
 from pathlib import Path
 from datetime import timedelta
 
+from django.core.exceptions import ImproperlyConfigured
+
 try:
     from dotenv import load_dotenv
     load_dotenv()
@@ -68,6 +70,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.db_router.ReplicaRoutingMiddleware',
+    'core.metrics.MetricsMiddleware',
 ]
 
 ROOT_URLCONF = 'hospital_backend.urls'
@@ -141,10 +145,44 @@ DATABASES = {
             if ssl_ca_path else
             {'ssl': False}
         ),
+        # Persistent connections are opt-in: under ASGI every request may run
+        # on a new thread, so leftover connections pile up until MySQL's
+        # max_connections. Set DB_CONN_MAX_AGE=60 only under WSGI; use DB_POOL
+        # under ASGI.
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '0')),
+        'CONN_HEALTH_CHECKS': os.getenv('DB_CONN_HEALTH_CHECKS', 'True') == 'True',
     }
 }
+
+# Optional process-wide pool (django-db-connection-pool). Django's persistent
+# connections are per thread and are not reused reliably under ASGI, so use
+# the pool there; it also works under WSGI.
+if os.getenv('DB_POOL') == 'True':
+    try:
+        import dj_db_conn_pool  # noqa: F401
+    except ImportError:
+        warnings.warn('DB_POOL=True but django-db-connection-pool is not installed.', RuntimeWarning)
+    else:
+        DATABASES['default']['ENGINE'] = 'dj_db_conn_pool.backends.mysql'
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['POOL_OPTIONS'] = {
+            'POOL_SIZE': int(os.getenv('DB_POOL_SIZE', '10')),
+            'MAX_OVERFLOW': int(os.getenv('DB_POOL_MAX_OVERFLOW', '10')),
+            'RECYCLE': int(os.getenv('DB_POOL_RECYCLE', '3600')),
+            'PRE_PING': True,
+        }
 #aiven_original
 
+# Comma-separated replica hosts; each gets a DATABASES alias that mirrors
+# 'default' except for the host.
+DATABASE_REPLICAS = []
+for index, replica_host in enumerate(filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(',')), start=1):
+    alias = f'replica_{index}'
+    DATABASES[alias] = {**DATABASES['default'], 'HOST': replica_host.strip(), 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(alias)
+DATABASE_ROUTERS = ['core.db_router.ReplicaRouter']
+READ_YOUR_WRITES_SECONDS = int(os.getenv('READ_YOUR_WRITES_SECONDS', '5'))
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -161,16 +199,31 @@ USE_TZ = True
 STATIC_URL = 'static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+
+# Lab reports: uploads larger than this are rejected. LAB_REPORT_SENDFILE
+# hands downloads to the web server ('x-accel-redirect' for nginx, mapping
+# LAB_REPORT_ACCEL_PREFIX to an internal location over MEDIA_ROOT, or
+# 'x-sendfile' for Apache/lighttpd); leave empty to stream from Django, which
+# uses an async chunk iterator under ASGI. Files no lab test links to any more
+# are removed by the prune_lab_report_blobs command; run it from cron.
+LAB_REPORT_MAX_BYTES = int(os.getenv('LAB_REPORT_MAX_BYTES', str(512 * 1024 * 1024)))
+LAB_REPORT_SENDFILE = os.getenv('LAB_REPORT_SENDFILE', '')
+LAB_REPORT_ACCEL_PREFIX = os.getenv('LAB_REPORT_ACCEL_PREFIX', '/protected-media/')
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTH_USER_MODEL = 'core.User'
 
 #CORS_ALLOWED_ORIGINS = os.getenv('CORS_ALLOWED_ORIGINS', 'http://localhost:5173').split(',')
 
 REST_FRAMEWORK = {
-    'DEFAULT_AUTHENTICATION_CLASSES': ('rest_framework_simplejwt.authentication.JWTAuthentication',),
+    'DEFAULT_AUTHENTICATION_CLASSES': ('core.authentication.CachedJWTAuthentication',),
     'DEFAULT_PERMISSION_CLASSES': ('rest_framework.permissions.IsAuthenticated',),
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'core.pagination.HybridPagination',
     'PAGE_SIZE': 20,
+    'DEFAULT_RENDERER_CLASSES': (
+        'core.metrics.TimedJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
 }
 
 SIMPLE_JWT = {
@@ -183,5 +236,40 @@ SIMPLE_JWT = {
     'SIGNING_KEY': JWT_SIGNING_KEY,
 }
 
+# LocMemCache is per process and only suits a single worker; the core.W001
+# check warns when several workers share it.
+CACHE_BACKEND = os.getenv('DJANGO_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache')
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.getenv('DJANGO_CACHE_LOCATION', ''),
+    }
+}
+if CACHE_BACKEND.endswith('LocMemCache'):
+    CACHES['default']['OPTIONS'] = {'MAX_ENTRIES': 10000}
+# Read-your-writes pinning is a cache entry written by the worker that took
+# the write and read by whichever worker serves the next request, so replicas
+# need a cache every worker shares.
+if DATABASE_REPLICAS and CACHE_BACKEND.endswith(('LocMemCache', 'DummyCache')):
+    raise ImproperlyConfigured('DB_REPLICA_HOSTS requires a shared DJANGO_CACHE_BACKEND such as Redis or Memcached.')
+
+AUTH_USER_CACHE_TTL = int(os.getenv('AUTH_USER_CACHE_TTL', '60'))
+APPOINTMENT_SLOT_MINUTES = int(os.getenv('APPOINTMENT_SLOT_MINUTES', '15'))
+# Upcoming tokens shown per doctor on the waiting-room queue display.
+QUEUE_DISPLAY_NEXT_TOKENS = int(os.getenv('QUEUE_DISPLAY_NEXT_TOKENS', '5'))
+# Dashboard requests read the incrementally maintained counters and never
+# recount; run reconcile_dashboard_stats from cron, or with --loop at this
+# interval, to correct drift.
+DASHBOARD_STATS_RECONCILE_SECONDS = int(os.getenv('DASHBOARD_STATS_RECONCILE_SECONDS', '300'))
+
+# Request metrics exposed at /api/metrics/ (admin only). Histograms are kept
+# per process, so scrape each worker. A METRICS_PROFILE_SAMPLE_RATE share of
+# requests is run under cProfile and dumped when slower than
+# METRICS_PROFILE_SLOW_MS.
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'False') == 'True'
+METRICS_PROFILE_SAMPLE_RATE = float(os.getenv('METRICS_PROFILE_SAMPLE_RATE', '0'))
+METRICS_PROFILE_SLOW_MS = int(os.getenv('METRICS_PROFILE_SLOW_MS', '500'))
+METRICS_PROFILE_DIR = os.getenv('METRICS_PROFILE_DIR', str(BASE_DIR / 'profiles'))
+
 EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
 DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'hospital@example.com')
@@ -12,7 +12,7 @@ export const dashboardApi = {
 };
 
 export const createCrudApi = (basePath) => ({
-  list: () => client.get(`${basePath}/`),
+  list: (params) => client.get(`${basePath}/`, { params }),
   create: (payload, isMultipart = false) =>
     client.post(`${basePath}/`, payload, {
       headers: isMultipart ? { 'Content-Type': 'multipart/form-data' } : undefined,
@@ -24,17 +24,33 @@ export const createCrudApi = (basePath) => ({
   remove: (id) => client.delete(`${basePath}/${id}/`),
 });
 
-export const patientApi = createCrudApi('patients');
-export const doctorApi = createCrudApi('doctors');
+export const patientApi = {
+  ...createCrudApi('patients'),
+  timeline: (id, params) => client.get(`patients/${id}/timeline/`, { params }),
+};
+export const doctorApi = {
+  ...createCrudApi('doctors'),
+  availability: (params) => client.get('doctors/availability/', { params }),
+};
 export const appointmentApi = {
   ...createCrudApi('appointments'),
   approve: (id) => client.post(`appointments/${id}/approve/`),
   reject: (id) => client.post(`appointments/${id}/reject/`),
   cancel: (id) => client.post(`appointments/${id}/cancel/`),
   complete: (id) => client.post(`appointments/${id}/complete/`),
+  bulkStatus: (ids, status) => client.post('appointments/bulk-status/', { ids, status }),
   patientDetail: (id) => client.get(`appointments/${id}/patient-detail/`),
+  queue: (params) => client.get('appointments/queue/', { params }),
+  queueEventsUrl: (doctor) => `${client.defaults.baseURL}appointments/queue/events/?doctor=${doctor}&token=${encodeURIComponent(localStorage.getItem('access_token') || '')}`,
+};
+export const labApi = {
+  ...createCrudApi('lab-tests'),
+  downloadReport: (id) => client.get(`lab-tests/${id}/report/`, { responseType: 'blob' }),
 };
-export const labApi = createCrudApi('lab-tests');
 export const wardApi = createCrudApi('wards');
-export const bedApi = createCrudApi('beds');
+export const bedApi = {
+  ...createCrudApi('beds'),
+  allocate: (payload) => client.post('beds/allocate/', payload),
+  eventsUrl: () => `${client.defaults.baseURL}beds/events/?token=${encodeURIComponent(localStorage.getItem('access_token') || '')}`,
+};
 export const bedTransferApi = createCrudApi('bed-transfers');
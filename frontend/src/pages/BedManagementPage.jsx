@@ -22,10 +22,47 @@ const BedManagementPage = () => {
     });
   }, []);
 
+  useEffect(() => {
+    const source = new EventSource(bedApi.eventsUrl());
+    const parse = (event) => {
+      const { type, ...bed } = JSON.parse(event.data);
+      return bed;
+    };
+    source.addEventListener('bed', (event) => {
+      const bed = parse(event);
+      setBeds((prev) => (prev.some((row) => row.id === bed.id)
+        ? prev.map((row) => (row.id === bed.id ? { ...row, ...bed } : row))
+        : [...prev, bed]));
+    });
+    source.addEventListener('bed_deleted', (event) => {
+      const bed = parse(event);
+      setBeds((prev) => prev.filter((row) => row.id !== bed.id));
+    });
+    const reload = () => {
+      Promise.all([wardApi.list(), bedApi.list()]).then(([wardRes, bedRes]) => {
+        setWards(wardRes.data.results || wardRes.data);
+        setBeds(bedRes.data.results || bedRes.data);
+      });
+    };
+    let connected = false;
+    source.addEventListener('snapshot', (event) => {
+      const counts = new Map(JSON.parse(event.data).wards.map((ward) => [ward.id, ward]));
+      setWards((prev) => prev.map((ward) => (counts.has(ward.id) ? { ...ward, ...counts.get(ward.id) } : ward)));
+      // EventSource reconnects on its own; changes made while it was
+      // disconnected were never delivered.
+      if (connected) reload();
+      connected = true;
+    });
+    // Sent when events were dropped or beds changed on another server.
+    source.addEventListener('resync', reload);
+    return () => source.close();
+  }, []);
+
   return (
     <section>
       <h1>Bed & Ward Management</h1>
       <p>Wards configured: {wards.length}</p>
+      <p>Beds available: {wards.reduce((total, ward) => total + (ward.available_beds || 0), 0)}</p>
       <form className="card form-grid" onSubmit={async (e) => { e.preventDefault(); await wardApi.create({ ...wardForm, total_beds: Number(wardForm.total_beds) }); setWardForm({ name: '', ward_type: '', total_beds: 0 }); loadData(); }}>
         <h3>Create Ward</h3>
         <input required placeholder="Ward Name" value={wardForm.name} onChange={(e) => setWardForm((prev) => ({ ...prev, name: e.target.value }))} />
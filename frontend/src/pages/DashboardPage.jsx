@@ -8,6 +8,7 @@ const DashboardPage = () => {
     total_doctors: 0,
     total_appointments: 0,
     beds_available: 0,
+    appointments_today: 0,
   });
 
   useEffect(() => {
@@ -26,6 +27,7 @@ const DashboardPage = () => {
         <SummaryCard label="Total Doctors" value={stats.total_doctors} />
         <SummaryCard label="Total Appointments" value={stats.total_appointments} />
         <SummaryCard label="Beds Available" value={stats.beds_available} />
+        <SummaryCard label="Today's Appointments" value={stats.appointments_today} />
       </div>
     </section>
   );
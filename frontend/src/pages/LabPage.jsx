@@ -25,6 +25,13 @@ const LabPage = () => {
     labApi.list().then(({ data }) => setRows(data.results || data));
   }, []);
 
+  const openReport = async (id) => {
+    const { data } = await labApi.downloadReport(id);
+    const url = URL.createObjectURL(data);
+    window.open(url, '_blank', 'noreferrer');
+    setTimeout(() => URL.revokeObjectURL(url), 60000);
+  };
+
   const handleSubmit = async (event) => {
     event.preventDefault();
     const payload = new FormData();
@@ -64,7 +71,7 @@ const LabPage = () => {
           { key: 'patient', label: 'Patient ID' },
           { key: 'test_name', label: 'Test Name' },
           { key: 'status', label: 'Status' },
-          { key: 'report_file', label: 'Report', render: (row) => (row.report_file ? <a href={row.report_file} target="_blank" rel="noreferrer">Download</a> : 'N/A') },
+          { key: 'report_file', label: 'Report', render: (row) => (row.report_file ? <button type="button" onClick={() => openReport(row.id)}>Download</button> : 'N/A') },
         ]}
         rows={rows}
         actions={(row) => (